@@ -0,0 +1,58 @@
+"""Time of the previous full string-typed workbook parse versus the two-phase header scan and column load,
+uncached and served from the on-disk workbook cache.
+
+    python benchmarks/bench_excel_load.py --rows 10000 --date-columns 162
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import reports
+from workbooks import make_customers_frame
+
+
+def timed(label: str, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<38} {time.perf_counter() - start:>8.2f} s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--date-columns", type=int, default=162, help="Weekly columns (a TOTAL follows each month).")
+    args = parser.parse_args()
+
+    buf = io.BytesIO()
+    customers_df = make_customers_frame(args.rows, args.date_columns)
+    customers_df.to_excel(buf, index=False)
+    file_content = buf.getvalue()
+    print(f"{args.rows} rows x {customers_df.shape[1]} columns, {len(file_content) / 1e6:.1f} MB\n")
+
+    def t(key): return reports.TRANSLATIONS["pt"].get(key, key)
+
+    full_df = timed("full parse (dtype=str)",
+                    lambda: pd.read_excel(io.BytesIO(file_content), header=0, dtype=str))
+    columns = timed("phase 1: header scan", lambda: reports.load_excel_header(file_content, cache_dir=""))
+    month_map = reports.detect_months([str(col).strip() for col in columns], "pt", t)
+    column_indices = [0, 1, list(month_map.values())[-1]["total_idx"]]
+    columns_df = timed("phase 2: ID, name and TOTAL columns",
+                       lambda: reports.load_excel_columns(file_content, column_indices, cache_dir=""))
+    assert reports.extract_customers(columns_df, 0, 1, 2).equals(reports.extract_customers(full_df, *column_indices))
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for label in ("cache miss", "cache hit"):
+            timed(f"phase 1 + 2, {label}", lambda: (reports.load_excel_header(file_content, cache_dir),
+                                                   reports.load_excel_columns(file_content, column_indices, cache_dir)))
+
+
+if __name__ == '__main__':
+    main()
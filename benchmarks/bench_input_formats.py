@@ -0,0 +1,67 @@
+"""Load time of the same spreadsheet as an Excel workbook, a CSV file and a Parquet file: the header scan and the
+ID, name and TOTAL columns, uncached.
+
+    python benchmarks/bench_input_formats.py --rows 10000 --date-columns 162
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import reports
+from workbooks import make_customers_frame
+
+
+def best_time(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--date-columns", type=int, default=162, help="Weekly columns (a TOTAL follows each month).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per format; the best one is kept.")
+    args = parser.parse_args()
+
+    customers_df = make_customers_frame(args.rows, args.date_columns)
+    excel_buf, parquet_buf = io.BytesIO(), io.BytesIO()
+    customers_df.to_excel(excel_buf, index=False)
+    customers_df.to_parquet(parquet_buf, index=False)
+    files = {"excel": excel_buf.getvalue(), "csv": customers_df.to_csv(index=False).encode("utf-8"),
+             "parquet": parquet_buf.getvalue()}
+    print(f"{args.rows} rows x {customers_df.shape[1]} columns\n")
+
+    def t(key): return reports.TRANSLATIONS["pt"].get(key, key)
+
+    expected_customers = None
+    print(f"{'format':<10} {'MB':>8} {'header s':>10} {'columns s':>10} {'total s':>10} {'vs excel':>10}")
+    excel_total = None
+    for name, file_content in files.items():
+        header = reports.load_excel_header(file_content, cache_dir="")
+        month_map = reports.detect_months([str(col).strip() for col in header], "pt", t)
+        column_indices = [0, 1, list(month_map.values())[-1]["total_idx"]]
+        header_seconds = best_time(lambda: reports.load_excel_header(file_content, cache_dir=""), args.repeat)
+        columns_seconds = best_time(lambda: reports.load_excel_columns(file_content, column_indices, cache_dir=""),
+                                    args.repeat)
+        customers = reports.extract_customers(reports.load_excel_columns(file_content, column_indices, cache_dir=""),
+                                              0, 1, 2)
+        if expected_customers is None:
+            expected_customers = customers
+        assert customers[["customer_id", "customer_name", "customer_total"]].equals(
+            expected_customers[["customer_id", "customer_name", "customer_total"]]), name
+        total = header_seconds + columns_seconds
+        excel_total = excel_total or total
+        print(f"{name:<10} {len(file_content) / 1e6:>8.1f} {header_seconds:>10.3f} {columns_seconds:>10.3f} "
+              f"{total:>10.3f} {excel_total / total:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Micro-benchmark of header date parsing: the original parse_month_string versus the precompiled, memoized
+parser and its whole-header variant.
+
+    python benchmarks/bench_month_parsing.py --date-columns 300
+"""
+import argparse
+import datetime
+import os
+import re
+import sys
+import timeit
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import reports
+from workbooks import make_customers_frame
+
+
+def legacy_parse_month_string(month_str: any):
+    """parse_month_string as it was before the rewrite, kept here as the baseline."""
+    if isinstance(month_str, datetime.datetime):
+        return datetime.datetime(month_str.year, month_str.month, 1)
+    month_str = str(month_str).strip()
+    try:
+        match = re.match(r'(\d{2})/(\d{2})/(\d{4})', month_str)
+        if match:
+            day, month, year = map(int, match.groups())
+            return datetime.datetime(year, month, day)
+    except (ValueError, TypeError):
+        pass
+    for date_format in ('%d-%m-%Y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S'):
+        try:
+            return datetime.datetime.strptime(month_str, date_format)
+        except (ValueError, TypeError):
+            pass
+    month_str_lower = month_str.lower()
+    for month_name, month_num in reports.MONTH_NAME_TO_NUM.items():
+        if month_str_lower.startswith(month_name):
+            year_str = re.sub(r'\D', '', month_str_lower[len(month_name):].strip())
+            if year_str.isdigit() and len(year_str) == 4:
+                try:
+                    return datetime.datetime(int(year_str), month_num, 1)
+                except (ValueError, TypeError):
+                    pass
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--date-columns", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=50, help="Header parses per measurement.")
+    args = parser.parse_args()
+
+    header = make_customers_frame(1, args.date_columns).columns.tolist()
+    assert [legacy_parse_month_string(col) for col in header] == reports.parse_month_strings(header)
+    print(f"{len(header)} header columns, best of 5 x {args.repeat} parses\n")
+
+    def cold_parse():
+        reports._parse_month_text.cache_clear()
+        return [reports.parse_month_string(col) for col in header]
+
+    measurements = {
+        "original parser": lambda: [legacy_parse_month_string(col) for col in header],
+        "precompiled parser, cold memo": cold_parse,
+        "precompiled parser, warm memo": lambda: [reports.parse_month_string(col) for col in header],
+        "parse_month_strings (whole header)": lambda: reports.parse_month_strings(header),
+    }
+    for label, func in measurements.items():
+        best = min(timeit.repeat(func, number=args.repeat, repeat=5)) / args.repeat
+        print(f"{label:<36} {best * 1e3:>8.3f} ms per header")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Peak memory of building the reports ZIP in memory versus streaming it to a spooled temporary file.
+
+Each measurement runs in a fresh interpreter so the peak RSS of one run does not leak into the next.
+
+    python benchmarks/bench_zip_memory.py --customers 500 1000 2000 4000
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def run_once(mode: str, customers: int, image_mode: str):
+    import pandas as pd
+    import reports
+
+    customers_df = reports.compute_impact_metrics(pd.DataFrame({
+        "customer_id": range(1, customers + 1),
+        "customer_name": [f"Client {i}" for i in range(customers)],
+        "customer_total": [i * 1.5 for i in range(customers)],
+    }))
+    start_rss = peak_rss_mb()
+    if mode == "bytes":
+        zip_size = len(reports.generate_reports_zip(customers_df, "Novembro 2025", "pt", image_mode))
+    else:
+        zip_file, _ = reports.export_reports_zip(customers_df, "Novembro 2025", "pt", image_mode)
+        with zip_file:
+            zip_size = zip_file.seek(0, os.SEEK_END)
+    print(f"{mode:>9} {image_mode:>9} {customers:>9} {zip_size / 1e6:>9.1f} {peak_rss_mb() - start_rss:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, nargs="+", default=[250, 500, 1000, 2000])
+    parser.add_argument("--image-mode", default="embedded", choices=["embedded", "shared"])
+    parser.add_argument("--run", nargs=2, metavar=("MODE", "CUSTOMERS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        run_once(args.run[0], int(args.run[1]), args.image_mode)
+        return
+    print(f"{'mode':>9} {'images':>9} {'customers':>9} {'zip MB':>9} {'peak +RSS MB':>12}")
+    for mode in ("bytes", "streaming"):
+        for customers in args.customers:
+            subprocess.run([sys.executable, __file__, "--image-mode", args.image_mode, "--run", mode, str(customers)],
+                           check=True)
+
+
+if __name__ == '__main__':
+    main()
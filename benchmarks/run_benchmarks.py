@@ -0,0 +1,154 @@
+"""End-to-end benchmark of the report pipeline, stage by stage.
+
+Generates a synthetic workbook, then records wall time (best of --repeat), peak Python memory (tracemalloc) and
+output bytes of every stage. Results are written as JSON and compared against a stored baseline; a stage that got
+slower, hungrier or bigger than the baseline by more than --tolerance is flagged and the run exits with status 1.
+
+    python benchmarks/run_benchmarks.py                      # compare against benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline      # record a new baseline on this machine
+
+Timings are machine dependent: regenerate the baseline on the machine the comparisons run on.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import reports
+from workbooks import make_customers_frame
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCHMARKS_DIR, "results.json")
+METRICS = ("seconds", "peak_memory_bytes", "output_bytes")
+# Growth below these absolute amounts is timer or allocator noise, whatever the relative change.
+NOISE_FLOORS = {"seconds": 0.01, "peak_memory_bytes": 64 * 1024, "output_bytes": 0}
+
+
+def output_size(result) -> int:
+    if isinstance(result, (bytes, str)):
+        return len(result)
+    if hasattr(result, "memory_usage"):
+        return int(result.memory_usage(deep=True).sum())
+    if isinstance(result, (list, dict)):
+        return sum(output_size(item) for item in result)
+    return 0
+
+
+def measure(func, repeat: int) -> tuple[object, dict]:
+    """Times `func` without tracing, then runs it once more under tracemalloc for its peak allocation."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, {"seconds": best, "peak_memory_bytes": peak_memory, "output_bytes": output_size(result)}
+
+
+def run_stages(args: argparse.Namespace) -> dict[str, dict]:
+    def t(key): return reports.TRANSLATIONS[args.lang].get(key, key)
+
+    buf = io.BytesIO()
+    make_customers_frame(args.rows, args.date_columns, args.name_length).to_excel(buf, index=False)
+    file_content = buf.getvalue()
+    stages = {}
+
+    header, stages["load_excel_header"] = measure(lambda: reports.load_excel_header(file_content, cache_dir=""),
+                                                  args.repeat)
+    available_columns = [str(col).strip() for col in header]
+    month_map, stages["detect_months"] = measure(lambda: reports.detect_months(available_columns, args.lang, t),
+                                                 args.repeat)
+    report_month_str = list(month_map)[-1]
+    column_indices = [0, 1, month_map[report_month_str]["total_idx"]]
+    columns_df, stages["load_excel_columns"] = measure(
+        lambda: reports.load_excel_columns(file_content, column_indices, cache_dir=""), args.repeat)
+    customers_df, stages["extract_customers"] = measure(lambda: reports.extract_customers(columns_df, 0, 1, 2),
+                                                        args.repeat)
+
+    render_df = customers_df.head(args.render_customers)
+    for name, template_path in (("svg", reports.TEMPLATE_FILE_SVG), ("html", reports.TEMPLATE_FILE_HTML),
+                                ("svg_v1", reports.TEMPLATE_FILE_SVG_V1)):
+        _, stages[f"create_report_html[{name}]"] = measure(
+            lambda: [reports.create_report_html(template_path, row, report_month_str, args.lang, t)
+                     for _, row in render_df.iterrows()], args.repeat)
+
+    for image_mode in (reports.IMAGE_MODE_EMBEDDED, reports.IMAGE_MODE_SHARED):
+        _, stages[f"generate_reports_zip[{image_mode}]"] = measure(
+            lambda: reports.generate_reports_zip(render_df, report_month_str, args.lang, image_mode, args.workers),
+            args.repeat)
+    return stages
+
+
+def compare(stages: dict[str, dict], baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for stage, results in stages.items():
+        baseline_results = baseline.get("stages", {}).get(stage)
+        if not baseline_results:
+            continue
+        for metric in METRICS:
+            previous, current = baseline_results.get(metric), results[metric]
+            if previous and current > previous * (1 + tolerance) and current - previous > NOISE_FLOORS[metric]:
+                regressions.append(f"{stage}: {metric} {previous:.4g} -> {current:.4g} "
+                                   f"(+{(current / previous - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000, help="Customers in the synthetic workbook.")
+    parser.add_argument("--date-columns", type=int, default=104, help="Weekly columns (a TOTAL follows each month).")
+    parser.add_argument("--name-length", type=int, default=20, help="Length of the customer names.")
+    parser.add_argument("--render-customers", type=int, default=200,
+                        help="Customers rendered by the create_report_html and generate_reports_zip stages.")
+    parser.add_argument("--lang", default="pt", choices=list(reports.TRANSLATIONS))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per stage; the best one is kept.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed growth over the baseline.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline.")
+    args = parser.parse_args()
+
+    parameters = {key: getattr(args, key) for key in ("rows", "date_columns", "name_length", "render_customers",
+                                                      "lang", "workers", "repeat")}
+    stages = run_stages(args)
+    results = {"parameters": parameters, "python": platform.python_version(), "machine": platform.machine(),
+               "stages": stages}
+
+    print(f"{'stage':<36} {'seconds':>10} {'peak MB':>10} {'output MB':>10}")
+    for stage, stage_results in stages.items():
+        print(f"{stage:<36} {stage_results['seconds']:>10.4f} {stage_results['peak_memory_bytes'] / 1e6:>10.2f} "
+              f"{stage_results['output_bytes'] / 1e6:>10.2f}")
+
+    output_path = args.baseline if args.save_baseline else args.output
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output_path}")
+    if args.save_baseline or not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("parameters") != parameters:
+        print("Baseline was recorded with different parameters; skipping the comparison.")
+        return 0
+    regressions = compare(stages, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regressions beyond {args.tolerance:.0%} of the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
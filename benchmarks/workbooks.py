@@ -0,0 +1,34 @@
+"""Synthetic spreadsheets in the layout the app expects: ID, NOME, then weekly date columns each followed by a
+TOTAL column at the end of the month."""
+import datetime
+import random
+
+import pandas as pd
+
+
+def make_customers_frame(rows: int, date_columns: int, name_length: int = 20, seed: int = 0) -> pd.DataFrame:
+    """Builds the frame with `date_columns` weekly columns, starting on the first Friday of January 2022."""
+    rng = random.Random(seed)
+    columns = {"ID": list(range(1, rows + 1)),
+               "NOME": [f"Cliente {i} ".ljust(name_length, "x")[:name_length] for i in range(rows)]}
+    week = datetime.date(2022, 1, 7)
+    month_weeks = []
+    total_index = 0
+    for _ in range(date_columns):
+        values = [round(rng.uniform(0, 60), 1) for _ in range(rows)]
+        columns[week.strftime('%d/%m/%Y')] = values
+        month_weeks.append(values)
+        next_week = week + datetime.timedelta(days=7)
+        if next_week.month != week.month:
+            columns["TOTAL" if total_index == 0 else f"TOTAL {total_index}"] = [round(sum(v), 1) for v in
+                                                                                zip(*month_weeks)]
+            total_index += 1
+            month_weeks = []
+        week = next_week
+    return pd.DataFrame(columns)
+
+
+def write_workbook(path: str, rows: int, date_columns: int, name_length: int = 20, seed: int = 0) -> pd.DataFrame:
+    customers_df = make_customers_frame(rows, date_columns, name_length, seed)
+    customers_df.to_excel(path, index=False)
+    return customers_df
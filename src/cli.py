@@ -0,0 +1,169 @@
+# cli.py
+"""Generates the monthly reports ZIPs from the command line, without Streamlit.
+
+    python src/cli.py generate Planilha-2025.xlsx --month "Novembro 2025" --output-dir reports/
+    python src/cli.py generate Planilha-2025.xlsx --all-months --output-dir reports/
+"""
+import argparse
+import functools
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Union
+
+from reports import DEFAULT_XLS_COLUMNS, IMAGE_MODE_EMBEDDED, IMAGE_MODE_SHARED, OUTPUT_FORMAT_COMBINED_PDF, \
+    OUTPUT_FORMAT_SVG, OUTPUT_FORMATS, TRANSLATIONS, configure_logging, detect_months, extract_month_customers, \
+    get_batch_zip_filename, get_content_digest, get_output_filename, load_excel_columns, load_excel_header, \
+    parse_month_string, profile_run, sanitize_filename, write_combined_pdf, write_documents_zip, \
+    write_month_batch_zip, write_reports_zip
+
+
+def resolve_month(month_map: dict[str, dict], month: Optional[str]) -> str:
+    """Finds the detected month matching `month` (any format parse_month_string accepts); defaults to the last one."""
+    if not month:
+        return list(month_map)[-1]
+    if month in month_map:
+        return month
+    requested_date = parse_month_string(month)
+    if requested_date:
+        for month_name in month_map:
+            month_date = parse_month_string(month_name)
+            if month_date and (month_date.year, month_date.month) == (requested_date.year, requested_date.month):
+                return month_name
+    raise ValueError(f"Month '{month}' not found. Available months: {', '.join(month_map)}")
+
+
+def generate_file_reports(input_path: str, output_dir: str, month: Union[str, list[str], None] = None,
+                          id_column: str = DEFAULT_XLS_COLUMNS["id"], name_column: str = DEFAULT_XLS_COLUMNS["name"],
+                          lang: str = "pt", image_mode: str = IMAGE_MODE_EMBEDDED, workers: int = 1,
+                          cache_dir: Optional[str] = None, output_format: str = OUTPUT_FORMAT_SVG,
+                          all_months: bool = False, compact: bool = False) -> tuple[str, int]:
+    """Runs the whole pipeline for one spreadsheet and returns the written ZIP (or PDF) path and its report count.
+
+    Several months in `month`, or `all_months`, produce one ZIP with a folder per month from a single load.
+    """
+    def t(key): return TRANSLATIONS[lang].get(key, key)
+
+    with open(input_path, "rb") as f:
+        file_content = f.read()
+    content_digest = get_content_digest(file_content)
+    available_columns = [str(col).strip() for col in load_excel_header(file_content, cache_dir, content_digest)]
+    month_map = detect_months(available_columns, lang, t)
+    if not month_map:
+        raise ValueError(t("no_month_header_error"))
+    if all_months:
+        report_months = list(month_map)
+    else:
+        requested_months = month if isinstance(month, list) else [month]
+        report_months = list(dict.fromkeys(resolve_month(month_map, requested) for requested in requested_months))
+    for column in (id_column, name_column):
+        if column not in available_columns:
+            raise ValueError(f"Column '{column}' not found. Available columns: {', '.join(available_columns)}")
+
+    column_indices = [available_columns.index(id_column), available_columns.index(name_column),
+                      *(month_map[report_month_str]["total_idx"] for report_month_str in report_months)]
+    month_customers = extract_month_customers(load_excel_columns(file_content, column_indices, cache_dir,
+                                                                 content_digest), report_months)
+    report_count = sum(map(len, month_customers.values()))
+    if not report_count:
+        raise ValueError(t("no_data_warning"))
+    month_batch = all_months or len(report_months) > 1
+    report_month_str, customers_df = next(iter(month_customers.items()))
+    if month_batch:
+        output_filename = get_batch_zip_filename(report_months, lang, t)
+    else:
+        output_filename = get_output_filename(report_month_str, lang, t, output_format)
+
+    # Prefix the input name so several spreadsheets for the same month don't overwrite each other, and
+    # write to a temporary name first so an interrupted run never leaves a truncated ZIP behind.
+    input_name = sanitize_filename(os.path.splitext(os.path.basename(input_path))[0])
+    output_path = os.path.join(output_dir, f"{input_name}_{output_filename}")
+    partial_path = f"{output_path}.partial"
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+    if month_batch:
+        write_month_batch_zip(partial_path, month_customers, lang, output_format, image_mode, workers, compact=compact)
+    elif output_format == OUTPUT_FORMAT_SVG:
+        write_reports_zip(partial_path, customers_df, report_month_str, lang, image_mode, workers, compact=compact)
+    elif output_format == OUTPUT_FORMAT_COMBINED_PDF:
+        write_combined_pdf(partial_path, customers_df, report_month_str, lang, workers)
+    else:
+        write_documents_zip(partial_path, customers_df, report_month_str, lang, output_format, workers)
+    os.replace(partial_path, output_path)
+    return output_path, report_count
+
+
+def run_generate(args: argparse.Namespace) -> int:
+    os.makedirs(args.output_dir, exist_ok=True)
+    kwargs = dict(output_dir=args.output_dir, month=args.month, id_column=args.id_column, name_column=args.name_column,
+                  lang=args.lang, image_mode=args.image_mode, workers=args.workers, cache_dir=args.cache_dir,
+                  output_format=args.format, all_months=args.all_months, compact=args.compact)
+    generate = functools.partial(generate_file_reports, **kwargs)
+    executor = None
+    if args.jobs > 1 and len(args.inputs) > 1:
+        executor = ProcessPoolExecutor(max_workers=min(args.jobs, len(args.inputs)))
+        results = [executor.submit(generate, input_path).result for input_path in args.inputs]
+    else:
+        results = [functools.partial(generate, input_path) for input_path in args.inputs]
+
+    failures = 0
+    for input_path, result in zip(args.inputs, results):
+        try:
+            output_path, report_count = result()
+            print(f"{input_path}: {report_count} reports -> {output_path}")
+        except Exception as e:
+            failures += 1
+            print(f"{input_path}: {e}", file=sys.stderr)
+    if executor:
+        executor.shutdown()
+    return 1 if failures else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="Eco Service report generator (batch mode).")
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="Log a JSON line per pipeline stage (-vv also logs every rendered report).")
+    parser.add_argument("--profile", metavar="PATH", help="Write a cProfile/pstats dump of the run to PATH "
+                                                          "(spreadsheets processed by --jobs workers are not profiled).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="Generate the reports ZIP for one or more spreadsheets.")
+    generate_parser.add_argument("inputs", nargs="+", metavar="INPUT", help="XLS/XLSX, CSV or Parquet spreadsheet(s).")
+    generate_parser.add_argument("-m", "--month", action="append",
+                                 help="Report month, e.g. 'Novembro 2025', 'November 2025' or '01/11/2025'. Defaults to "
+                                      "the last month in the spreadsheet. Repeat it to generate several months into "
+                                      "one ZIP with a folder per month.")
+    generate_parser.add_argument("--all-months", action="store_true",
+                                 help="Generate every month in the spreadsheet into one ZIP with a folder per month.")
+    generate_parser.add_argument("-o", "--output-dir", default=".", help="Directory for the ZIP files.")
+    generate_parser.add_argument("--id-column", default=DEFAULT_XLS_COLUMNS["id"], help="Customer ID column.")
+    generate_parser.add_argument("--name-column", default=DEFAULT_XLS_COLUMNS["name"], help="Customer name column.")
+    generate_parser.add_argument("--lang", default="pt", choices=list(TRANSLATIONS), help="Report language.")
+    generate_parser.add_argument("--image-mode", default=IMAGE_MODE_EMBEDDED,
+                                 choices=[IMAGE_MODE_EMBEDDED, IMAGE_MODE_SHARED], help="How the ODS images are stored.")
+    generate_parser.add_argument("-f", "--format", default=OUTPUT_FORMAT_SVG, choices=OUTPUT_FORMATS,
+                                 help="svg/pdf/png: a ZIP with one file per customer; combined-pdf: a single PDF "
+                                      "with one page per customer. PDF and PNG need PyMuPDF (pip install pymupdf).")
+    generate_parser.add_argument("--compact", action="store_true",
+                                 help="Minify the SVG reports and images (svg format only).")
+    generate_parser.add_argument("-w", "--workers", type=int, default=1, help="Render processes per spreadsheet.")
+    generate_parser.add_argument("-j", "--jobs", type=int, default=1, help="Spreadsheets processed concurrently.")
+    generate_parser.add_argument("--cache-dir", help="Parsed spreadsheet cache directory ('' disables it). Defaults "
+                                                     "to $ECO_REPORT_CACHE_DIR or ~/.cache/eco-service-report.")
+    generate_parser.set_defaults(func=run_generate)
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.verbose:
+        configure_logging(logging.DEBUG if args.verbose > 1 else logging.INFO)
+    if args.profile:
+        with profile_run(args.profile):
+            return args.func(args)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,182 +1,49 @@
 # main.py
-import base64
-import datetime
+import contextlib
+import functools
 import io
+import marshal
 import os
-import re
-import unicodedata
-import zipfile
-from typing import Optional
+import pstats
+from typing import Callable, Optional
 
 import pandas as pd
 import streamlit as st
-from jinja2 import Template
-
-# --- I18N Translations ---
-TRANSLATIONS = {
-    "en": {
-        "page_title": "Eco Service Reports", "main_title": "♻️ Eco Service Report Generator",
-        "main_subtitle": "Upload your customer data (XLS/XLSX) to generate monthly environmental impact reports.",
-        "view_format_expander": "View Expected Spreadsheet Format",
-        "format_intro": "The application expects an Excel file with a single header row containing dates.",
-        "format_header1": "- **Header Row**: Contains column titles. Columns representing weeks should use the date format `DD/MM/YYYY` (e.g., `07/11/2025`).",
-        "format_header2": "",
-        "format_columns": "The columns `ID` and `NAME` should appear before the date columns.",
-        "format_example_title": "**Example Layout:**",
-        "format_example_content": """
-| ID   | NAME          | 07/11/2025 | 14/11/2025 | ... | TOTAL      | 05/12/2025 ...
-|------|---------------|------------|------------|-----|------------|----------------
-| 1    | Client A      | 30.0       | 40.0       | ... | 150.5      | 40.0       ...
-| 2    | Client B      | 50.0       | 50.0       | ... | 200.0      | 55.0       ...
-        """,
-        "upload_label": "Upload Spreadsheet", "file_uploaded_success": "File uploaded: {file_name}",
-        "process_error": "An error occurred while processing the spreadsheet: {error}",
-        "no_month_header_error": "Could not find any valid date columns (DD/MM/YYYY) in the header.",
-        "select_month_header": "1. Select Report Month",
-        "select_month_label": "Which month do you want to generate reports for?",
-        "map_columns_header": "2. Map Spreadsheet Columns",
-        "map_columns_caption": "The columns for ID, Name, and Total are detected automatically based on their default names.",
-        "customer_id_label": "Customer ID Column", "customer_name_label": "Customer Name Column",
-        "waste_total_label": "Waste Total Column for {month_name}",
-        "review_data_header": "3. Review Data and Generate Reports",
-        "review_data_caption": "Review the processed data below. Select a row to preview its report.",
-        "preview_header": "Preview: Report for {customer_name}",
-        "prepare_reports_button": "Prepare All Reports (.zip)", "download_reports_button": "Download All Reports",
-        "zip_filename": "{month_name}-Reports.zip",
-        "no_data_warning": "No valid data found for the selected columns. Please check your file and selections.",
-        "months": ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October",
-                   "November", "December"],
-        "month_of_year_format": "{month_name} {year}", "month_year_format": "%B-%Y", "last_month_na": "N/A",
-        "report_id_na": "N/A",
-        # Report Template Translations
-        "report_title": "Environmental Impact Report", "report_id_label": "Report ID:",
-        "metric_waste": "Total Waste Diverted", "metric_fertilizer": "Organic Fertilizer",
-        "metric_co2": "CO₂ Avoided", "metric_driving": "Driving Distance",
-        "metric_trees": "Trees Equivalent", "metric_water": "Water Saved",
-        "report_footer": "Thank you for making a positive impact on the environment! | Generated on {date}"
-    },
-    "pt": {
-        "page_title": "Relatórios Eco Service", "main_title": "♻️ Gerador de Relatórios Eco Service",
-        "main_subtitle": "Faça o upload dos dados dos seus clientes (XLS/XLSX) para gerar relatórios mensais de impacto ambiental.",
-        "view_format_expander": "Ver Formato da Planilha Esperado",
-        "format_intro": "A aplicação espera um arquivo Excel com uma única linha de cabeçalho contendo datas.",
-        "format_header1": "- **Linha de Cabeçalho**: Contém os títulos das colunas. Colunas que representam semanas devem usar o formato de data `DD/MM/AAAA` (ex: `07/11/2025`).",
-        "format_header2": "",
-        "format_columns": "As colunas `ID` e `NOME` devem aparecer antes das colunas de data.",
-        "format_example_title": "**Exemplo de Layout:**",
-        "format_example_content": """
-| ID   | NOME          | 07/11/2025 | 14/11/2025 | ... | TOTAL      | 05/12/2025 ...
-|------|---------------|------------|------------|-----|------------|----------------
-| 1    | Cliente A     | 30.0       | 40.0       | ... | 150.5      | 40.0       ...
-| 2    | Cliente B     | 50.0       | 50.0       | ... | 200.0      | 55.0       ...
-        """,
-        "upload_label": "Fazer Upload da Planilha", "file_uploaded_success": "Arquivo enviado: {file_name}",
-        "process_error": "Ocorreu um erro ao processar a planilha: {error}",
-        "no_month_header_error": "Não foi possível encontrar colunas de data (DD/MM/AAAA) no cabeçalho.",
-        "select_month_header": "1. Selecione o Mês do Relatório",
-        "select_month_label": "Para qual mês você deseja gerar os relatórios?",
-        "map_columns_header": "2. Mapeie as Colunas da Planilha",
-        "map_columns_caption": "As colunas de ID, Nome e Total são detectadas automaticamente com base em seus nomes padrão.",
-        "customer_id_label": "Coluna de ID do Cliente", "customer_name_label": "Coluna de Nome do Cliente",
-        "waste_total_label": "Coluna de Total de Resíduos para {month_name}",
-        "review_data_header": "3. Revise os Dados e Gere os Relatórios",
-        "review_data_caption": "Revise os dados processados abaixo. Selecione uma linha para pré-visualizar seu relatório.",
-        "preview_header": "Pré-visualização: Relatório para {customer_name}",
-        "prepare_reports_button": "Preparar Todos os Relatórios (.zip)",
-        "download_reports_button": "Baixar Todos os Relatórios", "zip_filename": "Relatorios-{month_name}.zip",
-        "no_data_warning": "Nenhum dado válido encontrado para as colunas selecionadas. Por favor, verifique seu arquivo e seleções.",
-        "months": ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho", "Agosto", "Setembro", "Outubro",
-                   "Novembro", "Dezembro"],
-        "month_of_year_format": "{month_name} {year}", "month_year_format": "%B-%Y", "last_month_na": "N/D",
-        "report_id_na": "N/D",
-        # Report Template Translations
-        "report_title": "Relatório de Impacto Ambiental", "report_id_label": "ID do Relatório:",
-        "metric_waste": "Total de Resíduos Desviados", "metric_fertilizer": "Fertilizante Orgânico",
-        "metric_co2": "CO₂ Evitado", "metric_driving": "Distância de Carro",
-        "metric_trees": "Árvores Equivalentes", "metric_water": "Água Economizada",
-        "report_footer": "Obrigado por causar um impacto positivo no meio ambiente! | Gerado em {date}"
-    }
-}
-
-# --- Constants ---
-DEFAULT_XLS_COLUMNS = {"id": "ID", "name": "NOME", "total": "TOTAL"}
-TEMPLATE_FILE_HTML = 'templates/service-report-preview-template.html'
-TEMPLATE_FILE_SVG = 'templates/service-report-template.svg'
-FERTILIZER_FACTOR, CO2_AVOIDED_FACTOR, DRIVING_DISTANCE_CO2_CONVERSION_FACTOR, TREES_EQUIVALENT_CO2_ABSORPTION_FACTOR, WATER_LITERS_FACTOR_BASE, WATER_LITERS_MULTIPLIER = 0.38, 0.77, 0.096, 0.35, 0.214, 12
-MONTH_PT_TO_NUM = {name.lower(): i + 1 for i, name in enumerate(TRANSLATIONS["pt"]["months"])}
-MONTH_EN_TO_NUM = {name.lower(): i + 1 for i, name in enumerate(TRANSLATIONS["en"]["months"])}
-MONTH_NAME_TO_NUM = {**MONTH_PT_TO_NUM, **MONTH_EN_TO_NUM}
-
-
-# --- Date Handling ---
-def format_local_date(date_obj: datetime.datetime, lang: str, t) -> str:
-    t_months = TRANSLATIONS[lang]["months"]
-    month_name = t_months[date_obj.month - 1]
-    return t("month_of_year_format").format(month_name=month_name, year=date_obj.year)
-
-
-def parse_month_string(month_str: any) -> Optional[datetime.datetime]:
-    if isinstance(month_str, datetime.datetime):
-        # If it's already a datetime object, extract year and month, set day to 1.
-        return datetime.datetime(month_str.year, month_str.month, 1)
-    
-    month_str = str(month_str).strip()
-    
-    # Try parsing DD/MM/YYYY
-    try:
-        # Use a regex to extract day, month, year from DD/MM/YYYY, then reformat to YYYY-MM-DD for datetime parsing
-        match = re.match(r'(\d{2})/(\d{2})/(\d{4})', month_str)
-        if match:
-            day, month, year = map(int, match.groups())
-            return datetime.datetime(year, month, day)
-    except (ValueError, TypeError):
-        pass
-
-    # Try parsing DD-MM-YYYY
-    try:
-        return datetime.datetime.strptime(month_str, '%d-%m-%Y')
-    except (ValueError, TypeError):
-        pass
 
-    # Try parsing YYYY-MM-DD (e.g., from sanitized strings or other sources)
-    try:
-        return datetime.datetime.strptime(month_str, '%Y-%m-%d')
-    except (ValueError, TypeError):
-        pass
+import reports
+from reports import DEFAULT_REPORT_WORKERS, DEFAULT_XLS_COLUMNS, DELIVERY_FORMATS, DELIVERY_STATUS_FAILED, \
+    DELIVERY_STATUS_SENT, DELIVERY_STATUS_SKIPPED, IMAGE_MODE_EMBEDDED, IMAGE_MODE_SHARED, INPUT_FILE_TYPES, \
+    METRIC_FORMATS, OUTPUT_FORMAT_SVG, OUTPUT_FORMATS, REPORT_ENTRY_CACHE, REVIEW_PAGE_SIZE, TEMPLATE_FILE_HTML, \
+    TRANSLATIONS, DeliveryResult, ReportJob, annotate_stage, collect_stage_records, configure_logging, \
+    create_report_html, deliver_reports, detect_months, enter_profile_run, export_month_batch, export_reports, \
+    extract_customers, extract_month_customers, filter_customers, get_batch_zip_filename, get_content_digest, \
+    get_customers_page, get_output_filename, get_page_count, get_smtp_settings, is_document_renderer_available, \
+    is_email_delivery_available, record_stage, server_worker_pool, summarize_stage_records
 
-    # Try parsing YYYY-MM-DD HH:MM:SS (original format)
-    try:
-        return datetime.datetime.strptime(month_str, '%Y-%m-%d %H:%M:%S')
-    except (ValueError, TypeError):
-        pass
-
-    # After trying all specific date formats, if not parsed, try month name + year
-    month_str_lower = month_str.lower()
-    for month_name, month_num in MONTH_NAME_TO_NUM.items():
-        if month_str_lower.startswith(month_name):
-            # The remaining part should contain the year, possibly with noise
-            remaining_str = month_str_lower[len(month_name):].strip()
-            
-            # Extract only digits for the year from the remaining string
-            year_str = re.sub(r'\D', '', remaining_str)
-            
-            if year_str.isdigit() and len(year_str) == 4: # Assume 4-digit year
-                try:
-                    return datetime.datetime(int(year_str), month_num, 1)
-                except (ValueError, TypeError):
-                    pass
-    return None
+# Bounds for the st.cache_data entries, so a long-running server doesn't keep every upload and preview it has seen
+CACHE_TTL = "1h"
+WORKBOOK_CACHE_MAX_ENTRIES = 32
+PREVIEW_CACHE_MAX_ENTRIES = 256
 
 
 # --- File Handling and Data Processing ---
 def upload_xls_file(t) -> Optional[st.runtime.uploaded_file_manager.UploadedFile]:
-    uploaded_file = st.file_uploader(t("upload_label"), type=["xls", "xlsx"])
+    uploaded_file = st.file_uploader(t("upload_label"), type=INPUT_FILE_TYPES)
     if uploaded_file:
         st.success(t("file_uploaded_success").format(file_name=uploaded_file.name))
         return uploaded_file
     return None
 
 
+def get_upload_digest(uploaded_file: st.runtime.uploaded_file_manager.UploadedFile) -> str:
+    """Hashes the uploaded bytes once per upload; reruns reuse the digest kept in the session."""
+    upload_digest = st.session_state.get("upload_digest")
+    if not upload_digest or upload_digest[0] != uploaded_file.file_id:
+        upload_digest = (uploaded_file.file_id, get_content_digest(uploaded_file.getvalue()))
+        st.session_state.upload_digest = upload_digest
+    return upload_digest[1]
+
+
 def get_default_index(col_name_key: str, available_columns: list[str]) -> int:
     default_col_name = DEFAULT_XLS_COLUMNS.get(col_name_key)
     if not default_col_name: return 0
@@ -189,166 +56,244 @@ def get_default_index(col_name_key: str, available_columns: list[str]) -> int:
 
 
 # --- Report Generation ---
-@st.cache_data
-def get_ods_images() -> dict[str, str]:
-    images = {}
-    image_files = {
-        "ods_2": "ods-2.svg", "ods_3": "ods-3.svg", "ods_6": "ods-6.svg",
-        "ods_11": "ods-11.svg", "ods_12": "ods-12.svg", "ods_13": "ods-13.svg", "ods_15": "ods-15.svg"
-    }
-    dir_path = os.path.dirname(os.path.realpath(__file__))
-    images_dir = os.path.join(dir_path, 'images')
-    for key, filename in image_files.items():
-        file_path = os.path.join(images_dir, filename)
-        try:
-            with open(file_path, "rb") as f:
-                encoded = base64.b64encode(f.read()).decode("utf-8")
-                images[key] = f"data:image/svg+xml;base64,{encoded}"
-        except FileNotFoundError:
-            images[key] = ""
-    return images
-
-def create_report_html(template_path: str, customer_data: pd.Series, report_month_str: str, lang: str, t) -> str:
-    dir_path = os.path.dirname(os.path.realpath(__file__))
-    template_path = os.path.join(dir_path, template_path)
-    with open(template_path, 'r', encoding='utf-8') as f:
-        jinja_template = Template(f.read())
-
-    report_date = parse_month_string(report_month_str)
-    if report_date:
-        report_id_date_str = report_date.strftime('%Y-%m')
-    else:
-        report_id_date_str = t("report_id_na")
-
-    current_date = format_local_date(datetime.datetime.now(), lang, t)
-    report_id = f"{customer_data['customer_id']}-{report_id_date_str}"
-    customer_total_float = customer_data['customer_total']
-    fertilizer_kg, co2_avoided = customer_total_float * FERTILIZER_FACTOR, customer_total_float * CO2_AVOIDED_FACTOR
-    driving_distance, trees_equivalent, water_liters = co2_avoided / DRIVING_DISTANCE_CO2_CONVERSION_FACTOR, co2_avoided / TREES_EQUIVALENT_CO2_ABSORPTION_FACTOR, customer_total_float * WATER_LITERS_FACTOR_BASE * WATER_LITERS_MULTIPLIER
-
-    template_vars = {
-        'report_title': t('report_title'),
-        'report_date': report_month_str,
-        'report_id_label': t('report_id_label'),
-        'report_id': report_id,
-        'current_date': current_date,
-        'customer_name': customer_data['customer_name'],
-        'metric_waste': t('metric_waste'),
-        'customer_waste_kg': f"{customer_total_float:.2f}",
-        'metric_fertilizer': t('metric_fertilizer'),
-        'fertilizer_kg': f"{fertilizer_kg:.2f}",
-        'metric_co2': t('metric_co2'),
-        'co2_avoided': f"{co2_avoided:.2f}",
-        'metric_driving': t('metric_driving'),
-        'driving_distance': f"{driving_distance:.2f}",
-        'metric_trees': t('metric_trees'),
-        'trees_equivalent': f"{trees_equivalent:.0f}",
-        'metric_water': t('metric_water'),
-        'water_liters': f"{water_liters:.2f}",
-        'report_footer': t('report_footer').format(date=current_date)
-    }
-    template_vars.update(get_ods_images())
-    return jinja_template.render(template_vars)
-
-
-@st.cache_data
-def generate_single_report_preview(customer_data: pd.Series, report_month_str: str, lang: str) -> str:
-    def t(key): return TRANSLATIONS[lang].get(key, key)
-
-    return create_report_html(TEMPLATE_FILE_HTML, customer_data, report_month_str, lang, t)
-
-
-def sanitize_filename(text: str) -> str:
-    """Sanitizes a value to be safe for use as a filename by converting it to a string first."""
-    text = str(text).strip()
-    # Normalize unicode characters to their closest ASCII equivalents
-    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('utf-8')
-    # Replace all non-alphanumeric (except underscore) characters with a single underscore
-    text = re.sub(r'[^a-zA-Z0-9_]+', '_', text)
-    # Remove leading/trailing underscores
-    text = text.strip('_')
-    return text[:50]
-
-
-@st.cache_data
-def generate_reports_zip(customers_df: pd.DataFrame, report_month_str: str, lang: str) -> bytes:
+@st.cache_data(max_entries=PREVIEW_CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def generate_single_report_preview(data_key: tuple, report_month_str: str, lang: str, row_label: int,
+                                   _customer_data: pd.Series) -> str:
+    """Renders the preview of one customer row. Streamlit skips hashing parameters starting with an underscore, so
+    the row is identified by `data_key` (see get_data_key), the month and its customers_df index label instead of
+    its values."""
     def t(key): return TRANSLATIONS[lang].get(key, key)
 
-    buf = io.BytesIO()
-    report_date = parse_month_string(report_month_str)
-    filename_date_str = report_date.strftime('%m%Y') if report_date else "data"
-    with zipfile.ZipFile(buf, 'a', zipfile.ZIP_DEFLATED) as zf:
-        for _, customer_row in customers_df.iterrows():
-            customer_name_sanitized = sanitize_filename(customer_row['customer_name'])
-            report_filename = f"{customer_row['customer_id']}_{customer_name_sanitized}_{filename_date_str}.svg"
-            report_svg_content = create_report_html(TEMPLATE_FILE_SVG, customer_row, report_month_str, lang, t)
-            zf.writestr(report_filename, report_svg_content)
-    return buf.getvalue()
+    # The preview template has no ODS images, so skip merging their data URIs into the context
+    return create_report_html(TEMPLATE_FILE_HTML, _customer_data, report_month_str, lang, t, images={})
 
 
 # --- Streamlit UI Components ---
-def display_customer_data_and_actions(customers_df: pd.DataFrame, report_month_str: str, lang: str, t):
+def display_customer_data_and_actions(customers_df: pd.DataFrame, data_key: tuple, report_month_str: str, lang: str,
+                                      t):
     st.subheader(t("review_data_header"))
     st.caption(t("review_data_caption"))
-    event = st.dataframe(customers_df, key="data_selection", on_select="rerun", selection_mode="single-row",
-                         hide_index=True, use_container_width=True)
+    display_customer_review(customers_df, data_key, report_month_str, lang, t)
+    if not customers_df.empty:
+        output_format, image_mode, compact = select_output_options(t)
+        job_key = get_report_job_key(data_key, [report_month_str], lang, image_mode, output_format, compact)
+        export = functools.partial(run_on_server_pool, export_reports, compact=compact)
+        display_report_job_actions(job_key, len(customers_df), (export, customers_df, report_month_str, lang,
+                                   output_format, image_mode, DEFAULT_REPORT_WORKERS, REPORT_ENTRY_CACHE),
+                                   get_output_filename(report_month_str, lang, t, output_format), t)
+    if 'customer_contact' in customers_df:
+        display_delivery_actions(customers_df, data_key, report_month_str, lang, t)
+
+
+def display_customer_review(customers_df: pd.DataFrame, data_key: tuple, report_month_str: str, lang: str, t):
+    """Shows one page of the customers matching the search, so only that page is sent to the browser, and the
+    preview of the selected row."""
+    col_search, col_page = st.columns([3, 1])
+    query = col_search.text_input(t("search_customers_label"))
+    filtered_df = filter_customers(customers_df, query)
+    if filtered_df.empty:
+        st.info(t("no_search_results_info"))
+        return
+    page_count = get_page_count(len(filtered_df))
+    page = col_page.number_input(t("review_page_label"), min_value=1, max_value=page_count, step=1,
+                                 disabled=page_count == 1)
+    page_df = get_customers_page(filtered_df, page)
+    start = (page - 1) * REVIEW_PAGE_SIZE
+    st.caption(t("review_page_caption").format(start=start + 1, end=start + len(page_df), total=len(filtered_df)))
+    # A new page or search gets a new table key, so a stale selection never points into a different page
+    event = st.dataframe(page_df, key=f"data_selection_{page}_{query}", on_select="rerun",
+                         selection_mode="single-row", hide_index=True, use_container_width=True,
+                         column_order=['customer_id', 'customer_name', *METRIC_FORMATS])
     if event.selection and event.selection["rows"]:
-        selected_row_index = event.selection["rows"][0]
-        selected_customer = customers_df.iloc[selected_row_index]
+        selected_customer = page_df.iloc[event.selection["rows"][0]]
         st.subheader(t("preview_header").format(customer_name=selected_customer['customer_name']))
         with st.container(border=True):
-            st.html(generate_single_report_preview(selected_customer, report_month_str, lang))
+            st.html(generate_single_report_preview(data_key, report_month_str, lang, int(selected_customer.name),
+                                                   selected_customer))
         st.divider()
-    if not customers_df.empty:
-        report_date = parse_month_string(report_month_str)
-        zip_filename_month = format_local_date(report_date, lang, t) if report_date else "Reports"
-        zip_filename = sanitize_filename(t("zip_filename").format(month_name=zip_filename_month))
-        if st.button(t("prepare_reports_button"), use_container_width=True, type="primary"):
-            zip_data = generate_reports_zip(customers_df, report_month_str, lang)
-            st.download_button(label=t("download_reports_button"), data=zip_data, file_name=zip_filename,
-                               mime="application/zip", icon="📦", use_container_width=True)
 
 
-@st.cache_data
-def load_excel_data(file_content: bytes):
-    excel_file = io.BytesIO(file_content)
-    # Read using the first row (header=0) as header
-    full_df = pd.read_excel(excel_file, header=0, dtype=str)
-    return full_df.columns.tolist(), full_df
+def display_month_batch_actions(month_customers: dict[str, pd.DataFrame], data_key: tuple, lang: str, t):
+    st.subheader(t("month_batch_header"))
+    st.dataframe(pd.DataFrame([
+        {t("month_batch_month_column"): month_name, t("month_batch_customers_column"): len(customers_df),
+         t("month_batch_total_column"): customers_df['customer_total'].sum()}
+        for month_name, customers_df in month_customers.items()
+    ]), hide_index=True, use_container_width=True)
+    output_format, image_mode, compact = select_output_options(t)
+    job_key = get_report_job_key(data_key, list(month_customers), lang, image_mode, output_format, compact)
+    export = functools.partial(run_on_server_pool, export_month_batch, compact=compact)
+    display_report_job_actions(job_key, sum(map(len, month_customers.values())),
+                               (export, month_customers, lang, output_format, image_mode, DEFAULT_REPORT_WORKERS,
+                                REPORT_ENTRY_CACHE),
+                               get_batch_zip_filename(list(month_customers), lang, t), t)
+
+
+def select_output_options(t) -> tuple[str, str, bool]:
+    # PDF and PNG need the optional PyMuPDF renderer
+    output_formats = OUTPUT_FORMATS if is_document_renderer_available() else [OUTPUT_FORMAT_SVG]
+    output_format = st.selectbox(t("output_format_label"), options=output_formats,
+                                 format_func=lambda output_format: t(f"output_format_{output_format}"))
+    shared_images = st.toggle(t("shared_images_label"), help=t("shared_images_help"),
+                              disabled=output_format != OUTPUT_FORMAT_SVG)
+    compact = st.toggle(t("compact_svg_label"), help=t("compact_svg_help"), disabled=output_format != OUTPUT_FORMAT_SVG)
+    image_mode = IMAGE_MODE_SHARED if shared_images else IMAGE_MODE_EMBEDDED
+    return output_format, image_mode, compact and output_format == OUTPUT_FORMAT_SVG
+
+
+def run_on_server_pool(export: Callable, *args, **kwargs):
+    """Runs an export on the worker pool shared by every session, so concurrent builds don't each start their own
+    DEFAULT_REPORT_WORKERS processes."""
+    with server_worker_pool():
+        return export(*args, **kwargs)
+
+
+def display_report_job_actions(job_key: tuple, total: int, export_args: tuple, output_filename: str, t):
+    """Shows the prepare button, the progress of the session's report job or the download of its output.
+    `export_args` are the export function and its arguments, run by the job when the button is clicked."""
+    job = st.session_state.get("report_job")
+    if job and job.running:
+        # One build per session: while it runs, only its progress is shown, never a second prepare button
+        display_report_job_progress(t)
+    elif st.button(t("prepare_reports_button"), use_container_width=True, type="primary"):
+        st.session_state.report_job = ReportJob(job_key, total, *export_args, profile=is_profiling()).start()
+        st.rerun()
+    elif job and job.key == job_key:
+        if job.error:
+            st.error(t("reports_error").format(error=job.error))
+        elif job.cancelled:
+            st.warning(t("reports_cancelled_warning"))
+        else:
+            _, entry_counts = job.result
+            mime = "application/pdf" if output_filename.endswith(".pdf") else "application/zip"
+            st.caption(t("reports_reused_caption").format(**entry_counts))
+            # download_button only accepts bytes or plain io streams, not the spooled file itself
+            st.download_button(label=t("download_reports_button"), data=job.output_bytes,
+                               file_name=output_filename, mime=mime, icon="📦", use_container_width=True)
+        display_job_diagnostics(job, t)
+
+
+def display_delivery_actions(customers_df: pd.DataFrame, data_key: tuple, report_month_str: str, lang: str, t):
+    """E-mails each customer with a contact its report in a background job, then shows the status per customer."""
+    st.divider()
+    st.subheader(t("delivery_header"))
+    try:
+        settings = get_smtp_settings()
+    except ValueError as e:
+        st.error(t("delivery_error").format(error=e))
+        return
+    if not is_email_delivery_available():
+        st.info(t("delivery_unavailable_info"))
+        return
+    if settings is None:
+        st.info(t("delivery_not_configured_info"))
+        return
+    delivery_formats = DELIVERY_FORMATS if is_document_renderer_available() else [OUTPUT_FORMAT_SVG]
+    output_format = st.selectbox(t("delivery_format_label"), options=delivery_formats, key="delivery_format",
+                                 format_func=lambda output_format: t(f"output_format_{output_format}"))
+    job_key = ("delivery", data_key, report_month_str, lang, output_format)
+    contact_count = int((customers_df['customer_contact'] != "").sum())
+    job = st.session_state.get("delivery_job")
+    if job and job.running:
+        display_report_job_progress(t, "delivery_job", "delivery_progress", "cancel_delivery_button")
+    elif st.button(t("deliver_reports_button").format(count=contact_count), disabled=not contact_count,
+                   use_container_width=True):
+        st.session_state.delivery_job = ReportJob(job_key, len(customers_df), deliver_reports, customers_df,
+                                                  report_month_str, lang, output_format, settings,
+                                                  profile=is_profiling()).start()
+        st.rerun()
+    elif job and job.key == job_key:
+        if job.error:
+            st.error(t("delivery_error").format(error=job.error))
+        elif job.cancelled:
+            st.warning(t("delivery_cancelled_warning"))
+        # After a failure or a cancel, list who was already handled, so they aren't sent their report twice
+        results = job.result if job.result is not None else job.partial_result
+        if results:
+            display_delivery_results(results, t)
+        display_job_diagnostics(job, t)
+
+
+def display_delivery_results(results: list[DeliveryResult], t):
+    """Summarizes the delivery and lists the customers that weren't sent their report; the status of every
+    customer is offered as a CSV download."""
+    statuses = [result.status for result in results]
+    st.caption(t("delivery_summary").format(
+        **{status: statuses.count(status)
+           for status in (DELIVERY_STATUS_SENT, DELIVERY_STATUS_FAILED, DELIVERY_STATUS_SKIPPED)}))
+    results_df = pd.DataFrame(results, columns=DeliveryResult._fields)
+    results_df['status'] = results_df['status'].map(lambda status: t(f"delivery_status_{status}"))
+    unsent_df = results_df[[status != DELIVERY_STATUS_SENT for status in statuses]]
+    if not unsent_df.empty:
+        st.dataframe(unsent_df.head(REVIEW_PAGE_SIZE), hide_index=True, use_container_width=True)
+    st.download_button(label=t("delivery_status_download"), data=results_df.to_csv(index=False),
+                       file_name="delivery_status.csv", mime="text/csv", use_container_width=True)
+
+
+def get_data_key(content_digest: str, id_col_idx: int, name_col_idx: int,
+                 contact_col_idx: Optional[int] = None) -> tuple:
+    """Identifies the customer rows of any month: the uploaded file and the mapped ID, name and contact columns."""
+    return content_digest, id_col_idx, name_col_idx, contact_col_idx
+
+
+def get_report_job_key(data_key: tuple, report_months: list[str], lang: str, image_mode: str,
+                       output_format: str, compact: bool = False) -> tuple:
+    """Identifies the output a job builds, so a finished job is only offered for the data it was built from."""
+    return data_key, tuple(report_months), lang, image_mode, output_format, compact
+
+
+@st.fragment(run_every=0.5)
+def display_report_job_progress(t, session_key: str = "report_job", progress_key: str = "reports_progress",
+                                cancel_key: str = "cancel_reports_button"):
+    job = st.session_state[session_key]
+    if not job.running:
+        st.rerun()
+    st.progress(job.done / job.total, text=t(progress_key).format(done=job.done, total=job.total))
+    if st.button(t(cancel_key), use_container_width=True):
+        job.cancel()
+        job.wait()
+        st.rerun()
+
+
+# The file bytes are passed underscored, so Streamlit keys these on the upload digest instead of hashing the file
+@st.cache_data(max_entries=WORKBOOK_CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def load_excel_header(content_digest: str, _file_content: bytes) -> list:
+    return reports.load_excel_header(_file_content, content_digest=content_digest)
+
+
+@st.cache_data(max_entries=WORKBOOK_CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def load_excel_columns(content_digest: str, column_indices: list[int], _file_content: bytes) -> pd.DataFrame:
+    return reports.load_excel_columns(_file_content, column_indices, content_digest=content_digest)
 
 
 def process_spreadsheet(xls_file: st.runtime.uploaded_file_manager.UploadedFile, lang: str, t):
+    with record_stage("process_spreadsheet", input_bytes=xls_file.size):
+        _process_spreadsheet(xls_file, lang, t)
+
+
+def _process_spreadsheet(xls_file: st.runtime.uploaded_file_manager.UploadedFile, lang: str, t):
     try:
         file_content = xls_file.getvalue()
-        raw_columns, full_df = load_excel_data(file_content)
+        content_digest = get_upload_digest(xls_file)
+        raw_columns = load_excel_header(content_digest, file_content)
         
         available_columns = [str(col).strip() for col in raw_columns]
-        month_map = {}
-        
-        # Identify months based on TOTAL columns and their preceding date column
-        for i, col_name in enumerate(available_columns):
-            if "TOTAL" in col_name.upper():
-                if i > 0:
-                    prev_col_name = available_columns[i-1]
-                    parsed_date = parse_month_string(prev_col_name)
-                    if parsed_date:
-                        month_str = format_local_date(parsed_date, lang, t)
-                        month_map[month_str] = {
-                            "total_idx": i,
-                            "total_col_name": col_name,
-                            "date_source": prev_col_name
-                        }
-                        
+        month_map = detect_months(available_columns, lang, t)
         if not month_map:
             st.error(t("no_month_header_error"))
             return
 
         st.subheader(t("select_month_header"))
-        selected_month_name = st.selectbox(t("select_month_label"), options=list(month_map.keys()))
+        month_batch = st.toggle(t("month_batch_toggle"), help=t("month_batch_help"))
+        if month_batch:
+            selected_months = st.multiselect(t("month_batch_label"), options=list(month_map),
+                                             default=list(month_map))
+        else:
+            selected_month_name = st.selectbox(t("select_month_label"), options=list(month_map.keys()))
         
         st.subheader(t("map_columns_header"))
         st.caption(t("map_columns_caption"))
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         
         with col1:
             customer_id_col_name = st.selectbox(t("customer_id_label"), options=available_columns,
@@ -356,7 +301,34 @@ def process_spreadsheet(xls_file: st.runtime.uploaded_file_manager.UploadedFile,
         with col2:
             customer_name_col_name = st.selectbox(t("customer_name_label"), options=available_columns,
                                                   index=get_default_index("name", available_columns))
-        
+        with col3:
+            # Only a single month's reports can be e-mailed, so batches don't ask for the contact column
+            contact_options = [None] if month_batch else [None, *available_columns]
+            default_contact = DEFAULT_XLS_COLUMNS["contact"]
+            customer_contact_col_name = st.selectbox(
+                t("customer_contact_label"), options=contact_options, disabled=month_batch,
+                index=contact_options.index(default_contact) if default_contact in contact_options else 0,
+                format_func=lambda col_name: t("no_contact_column") if col_name is None else col_name)
+        id_col_idx = available_columns.index(customer_id_col_name)
+        name_col_idx = available_columns.index(customer_name_col_name)
+        contact_col_idx = None if customer_contact_col_name is None else \
+            available_columns.index(customer_contact_col_name)
+        data_key = get_data_key(content_digest, id_col_idx, name_col_idx, contact_col_idx)
+
+        if month_batch:
+            # One load of the ID, name and every selected month's total column, then one slice per month
+            total_col_indices = [month_map[month_name]["total_idx"] for month_name in selected_months]
+            columns_df = load_excel_columns(content_digest, [id_col_idx, name_col_idx, *total_col_indices],
+                                            file_content)
+            month_customers = extract_month_customers(columns_df, selected_months)
+            annotate_stage(rows=sum(map(len, month_customers.values())))
+            st.divider()
+            if any(not customers_df.empty for customers_df in month_customers.values()):
+                display_month_batch_actions(month_customers, data_key, lang, t)
+            else:
+                st.warning(t("no_data_warning"))
+            return
+
         selected_month_data = month_map[selected_month_name]
         total_col_idx = selected_month_data["total_idx"]
         customer_total_col_name = selected_month_data["total_col_name"]
@@ -364,33 +336,53 @@ def process_spreadsheet(xls_file: st.runtime.uploaded_file_manager.UploadedFile,
         month_name_for_label = selected_month_name.split(' ')[0].title()
         st.info(f"{t('waste_total_label').format(month_name=month_name_for_label)}: **{customer_total_col_name}**")
 
-        id_col_idx = available_columns.index(customer_id_col_name)
-        name_col_idx = available_columns.index(customer_name_col_name)
-        
-        customers_df = full_df.iloc[:, [id_col_idx, name_col_idx, total_col_idx]].copy()
-        customers_df.columns = ['customer_id', 'customer_name', 'customer_total']
-        
-        customers_df = customers_df.dropna(how='all')
-        customers_df['customer_id'] = pd.to_numeric(customers_df['customer_id'], errors='coerce')
-        customers_df['customer_total'] = pd.to_numeric(customers_df['customer_total'], errors='coerce')
-        customers_df = customers_df.dropna(subset=['customer_id', 'customer_total'])
+        contact_col_indices = [] if contact_col_idx is None else [contact_col_idx]
+        columns_df = load_excel_columns(content_digest, [id_col_idx, name_col_idx, total_col_idx,
+                                                         *contact_col_indices], file_content)
+        customers_df = extract_customers(columns_df, 0, 1, 2, 3 if contact_col_indices else None)
+        annotate_stage(rows=len(customers_df))
 
-        # Remove rows where customer_name is NaN, 'nan', 'None', or empty
-        customers_df = customers_df[~customers_df['customer_name'].astype(str).str.strip().str.lower().isin(['nan', 'none', ''])]
-        
-        customers_df['customer_id'] = customers_df['customer_id'].astype(int)
-        
         st.divider()
         if not customers_df.empty:
-            display_customer_data_and_actions(customers_df, selected_month_name, lang, t)
+            display_customer_data_and_actions(customers_df, data_key, selected_month_name, lang, t)
         else:
             st.warning(t("no_data_warning"))
     except Exception as e:
         st.error(t("process_error").format(error=e))
 
 
+def is_profiling() -> bool:
+    return bool(st.session_state.get("show_diagnostics") and st.session_state.get("profile_run"))
+
+
+def display_job_diagnostics(job: ReportJob, t):
+    """The stages and profile of a finished background job, which the script run's diagnostics don't include."""
+    if st.session_state.get("show_diagnostics") and not job.running:
+        display_diagnostics(job.stage_records, job.profile_stats, t, "job_diagnostics_expander", key=job.key,
+                            profile_error=job.profile_error)
+
+
+def display_diagnostics(records: list[dict], profile_stats: Optional[pstats.Stats], t,
+                        expander_key: str = "diagnostics_expander", key: Optional[tuple] = None,
+                        profile_error: Optional[str] = None):
+    with st.expander(t(expander_key), expanded=True):
+        st.dataframe(pd.DataFrame(summarize_stage_records(records)), hide_index=True, use_container_width=True)
+        if profile_error:
+            st.warning(t("profile_error").format(error=profile_error))
+        if profile_stats:
+            stats_text = io.StringIO()
+            profile_stats.stream = stats_text
+            profile_stats.sort_stats("cumulative").print_stats(25)
+            st.code(stats_text.getvalue(), language=None)
+            # The same marshalled stats pstats.Stats.dump_stats writes
+            st.download_button(label=t("profile_download_button"), data=marshal.dumps(profile_stats.stats),
+                               file_name="eco-service-report.pstats", mime="application/octet-stream",
+                               key=f"profile_download_{expander_key}_{key}")
+
+
 # --- Main Application Logic ---
 def main():
+    configure_logging(os.environ.get("ECO_REPORT_LOG_LEVEL", "INFO"))
     if 'language' not in st.session_state:
         st.session_state.language = 'pt'
 
@@ -420,10 +412,22 @@ def main():
         st.markdown(t("format_example_title"))
         st.code(t("format_example_content"), language='markdown')
 
+    with st.sidebar:
+        show_diagnostics = st.toggle(t("diagnostics_toggle"), help=t("diagnostics_help"), key="show_diagnostics")
+        profile = show_diagnostics and st.toggle(t("profile_toggle"), help=t("profile_help"), key="profile_run")
+
     uploaded_file = upload_xls_file(t)
     if uploaded_file:
         st.divider()
-        process_spreadsheet(uploaded_file, lang, t)
+        profiler = profile_error = None
+        with collect_stage_records() as records:
+            with contextlib.ExitStack() as stack:
+                if profile:
+                    profiler, profile_error = enter_profile_run(stack)
+                process_spreadsheet(uploaded_file, lang, t)
+        if show_diagnostics:
+            display_diagnostics(records, pstats.Stats(profiler) if profiler else None, t,
+                                profile_error=profile_error)
 
 
 if __name__ == '__main__':
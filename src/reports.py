@@ -0,0 +1,1974 @@
+# reports.py
+"""Report pipeline shared by the Streamlit app (main.py) and the batch CLI (cli.py); it never imports Streamlit."""
+import asyncio
+import base64
+import contextlib
+import cProfile
+import contextvars
+import csv
+import datetime
+import functools
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+import mimetypes
+import multiprocessing
+import os
+import pickle
+import pstats
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+import zipfile
+import zlib
+from xml.etree import ElementTree
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextvars import ContextVar
+from email.message import EmailMessage
+from typing import BinaryIO, Callable, Iterator, NamedTuple, Optional, Union
+
+import openpyxl
+import pandas as pd
+from jinja2 import Environment, Template
+
+# --- I18N Translations ---
+TRANSLATIONS = {
+    "en": {
+        "page_title": "Eco Service Reports", "main_title": "♻️ Eco Service Report Generator",
+        "main_subtitle": "Upload your customer data (XLS/XLSX, CSV or Parquet) to generate monthly environmental impact reports.",
+        "view_format_expander": "View Expected Spreadsheet Format",
+        "format_intro": "The application expects an Excel, CSV or Parquet file with a single header row containing dates.",
+        "format_header1": "- **Header Row**: Contains column titles. Columns representing weeks should use the date format `DD/MM/YYYY` (e.g., `07/11/2025`).",
+        "format_header2": "",
+        "format_columns": "The columns `ID` and `NAME` should appear before the date columns.",
+        "format_example_title": "**Example Layout:**",
+        "format_example_content": """
+| ID   | NAME          | 07/11/2025 | 14/11/2025 | ... | TOTAL      | 05/12/2025 ...
+|------|---------------|------------|------------|-----|------------|----------------
+| 1    | Client A      | 30.0       | 40.0       | ... | 150.5      | 40.0       ...
+| 2    | Client B      | 50.0       | 50.0       | ... | 200.0      | 55.0       ...
+        """,
+        "upload_label": "Upload Spreadsheet", "file_uploaded_success": "File uploaded: {file_name}",
+        "process_error": "An error occurred while processing the spreadsheet: {error}",
+        "no_month_header_error": "Could not find any valid date columns (DD/MM/YYYY) in the header.",
+        "select_month_header": "1. Select Report Month",
+        "select_month_label": "Which month do you want to generate reports for?",
+        "map_columns_header": "2. Map Spreadsheet Columns",
+        "map_columns_caption": "The columns for ID, Name, and Total are detected automatically based on their default names.",
+        "customer_id_label": "Customer ID Column", "customer_name_label": "Customer Name Column",
+        "customer_contact_label": "Customer E-mail Column (optional)", "no_contact_column": "— None —",
+        "waste_total_label": "Waste Total Column for {month_name}",
+        "review_data_header": "3. Review Data and Generate Reports",
+        "review_data_caption": "Review the processed data below. Select a row to preview its report.",
+        "preview_header": "Preview: Report for {customer_name}",
+        "search_customers_label": "Search by ID or name",
+        "review_page_label": "Page",
+        "review_page_caption": "Showing customers {start}–{end} of {total}",
+        "no_search_results_info": "No customer matches the search.",
+        "prepare_reports_button": "Prepare All Reports (.zip)", "download_reports_button": "Download All Reports",
+        "shared_images_label": "Store ODS images once in the ZIP (smaller download)",
+        "output_format_label": "Output format",
+        "month_batch_toggle": "Generate several months at once",
+        "month_batch_help": "Builds a single ZIP with one folder per month, loading the spreadsheet only once.",
+        "month_batch_label": "Months",
+        "month_batch_header": "Months to Generate",
+        "month_batch_month_column": "Month",
+        "month_batch_customers_column": "Customers",
+        "month_batch_total_column": "Total Waste (kg)",
+        "output_format_svg": "SVG, one file per customer (.zip)",
+        "output_format_pdf": "PDF, one file per customer (.zip)",
+        "output_format_png": "PNG, one file per customer (.zip)",
+        "output_format_combined-pdf": "PDF, one page per customer (single .pdf)",
+        "shared_images_help": "Reports reference the images in the ZIP's assets folder, so keep the folder next to the reports when extracting.",
+        "compact_svg_label": "Compact SVG (minified, smaller files)",
+        "compact_svg_help": "Strips editor metadata and whitespace and rounds coordinates; the reports look the same.",
+        "reports_reused_caption": "{rebuilt} reports generated, {reused} unchanged reports reused.",
+        "diagnostics_toggle": "Show diagnostics",
+        "diagnostics_help": "Times each processing stage of this run and shows durations, rows, bytes and cache hits.",
+        "profile_toggle": "Profile this run",
+        "profile_help": "Captures a cProfile dump of the next run for offline analysis (slows the run down).",
+        "diagnostics_expander": "Diagnostics",
+        "job_diagnostics_expander": "Diagnostics of the background job",
+        "profile_download_button": "Download profile (.pstats)",
+        "profile_error": "This run could not be profiled: {error}",
+        "reports_progress": "{done:,} / {total:,} reports",
+        "cancel_reports_button": "Cancel",
+        "reports_cancelled_warning": "Report generation cancelled.",
+        "reports_error": "An error occurred while generating the reports: {error}",
+        "delivery_header": "Send Reports by E-mail",
+        "delivery_unavailable_info": "E-mail delivery needs aiosmtplib: pip install aiosmtplib",
+        "delivery_not_configured_info": "Set ECO_REPORT_SMTP_HOST (and the other ECO_REPORT_SMTP_* variables) to send the reports by e-mail.",
+        "delivery_format_label": "Attachment format",
+        "deliver_reports_button": "Send Reports to {count} Customers",
+        "delivery_progress": "Sending reports... {done}/{total}",
+        "cancel_delivery_button": "Stop Sending",
+        "delivery_cancelled_warning": "Sending was stopped; some customers may not have received their report.",
+        "delivery_error": "An error occurred while sending the reports: {error}",
+        "delivery_summary": "Sent: {sent} · Failed: {failed} · Without e-mail: {skipped}",
+        "delivery_status_download": "Download the Status of Every Customer (.csv)",
+        "delivery_status_sent": "✅ Sent", "delivery_status_failed": "❌ Failed", "delivery_status_skipped": "➖ No e-mail",
+        "delivery_email_subject": "{report_title} - {month}",
+        "delivery_email_body": "Hello {customer_name},\n\nAttached is your environmental impact report for {month}.\n",
+        "zip_filename": "{month_name}-Reports.zip",
+        "no_data_warning": "No valid data found for the selected columns. Please check your file and selections.",
+        "months": ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October",
+                   "November", "December"],
+        "month_of_year_format": "{month_name} {year}", "month_year_format": "%B-%Y", "last_month_na": "N/A",
+        "report_id_na": "N/A",
+        # Report Template Translations
+        "report_title": "Environmental Impact Report", "report_id_label": "Report ID:",
+        "metric_waste": "Total Waste Diverted", "metric_fertilizer": "Organic Fertilizer",
+        "metric_co2": "CO₂ Avoided", "metric_driving": "Driving Distance",
+        "metric_trees": "Trees Equivalent", "metric_water": "Water Saved",
+        "report_footer": "Thank you for making a positive impact on the environment! | Generated on {date}"
+    },
+    "pt": {
+        "page_title": "Relatórios Eco Service", "main_title": "♻️ Gerador de Relatórios Eco Service",
+        "main_subtitle": "Faça o upload dos dados dos seus clientes (XLS/XLSX, CSV ou Parquet) para gerar relatórios mensais de impacto ambiental.",
+        "view_format_expander": "Ver Formato da Planilha Esperado",
+        "format_intro": "A aplicação espera um arquivo Excel, CSV ou Parquet com uma única linha de cabeçalho contendo datas.",
+        "format_header1": "- **Linha de Cabeçalho**: Contém os títulos das colunas. Colunas que representam semanas devem usar o formato de data `DD/MM/AAAA` (ex: `07/11/2025`).",
+        "format_header2": "",
+        "format_columns": "As colunas `ID` e `NOME` devem aparecer antes das colunas de data.",
+        "format_example_title": "**Exemplo de Layout:**",
+        "format_example_content": """
+| ID   | NOME          | 07/11/2025 | 14/11/2025 | ... | TOTAL      | 05/12/2025 ...
+|------|---------------|------------|------------|-----|------------|----------------
+| 1    | Cliente A     | 30.0       | 40.0       | ... | 150.5      | 40.0       ...
+| 2    | Cliente B     | 50.0       | 50.0       | ... | 200.0      | 55.0       ...
+        """,
+        "upload_label": "Fazer Upload da Planilha", "file_uploaded_success": "Arquivo enviado: {file_name}",
+        "process_error": "Ocorreu um erro ao processar a planilha: {error}",
+        "no_month_header_error": "Não foi possível encontrar colunas de data (DD/MM/AAAA) no cabeçalho.",
+        "select_month_header": "1. Selecione o Mês do Relatório",
+        "select_month_label": "Para qual mês você deseja gerar os relatórios?",
+        "map_columns_header": "2. Mapeie as Colunas da Planilha",
+        "map_columns_caption": "As colunas de ID, Nome e Total são detectadas automaticamente com base em seus nomes padrão.",
+        "customer_id_label": "Coluna de ID do Cliente", "customer_name_label": "Coluna de Nome do Cliente",
+        "customer_contact_label": "Coluna de E-mail do Cliente (opcional)", "no_contact_column": "— Nenhuma —",
+        "waste_total_label": "Coluna de Total de Resíduos para {month_name}",
+        "review_data_header": "3. Revise os Dados e Gere os Relatórios",
+        "review_data_caption": "Revise os dados processados abaixo. Selecione uma linha para pré-visualizar seu relatório.",
+        "preview_header": "Pré-visualização: Relatório para {customer_name}",
+        "search_customers_label": "Buscar por ID ou nome",
+        "review_page_label": "Página",
+        "review_page_caption": "Exibindo clientes {start}–{end} de {total}",
+        "no_search_results_info": "Nenhum cliente corresponde à busca.",
+        "prepare_reports_button": "Preparar Todos os Relatórios (.zip)",
+        "download_reports_button": "Baixar Todos os Relatórios", "zip_filename": "Relatorios-{month_name}.zip",
+        "shared_images_label": "Armazenar as imagens ODS uma única vez no ZIP (download menor)",
+        "output_format_label": "Formato de saída",
+        "month_batch_toggle": "Gerar vários meses de uma vez",
+        "month_batch_help": "Gera um único ZIP com uma pasta por mês, carregando a planilha uma única vez.",
+        "month_batch_label": "Meses",
+        "month_batch_header": "Meses a Gerar",
+        "month_batch_month_column": "Mês",
+        "month_batch_customers_column": "Clientes",
+        "month_batch_total_column": "Resíduos Totais (kg)",
+        "output_format_svg": "SVG, um arquivo por cliente (.zip)",
+        "output_format_pdf": "PDF, um arquivo por cliente (.zip)",
+        "output_format_png": "PNG, um arquivo por cliente (.zip)",
+        "output_format_combined-pdf": "PDF, uma página por cliente (.pdf único)",
+        "shared_images_help": "Os relatórios referenciam as imagens da pasta assets do ZIP, então mantenha a pasta junto aos relatórios ao extrair.",
+        "compact_svg_label": "SVG compacto (minificado, arquivos menores)",
+        "compact_svg_help": "Remove metadados do editor e espaços e arredonda coordenadas; os relatórios ficam iguais.",
+        "reports_reused_caption": "{rebuilt} relatórios gerados, {reused} relatórios sem alterações reaproveitados.",
+        "diagnostics_toggle": "Mostrar diagnóstico",
+        "diagnostics_help": "Mede cada etapa do processamento desta execução e mostra durações, linhas, bytes e acertos de cache.",
+        "profile_toggle": "Analisar desempenho desta execução",
+        "profile_help": "Gera um arquivo cProfile da próxima execução para análise posterior (deixa a execução mais lenta).",
+        "diagnostics_expander": "Diagnóstico",
+        "job_diagnostics_expander": "Diagnóstico da tarefa em segundo plano",
+        "profile_download_button": "Baixar análise de desempenho (.pstats)",
+        "profile_error": "Não foi possível analisar o desempenho desta execução: {error}",
+        "reports_progress": "{done:,} / {total:,} relatórios",
+        "cancel_reports_button": "Cancelar",
+        "reports_cancelled_warning": "Geração dos relatórios cancelada.",
+        "reports_error": "Ocorreu um erro ao gerar os relatórios: {error}",
+        "delivery_header": "Enviar Relatórios por E-mail",
+        "delivery_unavailable_info": "O envio por e-mail requer o aiosmtplib: pip install aiosmtplib",
+        "delivery_not_configured_info": "Defina ECO_REPORT_SMTP_HOST (e as demais variáveis ECO_REPORT_SMTP_*) para enviar os relatórios por e-mail.",
+        "delivery_format_label": "Formato do anexo",
+        "deliver_reports_button": "Enviar Relatórios para {count} Clientes",
+        "delivery_progress": "Enviando relatórios... {done}/{total}",
+        "cancel_delivery_button": "Parar Envio",
+        "delivery_cancelled_warning": "O envio foi interrompido; alguns clientes podem não ter recebido o relatório.",
+        "delivery_error": "Ocorreu um erro ao enviar os relatórios: {error}",
+        "delivery_summary": "Enviados: {sent} · Falhas: {failed} · Sem e-mail: {skipped}",
+        "delivery_status_download": "Baixar o Status de Cada Cliente (.csv)",
+        "delivery_status_sent": "✅ Enviado", "delivery_status_failed": "❌ Falhou", "delivery_status_skipped": "➖ Sem e-mail",
+        "delivery_email_subject": "{report_title} - {month}",
+        "delivery_email_body": "Olá {customer_name},\n\nSegue em anexo o seu relatório de impacto ambiental de {month}.\n",
+        "no_data_warning": "Nenhum dado válido encontrado para as colunas selecionadas. Por favor, verifique seu arquivo e seleções.",
+        "months": ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho", "Agosto", "Setembro", "Outubro",
+                   "Novembro", "Dezembro"],
+        "month_of_year_format": "{month_name} {year}", "month_year_format": "%B-%Y", "last_month_na": "N/D",
+        "report_id_na": "N/D",
+        # Report Template Translations
+        "report_title": "Relatório de Impacto Ambiental", "report_id_label": "ID do Relatório:",
+        "metric_waste": "Total de Resíduos Desviados", "metric_fertilizer": "Fertilizante Orgânico",
+        "metric_co2": "CO₂ Evitado", "metric_driving": "Distância de Carro",
+        "metric_trees": "Árvores Equivalentes", "metric_water": "Água Economizada",
+        "report_footer": "Obrigado por causar um impacto positivo no meio ambiente! | Gerado em {date}"
+    }
+}
+
+# --- Constants ---
+# Spreadsheets can also be exported as CSV or Parquet in the same layout; the format is detected from the content.
+INPUT_FORMAT_EXCEL, INPUT_FORMAT_CSV, INPUT_FORMAT_PARQUET = "excel", "csv", "parquet"
+INPUT_FILE_TYPES = ["xls", "xlsx", "csv", "parquet"]
+DEFAULT_XLS_COLUMNS = {"id": "ID", "name": "NOME", "total": "TOTAL", "contact": "EMAIL"}
+TEMPLATE_FILE_HTML = 'templates/service-report-preview-template.html'
+TEMPLATE_FILE_SVG = 'templates/service-report-template.svg'
+TEMPLATE_FILE_SVG_V1 = 'templates/service-report-template-v1.svg'
+FERTILIZER_FACTOR, CO2_AVOIDED_FACTOR, DRIVING_DISTANCE_CO2_CONVERSION_FACTOR, TREES_EQUIVALENT_CO2_ABSORPTION_FACTOR, WATER_LITERS_FACTOR_BASE, WATER_LITERS_MULTIPLIER = 0.38, 0.77, 0.096, 0.35, 0.214, 12
+# Template variable and format spec for every impact metric column produced by compute_impact_metrics.
+METRIC_FORMATS = {
+    "customer_total": ("customer_waste_kg", ".2f"), "fertilizer_kg": ("fertilizer_kg", ".2f"),
+    "co2_avoided": ("co2_avoided", ".2f"), "driving_distance": ("driving_distance", ".2f"),
+    "trees_equivalent": ("trees_equivalent", ".0f"), "water_liters": ("water_liters", ".2f")
+}
+# Rows of the review table sent to the browser at a time
+REVIEW_PAGE_SIZE = 50
+ODS_IMAGE_FILES = {
+    "ods_2": "ods-2.svg", "ods_3": "ods-3.svg", "ods_6": "ods-6.svg",
+    "ods_11": "ods-11.svg", "ods_12": "ods-12.svg", "ods_13": "ods-13.svg", "ods_15": "ods-15.svg"
+}
+# "embedded" inlines the ODS images as base64 data URIs in every report; "shared" stores them once under
+# ZIP_ASSETS_DIR and has the reports reference them by relative path.
+IMAGE_MODE_EMBEDDED, IMAGE_MODE_SHARED = "embedded", "shared"
+ZIP_ASSETS_DIR = "assets"
+# "svg", "pdf" and "png" produce a ZIP with one file per customer; "combined-pdf" a single PDF with one page
+# per customer. PDF and PNG are rendered from the SVG reports with PyMuPDF, an optional dependency.
+OUTPUT_FORMAT_SVG, OUTPUT_FORMAT_PDF, OUTPUT_FORMAT_PNG, OUTPUT_FORMAT_COMBINED_PDF = \
+    "svg", "pdf", "png", "combined-pdf"
+OUTPUT_FORMATS = [OUTPUT_FORMAT_SVG, OUTPUT_FORMAT_PDF, OUTPUT_FORMAT_PNG, OUTPUT_FORMAT_COMBINED_PDF]
+PNG_DPI = 150
+# Decimals kept by minify_svg for the compact SVG output: 0.001 units on the 900x860 report page, and 0.1 units
+# in the ODS images, whose 610-unit viewBox is drawn 50 units wide.
+SVG_COMPACT_PRECISION = 3
+ODS_COMPACT_PRECISION = 1
+# MuPDF can't draw SVG images nested in an SVG, so PDF/PNG pages get the ODS images as PNGs of this width
+# (they are drawn 50 units wide, so this is about 300 dpi in print).
+ODS_RASTER_WIDTH = 208
+# Worker processes used by the UI to render and compress reports, shared by every session (see server_worker_pool);
+# 1 renders them in the Streamlit process. Defaults to the CPUs this process may run on (its affinity mask or
+# container cpuset), not every CPU of the host.
+DEFAULT_REPORT_WORKERS = int(os.environ.get("ECO_REPORT_WORKERS") or 0) or (
+    len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1)
+# Rows rendered per worker task; together with the bounded number of in-flight tasks this caps the memory
+# held by rendered-but-unwritten reports regardless of the customer count.
+REPORT_CHUNK_SIZE = 25
+# Exported ZIPs are kept in memory up to this size and spill over to a temporary file beyond it.
+ZIP_SPOOL_MAX_SIZE = 32 * 1024 * 1024
+# Total compressed size of the report entries kept for reuse when a ZIP is regenerated in the same process.
+REPORT_ENTRY_CACHE_MAX_SIZE = 256 * 1024 * 1024
+# Parsed spreadsheets are cached on disk by content hash so re-uploads and restarts skip the Excel parse, in the
+# user's cache directory by default. An empty ECO_REPORT_CACHE_DIR disables the cache.
+WORKBOOK_CACHE_DIR = os.environ.get("ECO_REPORT_CACHE_DIR", os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "eco-service-report"))
+# Part of every cached spreadsheet's key: bump it whenever a reader's output changes, so entries written by the
+# previous readers are no longer served (they age out through the size limit).
+WORKBOOK_CACHE_VERSION = 2
+WORKBOOK_CACHE_MAX_SIZE = int(os.environ.get("ECO_REPORT_CACHE_MAX_MB", "512")) * 1024 * 1024
+# E-mail delivery (see deliver_reports): sends run concurrently over at most DELIVERY_CONCURRENCY reused SMTP
+# connections, and a failed send is retried up to DELIVERY_MAX_ATTEMPTS times, waiting DELIVERY_BACKOFF_SECONDS
+# and then twice as long before each new attempt. The server is configured with the ECO_REPORT_SMTP_*
+# environment variables (see get_smtp_settings).
+DELIVERY_CONCURRENCY = 4
+DELIVERY_MAX_ATTEMPTS = 3
+DELIVERY_BACKOFF_SECONDS = 2.0
+DELIVERY_TIMEOUT_SECONDS = 60
+DELIVERY_STATUS_SENT, DELIVERY_STATUS_FAILED, DELIVERY_STATUS_SKIPPED = "sent", "failed", "skipped"
+DELIVERY_FORMATS = [OUTPUT_FORMAT_SVG, OUTPUT_FORMAT_PDF, OUTPUT_FORMAT_PNG]
+MONTH_PT_TO_NUM = {name.lower(): i + 1 for i, name in enumerate(TRANSLATIONS["pt"]["months"])}
+MONTH_EN_TO_NUM = {name.lower(): i + 1 for i, name in enumerate(TRANSLATIONS["en"]["months"])}
+MONTH_NAME_TO_NUM = {**MONTH_PT_TO_NUM, **MONTH_EN_TO_NUM}
+
+
+# --- Date Handling ---
+def format_local_date(date_obj: datetime.datetime, lang: str, t) -> str:
+    t_months = TRANSLATIONS[lang]["months"]
+    month_name = t_months[date_obj.month - 1]
+    return t("month_of_year_format").format(month_name=month_name, year=date_obj.year)
+
+
+# Precompiled patterns for parse_month_string; the month name alternation tries the longest names first.
+_DD_MM_YYYY_RE = re.compile(r'(\d{2})/(\d{2})/(\d{4})')
+_MONTH_NAME_RE = re.compile('|'.join(sorted(map(re.escape, MONTH_NAME_TO_NUM), key=len, reverse=True)))
+_NON_DIGIT_RE = re.compile(r'\D')
+_DASHED_DATE_FORMATS = ('%d-%m-%Y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S')
+MONTH_PARSE_CACHE_SIZE = 4096
+
+
+def parse_month_string(month_str: any) -> Optional[datetime.datetime]:
+    if isinstance(month_str, datetime.datetime):
+        # If it's already a datetime object, extract year and month, set day to 1.
+        return datetime.datetime(month_str.year, month_str.month, 1)
+    return _parse_month_text(str(month_str).strip())
+
+
+def parse_month_strings(values: list) -> list[Optional[datetime.datetime]]:
+    """Parses a header list value by value with parse_month_string; text seen before, in this header or an earlier
+    one, comes from its memo cache instead of being parsed again."""
+    return list(map(parse_month_string, values))
+
+
+@functools.lru_cache(maxsize=MONTH_PARSE_CACHE_SIZE)
+def _parse_month_text(month_str: str) -> Optional[datetime.datetime]:
+    # Try parsing DD/MM/YYYY
+    match = _DD_MM_YYYY_RE.match(month_str)
+    if match:
+        day, month, year = map(int, match.groups())
+        try:
+            return datetime.datetime(year, month, day)
+        except ValueError:
+            pass
+
+    # Try parsing DD-MM-YYYY, YYYY-MM-DD (e.g., from sanitized strings) and YYYY-MM-DD HH:MM:SS (original format)
+    if '-' in month_str:
+        for date_format in _DASHED_DATE_FORMATS:
+            try:
+                return datetime.datetime.strptime(month_str, date_format)
+            except ValueError:
+                pass
+
+    # After trying all specific date formats, if not parsed, try month name + year
+    month_str_lower = month_str.lower()
+    match = _MONTH_NAME_RE.match(month_str_lower)
+    if match:
+        # The remaining part should contain the year, possibly with noise; keep only its digits
+        year_str = _NON_DIGIT_RE.sub('', month_str_lower[match.end():])
+        if len(year_str) == 4:  # Assume 4-digit year
+            try:
+                return datetime.datetime(int(year_str), MONTH_NAME_TO_NUM[match.group()], 1)
+            except ValueError:
+                pass
+    return None
+
+
+# --- Instrumentation ---
+# Every pipeline stage is timed by record_stage, logged as one JSON line and, inside collect_stage_records, kept
+# for the app's diagnostics panel. Context variables keep concurrent Streamlit sessions' records apart.
+logger = logging.getLogger("eco_service_report")
+_STAGE_RECORDS: ContextVar[Optional[list[dict]]] = ContextVar("stage_records", default=None)
+_ACTIVE_STAGE: ContextVar[Optional[dict]] = ContextVar("active_stage", default=None)
+
+
+def configure_logging(level: str = "INFO"):
+    """Sends the stage log lines to stderr; safe to call on every Streamlit rerun."""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(level)
+
+
+@contextlib.contextmanager
+def record_stage(stage: str, level: int = logging.INFO, **fields):
+    """Times the enclosed block as `stage`. Fields passed here, set on the yielded record or added with
+    annotate_stage (e.g. rows, bytes, cache_hit) are recorded and logged with the duration. Stages below INFO (one
+    per report) are only collected when the logger is enabled for them, so a large job doesn't keep one record per
+    customer."""
+    record = {"stage": stage, **fields}
+    token = _ACTIVE_STAGE.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = round(time.perf_counter() - start, 6)
+        _ACTIVE_STAGE.reset(token)
+        records = _STAGE_RECORDS.get()
+        if records is not None and (level >= logging.INFO or logger.isEnabledFor(level)):
+            records.append(record)
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps(record, default=str))
+
+
+def annotate_stage(**fields):
+    """Adds fields to the innermost stage being recorded, if any."""
+    record = _ACTIVE_STAGE.get()
+    if record is not None:
+        record.update(fields)
+
+
+@contextlib.contextmanager
+def collect_stage_records() -> Iterator[list[dict]]:
+    records = []
+    token = _STAGE_RECORDS.set(records)
+    try:
+        yield records
+    finally:
+        _STAGE_RECORDS.reset(token)
+
+
+def summarize_stage_records(records: list[dict]) -> list[dict]:
+    """Aggregates the records per stage: call count, cache hits and the totals of seconds, rows and bytes."""
+    summary = {}
+    for record in records:
+        stage_summary = summary.setdefault(record["stage"], {"stage": record["stage"], "calls": 0, "seconds": 0.0,
+                                                             "rows": 0, "bytes": 0, "cache_hits": 0})
+        stage_summary["calls"] += 1
+        stage_summary["cache_hits"] += bool(record.get("cache_hit"))
+        for field in ("seconds", "rows", "bytes"):
+            stage_summary[field] += record.get(field) or 0
+    return list(summary.values())
+
+
+@contextlib.contextmanager
+def profile_run(path: Optional[str] = None):
+    """Profiles the enclosed block, in the current thread only, with cProfile and dumps the pstats file to `path`
+    if given."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
+
+
+def enter_profile_run(stack: contextlib.ExitStack) -> tuple[Optional[cProfile.Profile], Optional[str]]:
+    """Enters profile_run on `stack` and returns the profiler, or None and why it couldn't start: since Python 3.12
+    only one profiler can be active per process, e.g. the script run's or another job's."""
+    try:
+        return stack.enter_context(profile_run()), None
+    except ValueError as e:
+        logger.warning(json.dumps({"stage": "profile_run", "error": str(e)}))
+        return None, str(e)
+
+
+# --- Workbook Cache ---
+WORKBOOK_CACHE_STATS = {"hits": 0, "misses": 0, "hit_seconds": 0.0, "miss_seconds": 0.0}
+_WORKBOOK_CACHE_LOCK = threading.Lock()
+
+
+def get_content_digest(file_content: bytes) -> str:
+    return hashlib.sha256(file_content).hexdigest()
+
+
+def load_cached(cache_key: str, loader, cache_dir: Optional[str] = None):
+    """Returns the pickled result of a previous `loader()` call with the same key, or calls and stores it.
+
+    Hits refresh the entry's mtime, so evicting the oldest mtimes first makes the size limit an LRU policy.
+    """
+    cache_dir = WORKBOOK_CACHE_DIR if cache_dir is None else cache_dir
+    if not cache_dir or not ensure_private_cache_dir(cache_dir):
+        return loader()
+    start = time.perf_counter()
+    cache_path = os.path.join(cache_dir, f"{cache_key}.pkl")
+    try:
+        with open(cache_path, "rb") as f:
+            result = pickle.load(f)
+        os.utime(cache_path)
+        hit = True
+    except Exception:
+        # A missing, truncated or incompatible entry is a miss and gets rewritten
+        result = loader()
+        hit = False
+        try:
+            partial_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.partial"
+            with open(partial_path, "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(partial_path, cache_path)
+            evict_cache_entries(cache_dir)
+        except OSError:
+            pass
+    annotate_stage(cache_hit=hit)
+    with _WORKBOOK_CACHE_LOCK:
+        WORKBOOK_CACHE_STATS["hits" if hit else "misses"] += 1
+        WORKBOOK_CACHE_STATS["hit_seconds" if hit else "miss_seconds"] += time.perf_counter() - start
+    return result
+
+
+def ensure_private_cache_dir(cache_dir: str) -> bool:
+    """Creates the cache directory accessible to this user only, and checks that an existing one is owned by this
+    user and not writable by others. Loading a pickle can run code, so a directory someone else can write to is
+    never used: it is logged and the cache is skipped."""
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        stat = os.stat(cache_dir)
+    except OSError:
+        return False
+    if hasattr(os, "getuid") and (stat.st_uid != os.getuid() or stat.st_mode & 0o022):
+        logger.warning(json.dumps({"stage": "workbook_cache", "unsafe_cache_dir": cache_dir,
+                                   "owner_uid": stat.st_uid, "mode": oct(stat.st_mode & 0o777)}))
+        return False
+    return True
+
+
+def evict_cache_entries(cache_dir: str, max_size: Optional[int] = None):
+    """Deletes the least recently used entries until the cache fits in `max_size` bytes."""
+    max_size = WORKBOOK_CACHE_MAX_SIZE if max_size is None else max_size
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".pkl"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+
+# --- Data Processing ---
+def load_excel_header(file_content: bytes, cache_dir: Optional[str] = None,
+                      content_digest: Optional[str] = None) -> list:
+    """Reads only the header row, which is all month detection and column mapping need. Besides Excel workbooks,
+    this and load_excel_columns read CSV and Parquet files (see detect_input_format).
+
+    Callers that already hashed the file (see get_content_digest) pass `content_digest` to skip hashing it again.
+    """
+    input_format = detect_input_format(file_content)
+    with record_stage("load_excel_header", input_bytes=len(file_content), input_format=input_format) as stage:
+        content_digest = content_digest or get_content_digest(file_content)
+        read_header = _HEADER_READERS[input_format]
+        header = load_cached(f"v{WORKBOOK_CACHE_VERSION}-{content_digest}-header", lambda: read_header(file_content),
+                             cache_dir)
+        stage["columns"] = len(header)
+        return header
+
+
+def load_excel_columns(file_content: bytes, column_indices: list[int], cache_dir: Optional[str] = None,
+                       content_digest: Optional[str] = None) -> pd.DataFrame:
+    """Loads the data rows of the given columns, in the given order. The frame's columns are the requested indices."""
+    input_format = detect_input_format(file_content)
+    with record_stage("load_excel_columns", input_bytes=len(file_content), input_format=input_format) as stage:
+        content_digest = content_digest or get_content_digest(file_content)
+        cache_key = f"v{WORKBOOK_CACHE_VERSION}-{content_digest}-columns-{'_'.join(map(str, column_indices))}"
+        read_columns = _COLUMNS_READERS[input_format]
+        columns_df = load_cached(cache_key, lambda: read_columns(file_content, column_indices), cache_dir)
+        stage["rows"] = len(columns_df)
+        return columns_df
+
+
+def read_excel_header(file_content: bytes) -> list:
+    # With nrows=0 pandas' openpyxl reader (read-only mode) stops after the first row instead of parsing the sheet
+    return pd.read_excel(io.BytesIO(file_content), header=0, nrows=0).columns.tolist()
+
+
+def read_excel_columns(file_content: bytes, column_indices: list[int]) -> pd.DataFrame:
+    """Parses the given columns keeping the cell types, so numbers need no re-parsing."""
+    if not file_content.startswith(b"PK"):
+        # Legacy .xls workbooks are not zip packages and need pandas' xlrd engine
+        unique_indices = sorted(set(column_indices))
+        columns_df = pd.read_excel(io.BytesIO(file_content), header=0, usecols=unique_indices)
+        columns_df = columns_df.iloc[:, [unique_indices.index(i) for i in column_indices]]
+        columns_df.columns = column_indices
+        return columns_df
+
+    # Reading the cell values straight from openpyxl's read-only mode skips the per-cell conversion pandas applies
+    # to every column of the sheet, including the ones that are not needed.
+    workbook = openpyxl.load_workbook(io.BytesIO(file_content), read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        # Read-only mode stops at the sheet's <dimension> tag, which writers may leave stale; pandas resets it too
+        sheet.reset_dimensions()
+        min_col = min(column_indices)
+        rows = sheet.iter_rows(min_row=2, min_col=min_col + 1, max_col=max(column_indices) + 1,
+                                                values_only=True)
+        offsets = [i - min_col for i in column_indices]
+        data = [[row[offset] if offset < len(row) else None for offset in offsets] for row in rows]
+        # Without the dimension, formatted but empty rows at the end are read too; pandas drops them as well
+        while data and all(value is None for value in data[-1]):
+            data.pop()
+    finally:
+        workbook.close()
+    return pd.DataFrame(data, columns=column_indices)
+
+
+def detect_input_format(file_content: bytes) -> str:
+    """Tells Parquet files and Excel workbooks (XLSX zip packages, legacy XLS compound files) by their magic bytes;
+    anything else is read as CSV."""
+    if file_content.startswith(b"PAR1"):
+        return INPUT_FORMAT_PARQUET
+    if file_content.startswith((b"PK", b"\xd0\xcf\x11\xe0")):
+        return INPUT_FORMAT_EXCEL
+    return INPUT_FORMAT_CSV
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("CSV and Parquet input need pyarrow: pip install pyarrow") from None
+    return pyarrow
+
+
+def read_csv_header(file_content: bytes) -> list:
+    return _sniff_csv(file_content)[0]
+
+
+def read_csv_columns(file_content: bytes, column_indices: list[int]) -> pd.DataFrame:
+    """Parses only the given columns with pyarrow's multithreaded CSV reader. Files with short rows, which pyarrow
+    rejects, are parsed with pandas instead, filling the missing fields with NaN as a short Excel row would be."""
+    pyarrow = import_pyarrow()
+    from pyarrow import csv as pa_csv
+
+    header, delimiter, encoding = _sniff_csv(file_content)
+    # Positional names, so repeated headers (several "TOTAL" columns) stay distinct
+    column_names = [str(i) for i in range(len(header))]
+    include_columns = [str(i) for i in dict.fromkeys(column_indices)]
+    # A semicolon-separated export (Excel's in pt-BR) writes decimals with a comma
+    decimal_point = "," if delimiter == ";" else "."
+    try:
+        columns_df = pa_csv.read_csv(
+            io.BytesIO(file_content),
+            read_options=pa_csv.ReadOptions(column_names=column_names, skip_rows=1, encoding=encoding),
+            parse_options=pa_csv.ParseOptions(delimiter=delimiter),
+            convert_options=pa_csv.ConvertOptions(include_columns=include_columns, decimal_point=decimal_point),
+        ).to_pandas()
+    except pyarrow.ArrowInvalid:
+        columns_df = pd.read_csv(io.BytesIO(file_content), sep=delimiter, decimal=decimal_point, encoding=encoding,
+                                 header=None, skiprows=1, names=column_names, usecols=include_columns)
+    columns_df = columns_df[[str(i) for i in column_indices]]
+    columns_df.columns = column_indices
+    return columns_df
+
+
+def _sniff_csv(file_content: bytes) -> tuple[list[str], str, str]:
+    """Returns the header, the delimiter ("," or ";") and the encoding (UTF-8, or Latin-1 when it doesn't decode)."""
+    try:
+        # Validating the whole file is cheap next to parsing it, and catches accents past the header
+        file_content.decode("utf-8")
+        encoding = "utf-8"
+    except UnicodeDecodeError:
+        encoding = "latin-1"
+    first_line = file_content.split(b"\n", 1)[0]
+    first_line = first_line.decode(encoding).removeprefix("\ufeff").rstrip("\r")
+    delimiter = ";" if first_line.count(";") > first_line.count(",") else ","
+    return next(csv.reader([first_line], delimiter=delimiter)), delimiter, encoding
+
+
+def read_parquet_header(file_content: bytes) -> list:
+    # The schema lives in the file footer, so no row group is read
+    import_pyarrow()
+    from pyarrow import parquet as pq
+
+    return pq.read_schema(io.BytesIO(file_content)).names
+
+
+def read_parquet_columns(file_content: bytes, column_indices: list[int]) -> pd.DataFrame:
+    """Reads only the column chunks of the given columns."""
+    import_pyarrow()
+    from pyarrow import parquet as pq
+
+    parquet_file = pq.ParquetFile(io.BytesIO(file_content))
+    names = parquet_file.schema_arrow.names
+    table = parquet_file.read(columns=[names[i] for i in dict.fromkeys(column_indices)])
+    columns_df = table.to_pandas()[[names[i] for i in column_indices]]
+    columns_df.columns = column_indices
+    return columns_df
+
+
+_HEADER_READERS = {INPUT_FORMAT_EXCEL: read_excel_header, INPUT_FORMAT_CSV: read_csv_header,
+                   INPUT_FORMAT_PARQUET: read_parquet_header}
+_COLUMNS_READERS = {INPUT_FORMAT_EXCEL: read_excel_columns, INPUT_FORMAT_CSV: read_csv_columns,
+                    INPUT_FORMAT_PARQUET: read_parquet_columns}
+
+
+def detect_months(available_columns: list[str], lang: str, t) -> dict[str, dict]:
+    """Maps each localized month name to its TOTAL column, identified by the date column preceding it."""
+    month_map = {}
+    total_indices = [i for i, col_name in enumerate(available_columns) if "TOTAL" in col_name.upper() and i > 0]
+    parsed_dates = parse_month_strings([available_columns[i - 1] for i in total_indices])
+    for i, parsed_date in zip(total_indices, parsed_dates):
+        if parsed_date:
+            month_str = format_local_date(parsed_date, lang, t)
+            month_map[month_str] = {
+                "total_idx": i,
+                "total_col_name": available_columns[i],
+                "date_source": available_columns[i - 1]
+            }
+    return month_map
+
+
+def extract_customers(full_df: pd.DataFrame, id_col_idx: int, name_col_idx: int, total_col_idx: int,
+                      contact_col_idx: Optional[int] = None) -> pd.DataFrame:
+    """Selects the ID, name and total columns, drops incomplete rows and computes the impact metrics.
+    With `contact_col_idx`, the contact column is kept as `customer_contact` (blank when missing)."""
+    with record_stage("extract_customers", input_rows=len(full_df)) as stage:
+        customers_df = _clean_customers(full_df, id_col_idx, name_col_idx, total_col_idx)
+        if contact_col_idx is not None:
+            contacts = full_df.iloc[:, contact_col_idx].reindex(customers_df.index)
+            customers_df['customer_contact'] = contacts.fillna("").astype(str).str.strip()
+        stage["rows"] = len(customers_df)
+        return customers_df
+
+
+def _clean_customers(full_df: pd.DataFrame, id_col_idx: int, name_col_idx: int, total_col_idx: int) -> pd.DataFrame:
+    customers_df = full_df.iloc[:, [id_col_idx, name_col_idx, total_col_idx]].copy()
+    customers_df.columns = ['customer_id', 'customer_name', 'customer_total']
+
+    customers_df = customers_df.dropna(how='all')
+    customers_df['customer_id'] = pd.to_numeric(customers_df['customer_id'], errors='coerce')
+    customers_df['customer_total'] = pd.to_numeric(customers_df['customer_total'], errors='coerce')
+    customers_df = customers_df.dropna(subset=['customer_id', 'customer_total'])
+
+    # Remove rows where customer_name is NaN, 'nan', 'None', or empty
+    customers_df = customers_df[~customers_df['customer_name'].astype(str).str.strip().str.lower().isin(['nan', 'none', ''])]
+
+    customers_df['customer_id'] = customers_df['customer_id'].astype(int)
+    customers_df['customer_name'] = customers_df['customer_name'].astype(str)
+    return compute_impact_metrics(customers_df)
+
+
+# --- Review Table ---
+def filter_customers(customers_df: pd.DataFrame, query: str) -> pd.DataFrame:
+    """Returns the customers whose ID or name contains `query`, ignoring case and accents; all of them when the
+    query is blank."""
+    query = _fold_search_text(pd.Series([query.strip()])).iloc[0]
+    if not query:
+        return customers_df
+    matches = customers_df['customer_id'].astype(str).str.contains(query, regex=False)
+    matches |= _fold_search_text(customers_df['customer_name']).str.contains(query, regex=False)
+    return customers_df[matches]
+
+
+def _fold_search_text(values: pd.Series) -> pd.Series:
+    return values.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii').str.casefold()
+
+
+def get_page_count(row_count: int, page_size: int = REVIEW_PAGE_SIZE) -> int:
+    return max(1, -(-row_count // page_size))
+
+
+def get_customers_page(customers_df: pd.DataFrame, page: int, page_size: int = REVIEW_PAGE_SIZE) -> pd.DataFrame:
+    """Returns the rows of a 1-based page, keeping their index so a selection maps back to customers_df."""
+    return customers_df.iloc[(page - 1) * page_size:page * page_size]
+
+
+# --- Report Generation ---
+# The encoded ODS images of this process, keyed by `compact`
+_ODS_IMAGES: dict[bool, dict[str, str]] = {}
+
+
+def get_ods_images(compact: bool = False) -> dict[str, str]:
+    with record_stage("get_ods_images", level=logging.DEBUG, compact=compact) as stage:
+        images = _ODS_IMAGES.get(compact)
+        stage["cache_hit"] = images is not None
+        if images is None:
+            images = _ODS_IMAGES.setdefault(compact, _encode_ods_images(compact))
+        stage["bytes"] = sum(map(len, images.values()))
+        return images
+
+
+def _encode_ods_images(compact: bool) -> dict[str, str]:
+    images = {}
+    for key, image_bytes in read_ods_image_files(compact).items():
+        if image_bytes is None:
+            images[key] = ""
+        else:
+            encoded = base64.b64encode(image_bytes).decode("utf-8")
+            images[key] = f"data:image/svg+xml;base64,{encoded}"
+    return images
+
+
+def read_ods_image_files(compact: bool = False) -> dict[str, Optional[bytes]]:
+    """Reads the raw ODS image files, mapping each template key to its bytes (None when the file is missing).
+    With `compact`, the images are minified with minify_svg."""
+    images = {}
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    images_dir = os.path.join(dir_path, 'images')
+    for key, filename in ODS_IMAGE_FILES.items():
+        file_path = os.path.join(images_dir, filename)
+        try:
+            with open(file_path, "rb") as f:
+                images[key] = f.read()
+        except FileNotFoundError:
+            images[key] = None
+            continue
+        if compact:
+            images[key] = minify_svg(images[key].decode("utf-8"), ODS_COMPACT_PRECISION).encode("utf-8")
+    return images
+
+
+# --- Impact Metrics ---
+def compute_impact_metrics(customers_df: pd.DataFrame) -> pd.DataFrame:
+    """Adds every impact metric column, and its formatted `<column>_fmt` string, to the cleaned customers frame."""
+    metrics_df = customers_df.copy()
+    customer_total = metrics_df['customer_total'].to_numpy(dtype=float)
+    co2_avoided = customer_total * CO2_AVOIDED_FACTOR
+    metrics_df['fertilizer_kg'] = customer_total * FERTILIZER_FACTOR
+    metrics_df['co2_avoided'] = co2_avoided
+    metrics_df['driving_distance'] = co2_avoided / DRIVING_DISTANCE_CO2_CONVERSION_FACTOR
+    metrics_df['trees_equivalent'] = co2_avoided / TREES_EQUIVALENT_CO2_ABSORPTION_FACTOR
+    metrics_df['water_liters'] = customer_total * WATER_LITERS_FACTOR_BASE * WATER_LITERS_MULTIPLIER
+    for col, (_, format_spec) in METRIC_FORMATS.items():
+        metrics_df[f"{col}_fmt"] = metrics_df[col].map(f"{{:{format_spec}}}".format)
+    return metrics_df
+
+
+def get_metric_values(customer_data: pd.Series) -> dict[str, str]:
+    """Looks up the formatted metrics of a customer row, computing them if the row has not been through the batch stage."""
+    if 'customer_total_fmt' not in customer_data.index:
+        customer_data = compute_impact_metrics(customer_data.to_frame().T).iloc[0]
+    return {template_var: customer_data[f"{col}_fmt"] for col, (template_var, _) in METRIC_FORMATS.items()}
+
+
+# --- SVG Minification ---
+_SVG_NAMESPACE = "http://www.w3.org/2000/svg"
+_EDITOR_NAMESPACES = ("{http://www.inkscape.org/namespaces/inkscape}",
+                      "{http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd}")
+_XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+_TEXT_TAGS = {"text", "tspan"}
+_ID_REFERENCE_RE = re.compile(r'url\(#([^)]+)\)|href="#([^"]+)"')
+_DECIMAL_RE = re.compile(r'(?<![\w.#])\d+\.\d+(?![\w.])')
+_WHITESPACE_RE = re.compile(r'\s+')
+_PATH_COMMAND_SPACE_RE = re.compile(r' ?([A-Za-z]) ?')
+
+
+def minify_svg(svg_source: str, precision: int = SVG_COMPACT_PRECISION) -> str:
+    """Strips the editor metadata (sodipodi/inkscape elements and attributes), comments, unreferenced ids, the XML
+    declaration and the indentation of an SVG, and rounds decimals to `precision` places.
+
+    Whitespace inside text elements is collapsed to single spaces, as SVG renders it anyway, and left alone under
+    xml:space="preserve"; Jinja placeholders pass through untouched.
+    """
+    referenced_ids = {next(filter(None, match.groups())) for match in _ID_REFERENCE_RE.finditer(svg_source)}
+
+    def round_decimal(match: re.Match) -> str:
+        return f"{float(match.group()):.{precision}f}".rstrip("0").rstrip(".")
+
+    def minify_element(element: ElementTree.Element, in_text: bool, preserve: bool):
+        # Drop the namespace from the tags; the root declares it as the default namespace on output
+        element.tag = element.tag.replace(f"{{{_SVG_NAMESPACE}}}", "")
+        preserve = preserve or element.get(_XML_SPACE) == "preserve"
+        in_text = in_text or element.tag in _TEXT_TAGS
+        for name in list(element.attrib):
+            if name.startswith(_EDITOR_NAMESPACES) or (name == "id" and element.get(name) not in referenced_ids):
+                del element.attrib[name]
+            elif name == "d":
+                element.set(name, _compact_path_data(_DECIMAL_RE.sub(round_decimal, element.get(name))))
+            elif name != "href":
+                element.set(name, _DECIMAL_RE.sub(round_decimal, element.get(name)))
+        for child in list(element):
+            if child.tag.startswith(_EDITOR_NAMESPACES):
+                element.remove(child)
+                continue
+            minify_element(child, in_text, preserve)
+            if not preserve:
+                child.tail = _collapse_svg_whitespace(child.tail, in_text)
+        if not preserve:
+            element.text = _collapse_svg_whitespace(element.text, in_text)
+
+    root = ElementTree.fromstring(svg_source)
+    minify_element(root, False, False)
+    root.set("xmlns", _SVG_NAMESPACE)
+    return ElementTree.tostring(root, encoding="unicode")
+
+
+def _compact_path_data(path_data: str) -> str:
+    """Drops the separators path data doesn't need: around commands and commas and before negative numbers."""
+    path_data = _PATH_COMMAND_SPACE_RE.sub(r"\1", _WHITESPACE_RE.sub(" ", path_data).strip())
+    return path_data.replace(" ,", ",").replace(", ", ",").replace(" -", "-")
+
+
+def _collapse_svg_whitespace(text: Optional[str], in_text: bool) -> Optional[str]:
+    if text is None or (not in_text and not text.strip()):
+        return None
+    return _WHITESPACE_RE.sub(" ", text)
+
+
+# --- Template Cache ---
+# Compiled templates are shared by every report rendered in this process. Each entry is keyed by the
+# absolute template path (and whether it was minified) and remembers the file's mtime, so editing a template
+# triggers a recompile.
+_JINJA_ENV = Environment()
+_TEMPLATE_CACHE: dict[tuple[str, bool], tuple[float, Template, str]] = {}
+_TEMPLATE_CACHE_LOCK = threading.Lock()
+TEMPLATE_CACHE_STATS = {"compiled": 0, "reused": 0}
+# The counts of the innermost count_template_cache block, which the worker processes' counts are added to
+_TEMPLATE_CACHE_COUNTS: ContextVar[Optional[dict[str, int]]] = ContextVar("template_cache_counts", default=None)
+
+
+def get_template(template_path: str, compact: bool = False) -> Template:
+    """Returns the compiled template for a path relative to `src/`, compiling it only when new or modified.
+    With `compact`, the SVG template is minified with minify_svg once, before compiling."""
+    return _load_template(template_path, compact)[0]
+
+
+def get_template_digest(template_path: str, compact: bool = False) -> str:
+    """Returns the SHA-256 of the template source the compiled template was built from."""
+    return _load_template(template_path, compact)[1]
+
+
+def _load_template(template_path: str, compact: bool = False) -> tuple[Template, str]:
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    template_path = os.path.join(dir_path, template_path)
+    mtime = os.path.getmtime(template_path)
+    with _TEMPLATE_CACHE_LOCK:
+        cached = _TEMPLATE_CACHE.get((template_path, compact))
+        if cached and cached[0] == mtime:
+            _count_template_cache("reused")
+            return cached[1], cached[2]
+        with open(template_path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        if compact:
+            source = minify_svg(source)
+        jinja_template = _JINJA_ENV.from_string(source)
+        digest = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        _TEMPLATE_CACHE[(template_path, compact)] = (mtime, jinja_template, digest)
+        _count_template_cache("compiled")
+        return jinja_template, digest
+
+
+def _count_template_cache(outcome: str):
+    TEMPLATE_CACHE_STATS[outcome] += 1
+    counts = _TEMPLATE_CACHE_COUNTS.get()
+    if counts is not None:
+        counts[outcome] += 1
+
+
+@contextlib.contextmanager
+def count_template_cache() -> Iterator[dict[str, int]]:
+    """Counts the templates compiled and reused inside the block, including by the worker processes of
+    iter_chunk_results, e.g. to show that a whole batch compiled its template once per process."""
+    counts = {"compiled": 0, "reused": 0}
+    token = _TEMPLATE_CACHE_COUNTS.set(counts)
+    try:
+        yield counts
+    finally:
+        _TEMPLATE_CACHE_COUNTS.reset(token)
+
+
+def clear_template_cache():
+    with _TEMPLATE_CACHE_LOCK:
+        _TEMPLATE_CACHE.clear()
+        TEMPLATE_CACHE_STATS.update(compiled=0, reused=0)
+
+
+def get_report_context(report_month_str: str, lang: str, t, images: Optional[dict[str, str]] = None) -> dict:
+    """Builds the template variables shared by every customer's report, so a batch computes them only once."""
+    report_date = parse_month_string(report_month_str)
+    if report_date:
+        report_id_date_str = report_date.strftime('%Y-%m')
+    else:
+        report_id_date_str = t("report_id_na")
+
+    current_date = format_local_date(datetime.datetime.now(), lang, t)
+    context = {
+        'report_title': t('report_title'),
+        'report_date': report_month_str,
+        'report_id_label': t('report_id_label'),
+        'report_id_date': report_id_date_str,
+        'current_date': current_date,
+        'metric_waste': t('metric_waste'),
+        'metric_fertilizer': t('metric_fertilizer'),
+        'metric_co2': t('metric_co2'),
+        'metric_driving': t('metric_driving'),
+        'metric_trees': t('metric_trees'),
+        'metric_water': t('metric_water'),
+        'report_footer': t('report_footer').format(date=current_date)
+    }
+    context.update(get_ods_images() if images is None else images)
+    return context
+
+
+def create_report_html(template_path: str, customer_data: pd.Series, report_month_str: str, lang: str, t,
+                       images: Optional[dict[str, str]] = None, context: Optional[dict] = None,
+                       compact: bool = False) -> str:
+    with record_stage("create_report_html", level=logging.DEBUG, template=template_path) as stage:
+        jinja_template = get_template(template_path, compact)
+        if context is None:
+            context = get_report_context(report_month_str, lang, t, images)
+
+        template_vars = dict(context)
+        template_vars['report_id'] = f"{customer_data['customer_id']}-{context['report_id_date']}"
+        template_vars['customer_name'] = customer_data['customer_name']
+        template_vars.update(get_metric_values(customer_data))
+        report = jinja_template.render(template_vars)
+        stage["bytes"] = len(report)
+        return report
+
+
+def sanitize_filename(text: str) -> str:
+    """Sanitizes a value to be safe for use as a filename by converting it to a string first."""
+    text = str(text).strip()
+    # Normalize unicode characters to their closest ASCII equivalents
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('utf-8')
+    # Replace all non-alphanumeric (except underscore) characters with a single underscore
+    text = re.sub(r'[^a-zA-Z0-9_]+', '_', text)
+    # Remove leading/trailing underscores
+    text = text.strip('_')
+    return text[:50]
+
+
+class CompressedEntry(NamedTuple):
+    """A ZIP entry whose content was already deflated, so it can be written without compressing it again."""
+    filename: str
+    crc: int
+    file_size: int
+    compressed: bytes
+
+
+def get_report_filename(customer_row: pd.Series, filename_date_str: str, extension: str = "svg") -> str:
+    customer_name_sanitized = sanitize_filename(customer_row['customer_name'])
+    return f"{customer_row['customer_id']}_{customer_name_sanitized}_{filename_date_str}.{extension}"
+
+
+def compress_entry(filename: str, content: str) -> CompressedEntry:
+    """Deflates a ZIP entry exactly as zipfile.ZipFile(..., ZIP_DEFLATED).writestr would."""
+    data = content.encode('utf-8')
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    return CompressedEntry(filename, zlib.crc32(data), len(data), compressed)
+
+
+def write_compressed_entry(zf: zipfile.ZipFile, entry: CompressedEntry, date_time: tuple):
+    """Appends a precompressed entry to an open ZipFile.
+
+    zipfile has no public API for writing raw deflated data, so this mirrors what ZipFile.writestr does
+    for a seekable file: write the local header followed by the data and register the entry for the
+    central directory written on close.
+    """
+    zinfo = zipfile.ZipInfo(entry.filename, date_time=date_time)
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo.external_attr = 0o600 << 16
+    zinfo.CRC, zinfo.file_size, zinfo.compress_size = entry.crc, entry.file_size, len(entry.compressed)
+    if not zf.fp:
+        raise ValueError("Attempt to write to ZIP archive that was already closed")
+    if zf._writing:
+        raise ValueError("Can't write to ZIP archive while an open writing handle exists")
+    with zf._lock:
+        # The same checks as writestr: an open archive in a writable mode, and a warning on duplicate names
+        zf._writecheck(zinfo)
+        zf._didModify = True
+        if zf._seekable:
+            zf.fp.seek(zf.start_dir)
+        zinfo.header_offset = zf.fp.tell()
+        zf.fp.write(zinfo.FileHeader(zip64=False))
+        zf.fp.write(entry.compressed)
+        zf.filelist.append(zinfo)
+        zf.NameToInfo[zinfo.filename] = zinfo
+        zf.start_dir = zf.fp.tell()
+
+
+class ReportEntryCache:
+    """LRU cache of compressed report entries, bounded by their total compressed size."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, CompressedEntry] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CompressedEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CompressedEntry):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous.compressed)
+            self._entries[key] = entry
+            self._size += len(entry.compressed)
+            while self._size > self.max_size and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.compressed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+REPORT_ENTRY_CACHE = ReportEntryCache(REPORT_ENTRY_CACHE_MAX_SIZE)
+
+
+def get_report_entry_keys(customers_df: pd.DataFrame, context: dict, filename_date_str: str,
+                          compact: bool = False) -> list[str]:
+    """Hashes everything a report entry depends on: its row values, the shared template variables (month,
+    language, generation date and image references) and the template source."""
+    batch_hash = hashlib.sha256(get_template_digest(TEMPLATE_FILE_SVG, compact).encode())
+    batch_hash.update(repr((filename_date_str, sorted(context.items()))).encode('utf-8'))
+    batch_key = batch_hash.hexdigest()
+    rows = customers_df[['customer_id', 'customer_name', 'customer_total']].itertuples(index=False, name=None)
+    return [hashlib.sha256(f"{batch_key}{row!r}".encode('utf-8')).hexdigest() for row in rows]
+
+
+def iter_rendered_reports(customers_df: pd.DataFrame, report_month_str: str, lang: str,
+                          images: dict[str, str], compact: bool = False) -> Iterator[CompressedEntry]:
+    """Renders and deflates the SVG reports of the given customers one at a time."""
+    def t(key): return TRANSLATIONS[lang].get(key, key)
+
+    report_date = parse_month_string(report_month_str)
+    filename_date_str = report_date.strftime('%m%Y') if report_date else "data"
+    context = get_report_context(report_month_str, lang, t, images)
+    for _, customer_row in customers_df.iterrows():
+        report_svg_content = create_report_html(TEMPLATE_FILE_SVG, customer_row, report_month_str, lang, t,
+                                                context=context, compact=compact)
+        yield compress_entry(get_report_filename(customer_row, filename_date_str), report_svg_content)
+
+
+def render_compressed_reports(customers_df: pd.DataFrame, report_month_str: str, lang: str,
+                              images: dict[str, str], compact: bool = False) -> list[CompressedEntry]:
+    """Renders and deflates the SVG reports of a chunk of customers; runs inside the worker processes."""
+    return list(iter_rendered_reports(customers_df, report_month_str, lang, images, compact))
+
+
+_WORKER_POOL: ContextVar[Optional[ProcessPoolExecutor]] = ContextVar("worker_pool", default=None)
+
+
+_SERVER_WORKER_POOL: Optional[ProcessPoolExecutor] = None
+_SERVER_WORKER_POOL_LOCK = threading.Lock()
+
+
+@functools.cache
+def _get_worker_mp_context() -> multiprocessing.context.BaseContext:
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    mp_context = multiprocessing.get_context("forkserver")
+    # The fork server imports the heavy dependencies once, so each worker forked from it starts with them loaded.
+    # This module itself is only importable there if its directory is on the default sys.path.
+    mp_context.set_forkserver_preload([__name__, "pandas", "openpyxl", "jinja2"])
+    return mp_context
+
+
+def create_worker_pool(workers: int) -> ProcessPoolExecutor:
+    """A pool of `workers` processes started by a fork server (spawned where there is none). Forking this process
+    directly isn't safe in the Streamlit server, where another session's thread may hold a lock at fork time
+    (e.g. the template cache's) that the child then waits on forever."""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=_get_worker_mp_context())
+
+
+@contextlib.contextmanager
+def shared_worker_pool(workers: int):
+    """Makes the iter_chunk_results calls inside the block reuse one pool of `workers` processes, e.g. across the
+    months of a batch, instead of each starting its own; the workers keep their compiled template (the images are
+    still sent with every chunk). Inside server_worker_pool, the server's pool is reused instead."""
+    if workers <= 1 or _WORKER_POOL.get() is not None:
+        yield _WORKER_POOL.get()
+        return
+    with create_worker_pool(workers) as executor:
+        token = _WORKER_POOL.set(executor)
+        try:
+            yield executor
+        finally:
+            _WORKER_POOL.reset(token)
+
+
+@contextlib.contextmanager
+def server_worker_pool():
+    """Makes the block use the pool of DEFAULT_REPORT_WORKERS processes shared by every session of a long-running
+    server, created on first use. Concurrent builds queue their chunks on it, so the server never runs more
+    workers than that; a pool broken by a crashed worker is replaced for the next block."""
+    global _SERVER_WORKER_POOL
+    with _SERVER_WORKER_POOL_LOCK:
+        if _SERVER_WORKER_POOL is None:
+            _SERVER_WORKER_POOL = create_worker_pool(DEFAULT_REPORT_WORKERS)
+        executor = _SERVER_WORKER_POOL
+    token = _WORKER_POOL.set(executor)
+    try:
+        yield executor
+    except BrokenProcessPool:
+        with _SERVER_WORKER_POOL_LOCK:
+            if _SERVER_WORKER_POOL is executor:
+                _SERVER_WORKER_POOL = None
+        raise
+    finally:
+        _WORKER_POOL.reset(token)
+
+
+def iter_chunk_results(render_chunk: Callable, customers_df: pd.DataFrame, workers: int, *args) -> Iterator:
+    """Calls render_chunk(chunk, *args) for every REPORT_CHUNK_SIZE rows and yields the results in row order.
+
+    With more than one worker the chunks are rendered in a process pool (the shared_worker_pool or
+    server_worker_pool if one is active), keeping at most two chunks per worker in flight; otherwise they are
+    rendered in this process.
+    """
+    chunks = (customers_df.iloc[i:i + REPORT_CHUNK_SIZE] for i in range(0, len(customers_df), REPORT_CHUNK_SIZE))
+    if workers <= 1:
+        for chunk in chunks:
+            yield render_chunk(chunk, *args)
+        return
+    shared_executor = _WORKER_POOL.get()
+    with contextlib.nullcontext(shared_executor) if shared_executor else create_worker_pool(workers) as executor:
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(executor.submit(_render_chunk_counting_templates, render_chunk, chunk, *args))
+                if len(pending) >= workers * 2:
+                    yield _add_worker_template_counts(*pending.popleft().result())
+            while pending:
+                yield _add_worker_template_counts(*pending.popleft().result())
+        finally:
+            # When the consumer stops early (e.g. a cancelled job), don't render the chunks nobody will read
+            for future in pending:
+                future.cancel()
+
+
+def _render_chunk_counting_templates(render_chunk: Callable, *args) -> tuple[object, dict[str, int]]:
+    """Runs inside the worker processes: returns what render_chunk returned and its template cache counts."""
+    with count_template_cache() as counts:
+        return render_chunk(*args), counts
+
+
+def _add_worker_template_counts(result, worker_counts: dict[str, int]):
+    counts = _TEMPLATE_CACHE_COUNTS.get()
+    if counts is not None:
+        for outcome, count in worker_counts.items():
+            counts[outcome] += count
+    return result
+
+
+def iter_compressed_reports(customers_df: pd.DataFrame, report_month_str: str, lang: str, images: dict[str, str],
+                            workers: int, compact: bool = False) -> Iterator[CompressedEntry]:
+    """Yields the compressed reports in row order, rendered by a pool of `workers` processes."""
+    with contextlib.closing(iter_chunk_results(render_compressed_reports, customers_df, workers, report_month_str,
+                                               lang, images, compact)) as chunk_entries:
+        for entries in chunk_entries:
+            yield from entries
+
+
+def write_cached_report_entries(zf: zipfile.ZipFile, customers_df: pd.DataFrame, report_month_str: str, lang: str,
+                                images: dict[str, str], workers: int, entry_cache: ReportEntryCache,
+                                progress: Optional[Callable[[int, int], None]] = None, folder: str = "",
+                                compact: bool = False) -> dict[str, int]:
+    """Writes the report entries in row order, reusing the cached entry of every customer whose report inputs are
+    unchanged and rendering only the others."""
+    def t(key): return TRANSLATIONS[lang].get(key, key)
+
+    report_date = parse_month_string(report_month_str)
+    filename_date_str = report_date.strftime('%m%Y') if report_date else "data"
+    keys = get_report_entry_keys(customers_df, get_report_context(report_month_str, lang, t, images),
+                                 filename_date_str, compact)
+    cached_entries = [entry_cache.get(key) for key in keys]
+    missing_df = customers_df.iloc[[i for i, entry in enumerate(cached_entries) if entry is None]]
+    if workers > 1 and len(missing_df) > 1:
+        rendered_entries = iter_compressed_reports(missing_df, report_month_str, lang, images, workers, compact)
+    else:
+        rendered_entries = iter_rendered_reports(missing_df, report_month_str, lang, images, compact)
+
+    date_time = time.localtime(time.time())[:6]
+    try:
+        for done, (key, entry) in enumerate(zip(keys, cached_entries), 1):
+            if entry is None:
+                entry = next(rendered_entries)
+                entry_cache.put(key, entry)
+            write_compressed_entry(zf, entry._replace(filename=folder + entry.filename), date_time)
+            if progress:
+                progress(done, len(keys))
+    finally:
+        rendered_entries.close()
+    return {"reused": len(customers_df) - len(missing_df), "rebuilt": len(missing_df)}
+
+
+def write_reports_zip(file: Union[str, BinaryIO], customers_df: pd.DataFrame, report_month_str: str, lang: str,
+                      image_mode: str = IMAGE_MODE_EMBEDDED, workers: int = 1,
+                      entry_cache: Optional[ReportEntryCache] = None,
+                      progress: Optional[Callable[[int, int], None]] = None, compact: bool = False) -> dict[str, int]:
+    """Writes the reports ZIP to a path or seekable file object, streaming each entry as soon as it is rendered.
+
+    With an `entry_cache`, unchanged reports from earlier runs are reused instead of rendered again. `progress` is
+    called with (reports written, total reports) after every entry; an exception it raises aborts the ZIP.
+    `compact` renders the minified template and images (see minify_svg). Returns how many report entries were
+    reused and how many were rebuilt.
+    """
+    with record_stage("write_reports_zip", rows=len(customers_df), image_mode=image_mode, workers=workers,
+                      compact=compact) as stage, count_template_cache() as template_counts:
+        entry_counts = _write_reports_zip(file, customers_df, report_month_str, lang, image_mode, workers,
+                                          entry_cache, progress, compact)
+        stage.update(entry_counts, templates_compiled=template_counts["compiled"],
+                     templates_reused=template_counts["reused"])
+        stage["bytes"] = os.path.getsize(file) if isinstance(file, str) else file.tell()
+        return entry_counts
+
+
+def _write_reports_zip(file: Union[str, BinaryIO], customers_df: pd.DataFrame, report_month_str: str, lang: str,
+                       image_mode: str, workers: int, entry_cache: Optional[ReportEntryCache],
+                       progress: Optional[Callable[[int, int], None]], compact: bool) -> dict[str, int]:
+    with zipfile.ZipFile(file, 'a', zipfile.ZIP_DEFLATED) as zf:
+        images = write_shared_assets(zf, compact) if image_mode == IMAGE_MODE_SHARED else get_ods_images(compact)
+        return write_report_entries(zf, customers_df, report_month_str, lang, images, workers, entry_cache, progress,
+                                    compact=compact)
+
+
+def write_shared_assets(zf: zipfile.ZipFile, compact: bool = False) -> dict[str, str]:
+    """Stores each ODS image once under ZIP_ASSETS_DIR and returns the relative paths the reports reference."""
+    images = {}
+    for key, image_bytes in read_ods_image_files(compact).items():
+        images[key] = ""
+        if image_bytes is not None:
+            images[key] = f"{ZIP_ASSETS_DIR}/{ODS_IMAGE_FILES[key]}"
+            zf.writestr(images[key], image_bytes)
+    return images
+
+
+def write_report_entries(zf: zipfile.ZipFile, customers_df: pd.DataFrame, report_month_str: str, lang: str,
+                         images: dict[str, str], workers: int = 1, entry_cache: Optional[ReportEntryCache] = None,
+                         progress: Optional[Callable[[int, int], None]] = None, folder: str = "",
+                         compact: bool = False) -> dict[str, int]:
+    """Writes the SVG report entries of one month into an open ZIP, under `folder` (empty or ending in "/")."""
+    def t(key): return TRANSLATIONS[lang].get(key, key)
+
+    if entry_cache is not None:
+        return write_cached_report_entries(zf, customers_df, report_month_str, lang, images, workers, entry_cache,
+                                           progress, folder, compact)
+    report_date = parse_month_string(report_month_str)
+    filename_date_str = report_date.strftime('%m%Y') if report_date else "data"
+    if workers > 1 and len(customers_df) > 1:
+        date_time = time.localtime(time.time())[:6]
+        entries = iter_compressed_reports(customers_df, report_month_str, lang, images, workers, compact)
+        try:
+            for done, entry in enumerate(entries, 1):
+                write_compressed_entry(zf, entry._replace(filename=folder + entry.filename), date_time)
+                if progress:
+                    progress(done, len(customers_df))
+        finally:
+            entries.close()
+    else:
+        context = get_report_context(report_month_str, lang, t, images)
+        for done, (_, customer_row) in enumerate(customers_df.iterrows(), 1):
+            report_svg_content = create_report_html(TEMPLATE_FILE_SVG, customer_row, report_month_str, lang, t,
+                                                    context=context, compact=compact)
+            zf.writestr(folder + get_report_filename(customer_row, filename_date_str), report_svg_content)
+            if progress:
+                progress(done, len(customers_df))
+    return {"reused": 0, "rebuilt": len(customers_df)}
+
+
+def generate_reports_zip(customers_df: pd.DataFrame, report_month_str: str, lang: str,
+                         image_mode: str = IMAGE_MODE_EMBEDDED, workers: int = 1, compact: bool = False) -> bytes:
+    buf = io.BytesIO()
+    write_reports_zip(buf, customers_df, report_month_str, lang, image_mode, workers, compact=compact)
+    return buf.getvalue()
+
+
+def export_reports_zip(customers_df: pd.DataFrame, report_month_str: str, lang: str,
+                       image_mode: str = IMAGE_MODE_EMBEDDED, workers: int = 1,
+                       entry_cache: Optional[ReportEntryCache] = None,
+                       progress: Optional[Callable[[int, int], None]] = None,
+                       compact: bool = False) -> tuple[BinaryIO, dict[str, int]]:
+    """Streams the reports ZIP into a spooled temporary file and returns it rewound, ready to be read, with the
+    reused/rebuilt entry counts."""
+    zip_file = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_SIZE)
+    try:
+        entry_counts = write_reports_zip(zip_file, customers_df, report_month_str, lang, image_mode, workers,
+                                         entry_cache, progress, compact)
+    except BaseException:
+        zip_file.close()
+        raise
+    zip_file.seek(0)
+    return zip_file, entry_counts
+
+
+# --- Document Rendering ---
+_PYMUPDF_LOCK = threading.Lock()
+
+
+def import_pymupdf():
+    try:
+        import pymupdf
+    except ImportError:
+        raise ImportError("PDF and PNG output need PyMuPDF: pip install pymupdf") from None
+    return pymupdf
+
+
+def is_document_renderer_available() -> bool:
+    return importlib.util.find_spec("pymupdf") is not None
+
+
+@functools.cache
+def get_raster_ods_images() -> dict[str, str]:
+    """Rasterizes the ODS images to PNG data URIs once per process, so every page a worker renders reuses them."""
+    pymupdf = import_pymupdf()
+    images = {}
+    with _PYMUPDF_LOCK:
+        for key, image_bytes in read_ods_image_files().items():
+            images[key] = ""
+            if image_bytes is not None:
+                with pymupdf.open(stream=image_bytes, filetype="svg") as image_doc:
+                    zoom = ODS_RASTER_WIDTH / image_doc[0].rect.width
+                    png_bytes = image_doc[0].get_pixmap(matrix=pymupdf.Matrix(zoom, zoom)).tobytes("png")
+                images[key] = f"data:image/png;base64,{base64.b64encode(png_bytes).decode('utf-8')}"
+    return images
+
+
+def iter_rendered_svgs(customers_df: pd.DataFrame, report_month_str: str, lang: str) -> Iterator[tuple[pd.Series, str]]:
+    """Renders the SVG reports of the given customers for conversion, with the rasterized ODS images."""
+    def t(key): return TRANSLATIONS[lang].get(key, key)
+
+    context = get_report_context(report_month_str, lang, t, get_raster_ods_images())
+    for _, customer_row in customers_df.iterrows():
+        yield customer_row, create_report_html(TEMPLATE_FILE_SVG, customer_row, report_month_str, lang, t,
+                                               context=context)
+
+
+def convert_svg_pages(svg_contents: list[str], output_format: str) -> list[bytes]:
+    """Converts SVG reports to PNGs or, for "pdf", to one-page PDFs; "combined-pdf" returns a single PDF with a
+    page per report. Fonts are subset and identical objects shared, which keeps the PDFs small."""
+    pymupdf = import_pymupdf()
+    with _PYMUPDF_LOCK:
+        documents = []
+        combined_doc = pymupdf.open() if output_format == OUTPUT_FORMAT_COMBINED_PDF else None
+        for svg_content in svg_contents:
+            with pymupdf.open(stream=svg_content.encode('utf-8'), filetype="svg") as svg_doc:
+                if output_format == OUTPUT_FORMAT_PNG:
+                    documents.append(svg_doc[0].get_pixmap(dpi=PNG_DPI).tobytes("png"))
+                    continue
+                with pymupdf.open("pdf", svg_doc.convert_to_pdf()) as page_doc:
+                    if combined_doc is not None:
+                        combined_doc.insert_pdf(page_doc)
+                    else:
+                        page_doc.subset_fonts()
+                        documents.append(page_doc.tobytes(garbage=4, deflate=True))
+        if combined_doc is not None:
+            combined_doc.subset_fonts()
+            documents.append(combined_doc.tobytes(garbage=4, deflate=True))
+            combined_doc.close()
+        return documents
+
+
+def render_documents(customers_df: pd.DataFrame, report_month_str: str, lang: str,
+                     output_format: str) -> list[tuple[str, bytes]]:
+    """Renders a chunk of customers to (filename, PDF or PNG bytes) pairs; runs inside the worker processes."""
+    report_date = parse_month_string(report_month_str)
+    filename_date_str = report_date.strftime('%m%Y') if report_date else "data"
+    rows, svg_contents = zip(*iter_rendered_svgs(customers_df, report_month_str, lang))
+    documents = convert_svg_pages(list(svg_contents), output_format)
+    return [(get_report_filename(customer_row, filename_date_str, output_format), document)
+            for customer_row, document in zip(rows, documents)]
+
+
+def render_combined_pdf_chunk(customers_df: pd.DataFrame, report_month_str: str, lang: str) -> bytes:
+    """Renders a chunk of customers to one multi-page PDF; runs inside the worker processes."""
+    svg_contents = [svg_content for _, svg_content in iter_rendered_svgs(customers_df, report_month_str, lang)]
+    return convert_svg_pages(svg_contents, OUTPUT_FORMAT_COMBINED_PDF)[0]
+
+
+def write_documents_zip(file: Union[str, BinaryIO], customers_df: pd.DataFrame, report_month_str: str, lang: str,
+                        output_format: str = OUTPUT_FORMAT_PDF, workers: int = 1,
+                        progress: Optional[Callable[[int, int], None]] = None) -> dict[str, int]:
+    """Writes a ZIP with one PDF or PNG per customer, rendered in chunks by a pool of `workers` processes."""
+    # PNGs and PyMuPDF's deflated PDFs don't compress any further
+    with record_stage("write_documents_zip", rows=len(customers_df), output_format=output_format,
+                      workers=workers) as stage, zipfile.ZipFile(file, 'a', zipfile.ZIP_STORED) as zf:
+        entry_counts = write_document_entries(zf, customers_df, report_month_str, lang, output_format, workers,
+                                              progress)
+        stage["bytes"] = zf.fp.tell()
+    return entry_counts
+
+
+def write_document_entries(zf: zipfile.ZipFile, customers_df: pd.DataFrame, report_month_str: str, lang: str,
+                           output_format: str, workers: int = 1, progress: Optional[Callable[[int, int], None]] = None,
+                           folder: str = "") -> dict[str, int]:
+    """Writes the PDF or PNG entries of one month into an open ZIP, under `folder` (empty or ending in "/")."""
+    done = 0
+    chunks = iter_chunk_results(render_documents, customers_df, workers, report_month_str, lang, output_format)
+    with contextlib.closing(chunks):
+        for documents in chunks:
+            for filename, document in documents:
+                zf.writestr(folder + filename, document, zipfile.ZIP_STORED)
+            done += len(documents)
+            if progress:
+                progress(done, len(customers_df))
+    return {"reused": 0, "rebuilt": len(customers_df)}
+
+
+def write_combined_pdf(file: Union[str, BinaryIO], customers_df: pd.DataFrame, report_month_str: str, lang: str,
+                       workers: int = 1, progress: Optional[Callable[[int, int], None]] = None) -> dict[str, int]:
+    """Writes a single PDF with one page per customer, in row order. The workers render multi-page PDFs of
+    REPORT_CHUNK_SIZE customers, which are appended here as they arrive."""
+    pymupdf = import_pymupdf()
+    with record_stage("write_combined_pdf", rows=len(customers_df), workers=workers) as stage:
+        with pymupdf.open() as combined_doc:
+            chunks = iter_chunk_results(render_combined_pdf_chunk, customers_df, workers, report_month_str, lang)
+            with contextlib.closing(chunks):
+                for chunk_pdf in chunks:
+                    with _PYMUPDF_LOCK, pymupdf.open("pdf", chunk_pdf) as chunk_doc:
+                        combined_doc.insert_pdf(chunk_doc)
+                    if progress:
+                        progress(len(combined_doc), len(customers_df))
+            with _PYMUPDF_LOCK:
+                pdf_bytes = combined_doc.tobytes(garbage=4, deflate=True)
+        stage["bytes"] = len(pdf_bytes)
+        if isinstance(file, str):
+            with open(file, "wb") as f:
+                f.write(pdf_bytes)
+        else:
+            file.write(pdf_bytes)
+    return {"reused": 0, "rebuilt": len(customers_df)}
+
+
+def export_reports(customers_df: pd.DataFrame, report_month_str: str, lang: str,
+                   output_format: str = OUTPUT_FORMAT_SVG, image_mode: str = IMAGE_MODE_EMBEDDED, workers: int = 1,
+                   entry_cache: Optional[ReportEntryCache] = None,
+                   progress: Optional[Callable[[int, int], None]] = None,
+                   compact: bool = False) -> tuple[BinaryIO, dict[str, int]]:
+    """Like export_reports_zip for any output format; `image_mode`, `entry_cache` and `compact` only apply to SVG."""
+    if output_format == OUTPUT_FORMAT_SVG:
+        return export_reports_zip(customers_df, report_month_str, lang, image_mode, workers, entry_cache, progress,
+                                  compact)
+    output_file = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_SIZE)
+    try:
+        if output_format == OUTPUT_FORMAT_COMBINED_PDF:
+            entry_counts = write_combined_pdf(output_file, customers_df, report_month_str, lang, workers, progress)
+        else:
+            entry_counts = write_documents_zip(output_file, customers_df, report_month_str, lang, output_format,
+                                               workers, progress)
+    except BaseException:
+        output_file.close()
+        raise
+    output_file.seek(0)
+    return output_file, entry_counts
+
+
+# --- Month Batches ---
+def extract_month_customers(columns_df: pd.DataFrame, report_months: list[str]) -> dict[str, pd.DataFrame]:
+    """Splits the columns loaded once for a batch (ID, name, then one total column per month in `report_months`
+    order) into the customers of each month."""
+    return {report_month_str: extract_customers(columns_df, 0, 1, 2 + i)
+            for i, report_month_str in enumerate(report_months)}
+
+
+def get_month_folder(report_month_str: str, lang: str, t) -> str:
+    """Folder of a month in a batch archive, e.g. "2025-11_Novembro_2025", so the folders sort chronologically."""
+    report_date = parse_month_string(report_month_str)
+    if not report_date:
+        return sanitize_filename(report_month_str)
+    return f"{report_date:%Y-%m}_{sanitize_filename(format_local_date(report_date, lang, t))}"
+
+
+def get_batch_zip_filename(report_months: list[str], lang: str, t) -> str:
+    report_dates = sorted(date for date in parse_month_strings(report_months) if date)
+    month_names = [format_local_date(report_dates[i], lang, t) for i in (0, -1)] if report_dates else ["Reports"]
+    zip_filename = t("zip_filename").format(month_name=" - ".join(dict.fromkeys(month_names)))
+    return f"{sanitize_filename(os.path.splitext(zip_filename)[0])}.zip"
+
+
+def write_month_batch_zip(file: Union[str, BinaryIO], month_customers: dict[str, pd.DataFrame], lang: str,
+                          output_format: str = OUTPUT_FORMAT_SVG, image_mode: str = IMAGE_MODE_EMBEDDED,
+                          workers: int = 1, entry_cache: Optional[ReportEntryCache] = None,
+                          progress: Optional[Callable[[int, int], None]] = None,
+                          compact: bool = False) -> dict[str, int]:
+    """Writes one archive with a folder per month (see get_month_folder) holding that month's reports.
+
+    The months share one worker pool, the images (encoded, or stored once under ZIP_ASSETS_DIR in shared mode)
+    and the compiled template. Months without customers are skipped. `progress` counts reports across all
+    months.
+    """
+    def t(key): return TRANSLATIONS[lang].get(key, key)
+
+    total = sum(map(len, month_customers.values()))
+    entry_counts = {"reused": 0, "rebuilt": 0}
+    with record_stage("write_month_batch_zip", months=len(month_customers), rows=total, output_format=output_format,
+                      workers=workers) as stage, count_template_cache() as template_counts, \
+            shared_worker_pool(workers), zipfile.ZipFile(file, 'a', zipfile.ZIP_DEFLATED) as zf:
+        images = {}
+        if output_format == OUTPUT_FORMAT_SVG and image_mode == IMAGE_MODE_SHARED:
+            # The reports sit one folder down from the shared assets
+            images = {key: path and f"../{path}" for key, path in write_shared_assets(zf, compact).items()}
+        elif output_format == OUTPUT_FORMAT_SVG:
+            images = get_ods_images(compact)
+        done = 0
+        for report_month_str, customers_df in month_customers.items():
+            if customers_df.empty:
+                continue
+            folder = f"{get_month_folder(report_month_str, lang, t)}/"
+
+            def month_progress(month_done, _, offset=done):
+                if progress:
+                    progress(offset + month_done, total)
+
+            if output_format == OUTPUT_FORMAT_SVG:
+                month_counts = write_report_entries(zf, customers_df, report_month_str, lang, images, workers,
+                                                    entry_cache, month_progress, folder, compact)
+            elif output_format == OUTPUT_FORMAT_COMBINED_PDF:
+                pdf_filename = get_output_filename(report_month_str, lang, t, output_format)
+                with zf.open(folder + pdf_filename, "w") as pdf_file:
+                    month_counts = write_combined_pdf(pdf_file, customers_df, report_month_str, lang, workers,
+                                                      month_progress)
+            else:
+                month_counts = write_document_entries(zf, customers_df, report_month_str, lang, output_format,
+                                                      workers, month_progress, folder)
+            for key in entry_counts:
+                entry_counts[key] += month_counts[key]
+            done += len(customers_df)
+        stage.update(entry_counts, templates_compiled=template_counts["compiled"],
+                     templates_reused=template_counts["reused"])
+    return entry_counts
+
+
+def export_month_batch(month_customers: dict[str, pd.DataFrame], lang: str, output_format: str = OUTPUT_FORMAT_SVG,
+                       image_mode: str = IMAGE_MODE_EMBEDDED, workers: int = 1,
+                       entry_cache: Optional[ReportEntryCache] = None,
+                       progress: Optional[Callable[[int, int], None]] = None,
+                       compact: bool = False) -> tuple[BinaryIO, dict[str, int]]:
+    """Like export_reports_zip for write_month_batch_zip."""
+    zip_file = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_SIZE)
+    try:
+        entry_counts = write_month_batch_zip(zip_file, month_customers, lang, output_format, image_mode, workers,
+                                             entry_cache, progress, compact)
+    except BaseException:
+        zip_file.close()
+        raise
+    zip_file.seek(0)
+    return zip_file, entry_counts
+
+
+# --- Delivery ---
+class DeliveryRejected(Exception):
+    """A send the server refused permanently (5xx), which is not retried."""
+
+
+# Values of ECO_REPORT_SMTP_TLS (see SmtpSettings.tls).
+SMTP_TLS_MODES = ("starttls", "ssl", "none")
+
+
+class SmtpSettings(NamedTuple):
+    host: str
+    port: int = 587
+    sender: str = ""
+    username: Optional[str] = None
+    password: Optional[str] = None
+    # "starttls" upgrades the connection when the server offers it, "ssl" connects over TLS (usually port 465)
+    # and "none" never encrypts, e.g. for a local relay.
+    tls: str = "starttls"
+
+
+class DeliveryResult(NamedTuple):
+    customer_id: int
+    customer_name: str
+    contact: str
+    status: str
+    attempts: int = 0
+    error: str = ""
+
+
+def get_smtp_settings() -> Optional[SmtpSettings]:
+    """Reads the SMTP server from the ECO_REPORT_SMTP_* environment variables; None when no host is set."""
+    host = os.environ.get("ECO_REPORT_SMTP_HOST")
+    if not host:
+        return None
+    tls = os.environ.get("ECO_REPORT_SMTP_TLS", "starttls").strip().lower()
+    if tls not in SMTP_TLS_MODES:
+        raise ValueError(f"Invalid ECO_REPORT_SMTP_TLS {tls!r}: use one of {', '.join(SMTP_TLS_MODES)}")
+    username = os.environ.get("ECO_REPORT_SMTP_USER") or None
+    return SmtpSettings(host, int(os.environ.get("ECO_REPORT_SMTP_PORT", "587")),
+                        os.environ.get("ECO_REPORT_SMTP_FROM") or username or "", username,
+                        os.environ.get("ECO_REPORT_SMTP_PASSWORD") or None, tls)
+
+
+def import_aiosmtplib():
+    try:
+        import aiosmtplib
+    except ImportError:
+        raise ImportError("E-mail delivery needs aiosmtplib: pip install aiosmtplib") from None
+    return aiosmtplib
+
+
+def is_email_delivery_available() -> bool:
+    return importlib.util.find_spec("aiosmtplib") is not None
+
+
+class SmtpMailer:
+    """One SMTP connection, opened on the first send and reused for the next ones; a failed send drops it, so the
+    retry reconnects."""
+
+    def __init__(self, settings: SmtpSettings):
+        self.settings = settings
+        self._smtp = None
+
+    async def send(self, message: EmailMessage):
+        aiosmtplib = import_aiosmtplib()
+        if self._smtp is None:
+            smtp = aiosmtplib.SMTP(hostname=self.settings.host, port=self.settings.port,
+                                   username=self.settings.username, password=self.settings.password,
+                                   use_tls=self.settings.tls == "ssl",
+                                   start_tls=None if self.settings.tls == "starttls" else False,
+                                   timeout=DELIVERY_TIMEOUT_SECONDS)
+            await smtp.connect()
+            self._smtp = smtp
+        try:
+            await self._smtp.send_message(message)
+        except aiosmtplib.SMTPRecipientsRefused as e:
+            # The connection is still usable; only a permanent refusal of every recipient is not retried.
+            if all(recipient.code >= 500 for recipient in e.recipients):
+                raise DeliveryRejected(str(e)) from e
+            raise
+        except aiosmtplib.SMTPResponseException as e:
+            await self.close()
+            if e.code >= 500:
+                raise DeliveryRejected(str(e)) from e
+            raise
+        except Exception:
+            await self.close()
+            raise
+
+    async def close(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+
+
+def build_report_message(customer_row: pd.Series, report_month_str: str, lang: str, sender: str,
+                         attachment_filename: str, attachment: bytes) -> EmailMessage:
+    def t(key): return TRANSLATIONS[lang].get(key, key)
+
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = customer_row['customer_contact']
+    message["Subject"] = t("delivery_email_subject").format(report_title=t("report_title"), month=report_month_str)
+    message.set_content(t("delivery_email_body").format(customer_name=customer_row['customer_name'],
+                                                        month=report_month_str))
+    maintype, subtype = (mimetypes.guess_type(attachment_filename)[0] or "application/octet-stream").split("/")
+    message.add_attachment(attachment, maintype=maintype, subtype=subtype, filename=attachment_filename)
+    return message
+
+
+def iter_report_messages(customers_df: pd.DataFrame, report_month_str: str, lang: str, output_format: str,
+                         sender: str) -> Iterator[tuple[pd.Series, Union[EmailMessage, Exception, None]]]:
+    """Renders each customer's report (an SVG with embedded images, or a one-page PDF or PNG) into an e-mail to
+    its `customer_contact`; customers without a contact get None, and those whose report or message couldn't be
+    built (e.g. a contact with a line break) the exception."""
+    def t(key): return TRANSLATIONS[lang].get(key, key)
+
+    report_date = parse_month_string(report_month_str)
+    filename_date_str = report_date.strftime('%m%Y') if report_date else "data"
+    context = get_report_context(report_month_str, lang, t) if output_format == OUTPUT_FORMAT_SVG else None
+    for _, customer_row in customers_df.iterrows():
+        if not customer_row.get('customer_contact'):
+            yield customer_row, None
+            continue
+        try:
+            if output_format == OUTPUT_FORMAT_SVG:
+                attachment_filename = get_report_filename(customer_row, filename_date_str)
+                attachment = create_report_html(TEMPLATE_FILE_SVG, customer_row, report_month_str, lang, t,
+                                                context=context).encode('utf-8')
+            else:
+                [(attachment_filename, attachment)] = render_documents(customer_row.to_frame().T, report_month_str,
+                                                                       lang, output_format)
+            message = build_report_message(customer_row, report_month_str, lang, sender, attachment_filename,
+                                           attachment)
+        except Exception as e:
+            message = e
+        yield customer_row, message
+
+
+def deliver_reports(customers_df: pd.DataFrame, report_month_str: str, lang: str,
+                    output_format: str = OUTPUT_FORMAT_SVG, settings: Optional[SmtpSettings] = None,
+                    mailer_factory: Optional[Callable[[], SmtpMailer]] = None,
+                    concurrency: int = DELIVERY_CONCURRENCY, max_attempts: int = DELIVERY_MAX_ATTEMPTS,
+                    backoff_seconds: float = DELIVERY_BACKOFF_SECONDS,
+                    progress: Optional[Callable[[int, int], None]] = None) -> list[DeliveryResult]:
+    """E-mails every customer its report and returns one DeliveryResult per customer, in row order.
+
+    Reports are rendered one at a time while up to `concurrency` sends run, each worker reusing its own
+    connection from `mailer_factory` (an SmtpMailer for `settings` by default). Failed sends are retried with
+    exponential backoff, except permanent rejections. `progress` is called with (customers done, total) after
+    every result; an exception it raises stops the delivery. A customer whose message can't be built fails
+    without stopping the others. If the delivery stops early, the exception's `partial_result` holds the results
+    of the customers handled so far, so the caller can tell who was already sent their report.
+    """
+    settings = settings or get_smtp_settings()
+    if mailer_factory is None:
+        if settings is None:
+            raise ValueError("No SMTP server configured: set ECO_REPORT_SMTP_HOST")
+        mailer_factory = functools.partial(SmtpMailer, settings)
+    messages = iter_report_messages(customers_df, report_month_str, lang, output_format,
+                                    settings.sender if settings else "")
+    results: list[Optional[DeliveryResult]] = [None] * len(customers_df)
+    with record_stage("deliver_reports", rows=len(customers_df), output_format=output_format,
+                      concurrency=concurrency) as stage:
+        try:
+            asyncio.run(_deliver_messages(messages, results, mailer_factory, concurrency, max_attempts,
+                                          backoff_seconds, progress))
+        except Exception as e:
+            e.partial_result = [result for result in results if result is not None]
+            raise
+        finally:
+            for status in (DELIVERY_STATUS_SENT, DELIVERY_STATUS_FAILED, DELIVERY_STATUS_SKIPPED):
+                stage[status] = sum(result is not None and result.status == status for result in results)
+        return results
+
+
+async def _deliver_messages(messages: Iterator[tuple[pd.Series, Union[EmailMessage, Exception, None]]],
+                            results: list[Optional[DeliveryResult]], mailer_factory: Callable[[], SmtpMailer],
+                            concurrency: int, max_attempts: int, backoff_seconds: float,
+                            progress: Optional[Callable[[int, int], None]]):
+    """Fills `results` in place as the customers are handled, so they are kept if the delivery stops early."""
+    # The bounded queue keeps rendering just ahead of the sends, so memory doesn't grow with the customer count
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    total = len(results)
+    done = 0
+
+    async def render():
+        # Rendering is CPU-bound, so it runs in a thread while the event loop keeps sending
+        iterator = enumerate(messages)
+        while (item := await asyncio.to_thread(next, iterator, None)) is not None:
+            await queue.put(item)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def send():
+        nonlocal done
+        mailer = mailer_factory()
+        try:
+            while (item := await queue.get()) is not None:
+                position, (customer_row, message) = item
+                results[position] = await _send_with_retry(mailer, customer_row, message, max_attempts,
+                                                           backoff_seconds)
+                logger.debug(json.dumps({"stage": "deliver_report", **results[position]._asdict()}, default=str))
+                done += 1
+                if progress:
+                    progress(done, total)
+        finally:
+            await mailer.close()
+
+    tasks = [asyncio.create_task(render()), *(asyncio.create_task(send()) for _ in range(concurrency))]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # If one task failed (or progress cancelled the delivery), stop the others and close their connections
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _send_with_retry(mailer: SmtpMailer, customer_row: pd.Series,
+                           message: Union[EmailMessage, Exception, None], max_attempts: int,
+                           backoff_seconds: float) -> DeliveryResult:
+    customer = (int(customer_row['customer_id']), customer_row['customer_name'],
+                customer_row.get('customer_contact') or "")
+    if message is None:
+        return DeliveryResult(*customer, DELIVERY_STATUS_SKIPPED)
+    if isinstance(message, Exception):
+        return DeliveryResult(*customer, DELIVERY_STATUS_FAILED, 0, str(message) or type(message).__name__)
+    for attempt in range(1, max_attempts + 1):
+        try:
+            await mailer.send(message)
+            return DeliveryResult(*customer, DELIVERY_STATUS_SENT, attempt)
+        except DeliveryRejected as e:
+            return DeliveryResult(*customer, DELIVERY_STATUS_FAILED, attempt, str(e))
+        except Exception as e:
+            if attempt == max_attempts:
+                return DeliveryResult(*customer, DELIVERY_STATUS_FAILED, attempt, str(e) or type(e).__name__)
+            await asyncio.sleep(backoff_seconds * 2 ** (attempt - 1))
+
+
+# --- Background Jobs ---
+class ReportJobCancelled(Exception):
+    pass
+
+
+class ReportJob:
+    """Runs `export(*args, progress=...)` (export_reports, export_month_batch or deliver_reports) on a background
+    thread.
+
+    The Streamlit session keeps the job across reruns and polls `done`/`total`; `result` holds what `export`
+    returned once it finishes (the (output_file, entry_counts) pair, or the delivery results) and `error` the
+    exception if it failed. When it stops early, `partial_result` keeps what `export` completed (see
+    deliver_reports), e.g. the customers already sent their report. The job runs in a copy of the caller's
+    context, and `stage_records` collects its stages; with `profile`, `profile_stats` holds the cProfile stats of
+    the job's thread once it ends, or `profile_error` why it couldn't be profiled.
+    """
+
+    def __init__(self, key: tuple, total: int, export: Callable, *args, profile: bool = False):
+        self.key = key
+        self.done = 0
+        self.total = total
+        self.result = None
+        self.partial_result = None
+        self.error: Optional[Exception] = None
+        self.stage_records: list[dict] = []
+        self.profile_stats: Optional[pstats.Stats] = None
+        self.profile_error: Optional[str] = None
+        self._profile = profile
+        self._cancel_event = threading.Event()
+        # Threads don't inherit context variables, so run in a copy of the caller's context (e.g. its worker pool)
+        self._thread = threading.Thread(target=contextvars.copy_context().run, args=(self._run, export, *args),
+                                        daemon=True, name="report-job")
+
+    def start(self) -> "ReportJob":
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Asks the job to stop after the report being written or sent; a partial ZIP is discarded."""
+        self._cancel_event.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set() and self.result is None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        self._thread.join(timeout)
+        return not self.running
+
+    @functools.cached_property
+    def output_bytes(self) -> bytes:
+        """The output file of a finished export as bytes, read once per job and the file closed. Streamlit's
+        download_button only takes bytes and keeps them in its media file manager, so reading the file again on
+        every rerun would only add copies; this way the session holds the output once."""
+        output_file, _ = self.result
+        with output_file:
+            output_file.seek(0)
+            return output_file.read()
+
+    def _report_progress(self, done: int, total: int):
+        if self._cancel_event.is_set():
+            raise ReportJobCancelled()
+        self.done = done
+
+    def _run(self, export: Callable, *args):
+        # The job's stages are its own, not part of the stage that was active when it was started
+        _ACTIVE_STAGE.set(None)
+        _STAGE_RECORDS.set(self.stage_records)
+        profiler = None
+        try:
+            with contextlib.ExitStack() as stack:
+                if self._profile:
+                    # Not being profiled doesn't fail the export
+                    profiler, self.profile_error = enter_profile_run(stack)
+                self.result = export(*args, progress=self._report_progress)
+        except ReportJobCancelled as e:
+            self.partial_result = getattr(e, "partial_result", None)
+            logger.info(json.dumps({"stage": "report_job", "cancelled": True, "done": self.done, "total": self.total}))
+        except Exception as e:
+            self.partial_result = getattr(e, "partial_result", None)
+            logger.exception("Report job failed")
+            self.error = e
+        finally:
+            if profiler is not None:
+                self.profile_stats = pstats.Stats(profiler)
+
+
+def get_zip_filename(report_month_str: str, lang: str, t, extension: str = "zip") -> str:
+    report_date = parse_month_string(report_month_str)
+    zip_filename_month = format_local_date(report_date, lang, t) if report_date else "Reports"
+    zip_filename = t("zip_filename").format(month_name=zip_filename_month)
+    return f"{sanitize_filename(os.path.splitext(zip_filename)[0])}.{extension}"
+
+
+def get_output_filename(report_month_str: str, lang: str, t, output_format: str = OUTPUT_FORMAT_SVG) -> str:
+    """The download name: the month's ZIP name, or the same name as .pdf for a combined PDF."""
+    extension = "pdf" if output_format == OUTPUT_FORMAT_COMBINED_PDF else "zip"
+    return get_zip_filename(report_month_str, lang, t, extension)
@@ -0,0 +1,92 @@
+import unittest
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import zipfile
+
+import pandas as pd
+
+# Add the src directory to the path so we can import cli
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from cli import main, resolve_month
+
+
+def write_workbook(path: str):
+    pd.DataFrame([
+        [1, "Client A", 30.0, 40.0, 70.0, 10.0, 10.0],
+        [2, "Client B", 50.0, 50.0, 100.0, 20.0, 20.0],
+        [None, None, None, None, None, None, None],
+    ], columns=["ID", "NOME", "07/11/2025", "14/11/2025", "TOTAL", "05/12/2025", "TOTAL.1"]).to_excel(path, index=False)
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.input_path = os.path.join(self.tmp_dir.name, "Planilha.xlsx")
+        write_workbook(self.input_path)
+        self.output_dir = os.path.join(self.tmp_dir.name, "out")
+
+    def run_cli(self, *args: str) -> int:
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            return main(["generate", *args, "--output-dir", self.output_dir,
+                         "--cache-dir", os.path.join(self.tmp_dir.name, "cache")])
+
+    def test_resolve_month(self):
+        """Test matching the requested month against the detected month names."""
+        month_map = {"Novembro 2025": {}, "Dezembro 2025": {}}
+        self.assertEqual(resolve_month(month_map, None), "Dezembro 2025")
+        self.assertEqual(resolve_month(month_map, "Novembro 2025"), "Novembro 2025")
+        self.assertEqual(resolve_month(month_map, "November 2025"), "Novembro 2025")
+        self.assertEqual(resolve_month(month_map, "01/12/2025"), "Dezembro 2025")
+        with self.assertRaises(ValueError):
+            resolve_month(month_map, "Janeiro 2025")
+
+    def test_generate(self):
+        """Test generating the ZIP for the requested month."""
+        self.assertEqual(self.run_cli(self.input_path, "--month", "November 2025"), 0)
+        zip_path = os.path.join(self.output_dir, "Planilha_Relatorios_Novembro_2025.zip")
+        with zipfile.ZipFile(zip_path) as zf:
+            self.assertEqual(zf.namelist(), ["1_Client_A_112025.svg", "2_Client_B_112025.svg"])
+            self.assertIn("70.00 kg", zf.read("1_Client_A_112025.svg").decode())
+
+    def test_generate_from_csv(self):
+        """Test generating the ZIP from the same spreadsheet exported as CSV."""
+        csv_path = os.path.join(self.tmp_dir.name, "Planilha.csv")
+        pd.read_excel(self.input_path).to_csv(csv_path, index=False)
+        self.assertEqual(self.run_cli(csv_path, "--month", "November 2025"), 0)
+        zip_path = os.path.join(self.output_dir, "Planilha_Relatorios_Novembro_2025.zip")
+        with zipfile.ZipFile(zip_path) as zf:
+            self.assertEqual(zf.namelist(), ["1_Client_A_112025.svg", "2_Client_B_112025.svg"])
+
+    def test_generate_all_months(self):
+        """Test generating every month into one ZIP with a folder per month."""
+        self.assertEqual(self.run_cli(self.input_path, "--all-months"), 0)
+        zip_path = os.path.join(self.output_dir, "Planilha_Relatorios_Novembro_2025_Dezembro_2025.zip")
+        with zipfile.ZipFile(zip_path) as zf:
+            self.assertEqual(zf.namelist(), ["2025-11_Novembro_2025/1_Client_A_112025.svg",
+                                             "2025-11_Novembro_2025/2_Client_B_112025.svg",
+                                             "2025-12_Dezembro_2025/1_Client_A_122025.svg",
+                                             "2025-12_Dezembro_2025/2_Client_B_122025.svg"])
+            self.assertIn("10.00 kg", zf.read("2025-12_Dezembro_2025/1_Client_A_122025.svg").decode())
+
+    def test_generate_several_files_concurrently(self):
+        """Test processing several spreadsheets in parallel jobs."""
+        second_input_path = os.path.join(self.tmp_dir.name, "Outra.xlsx")
+        write_workbook(second_input_path)
+        self.assertEqual(self.run_cli(self.input_path, second_input_path, "--jobs", "2", "--lang", "en"), 0)
+        self.assertEqual(sorted(os.listdir(self.output_dir)),
+                         ["Outra_December_2025_Reports.zip", "Planilha_December_2025_Reports.zip"])
+
+    def test_missing_column(self):
+        """Test that a wrong column mapping fails with a non-zero exit code."""
+        self.assertEqual(self.run_cli(self.input_path, "--id-column", "CODE"), 1)
+        self.assertFalse(os.listdir(self.output_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
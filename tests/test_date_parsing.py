@@ -3,10 +3,10 @@ import datetime
 import sys
 import os
 
-# Add the src directory to the path so we can import main
+# Add the src directory to the path so we can import reports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
 
-from main import parse_month_string, sanitize_filename
+from reports import parse_month_string, parse_month_strings, sanitize_filename
 
 class TestDateParsing(unittest.TestCase):
 
@@ -67,5 +67,20 @@ class TestDateParsing(unittest.TestCase):
         expected_dt = datetime.datetime(2025, 11, 1)
         self.assertEqual(parse_month_string(dt), expected_dt)
 
+    def test_dashed_formats(self):
+        """Test parsing the DD-MM-YYYY, YYYY-MM-DD and YYYY-MM-DD HH:MM:SS formats."""
+        self.assertEqual(parse_month_string("28-11-2025"), datetime.datetime(2025, 11, 28))
+        self.assertEqual(parse_month_string("2025-11-28"), datetime.datetime(2025, 11, 28))
+        self.assertEqual(parse_month_string("2025-11-28 00:00:00"), datetime.datetime(2025, 11, 28))
+        self.assertIsNone(parse_month_string("2025-13-28"))
+
+    def test_parse_header_list(self):
+        """Test parsing a whole header list, including repeated and non-string values."""
+        header = ["ID", "NOME", "07/11/2025", "TOTAL", "07/11/2025", datetime.datetime(2025, 12, 5), 42]
+        self.assertEqual(parse_month_strings(header), [None, None, datetime.datetime(2025, 11, 7), None,
+                                                       datetime.datetime(2025, 11, 7), datetime.datetime(2025, 12, 1),
+                                                       None])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,206 @@
+import unittest
+import asyncio
+import email
+import functools
+import importlib.util
+import os
+import socket
+import sys
+from unittest import mock
+
+import pandas as pd
+
+# Add the src directory to the path so we can import reports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from reports import DELIVERY_STATUS_FAILED, DELIVERY_STATUS_SENT, DELIVERY_STATUS_SKIPPED, DeliveryRejected, \
+    ReportJob, ReportJobCancelled, SmtpSettings, deliver_reports, extract_customers, get_smtp_settings
+
+
+class FakeMailer:
+    """Stands in for SmtpMailer: records the messages and fails the first sends to the addresses in `failures`."""
+
+    def __init__(self, sent: list, mailers: list, failures: dict = None, rejected: tuple = ()):
+        self.sent, self.failures, self.rejected = sent, failures or {}, rejected
+        self.sending = 0
+        self.max_sending = 0
+        self.closed = False
+        mailers.append(self)
+
+    async def send(self, message):
+        self.sending += 1
+        self.max_sending = max(self.max_sending, self.sending)
+        await asyncio.sleep(0.001)
+        self.sending -= 1
+        if message["To"] in self.rejected:
+            raise DeliveryRejected("550 mailbox unavailable")
+        if self.failures.get(message["To"], 0) > 0:
+            self.failures[message["To"]] -= 1
+            raise ConnectionResetError("connection lost")
+        self.sent.append(message)
+
+    async def close(self):
+        self.closed = True
+
+
+class TestDelivery(unittest.TestCase):
+
+    def setUp(self):
+        self.customers_df = extract_customers(pd.DataFrame([
+            [1, "Client A", 150.5, "a@example.com"],
+            [2, "João da Silva", 200.0, None],
+            [3, "Client C", 80.0, " c@example.com "],
+            [4, "Client D", 10.0, "d@example.com"],
+        ]), 0, 1, 2, 3)
+        self.sent, self.mailers = [], []
+
+    def deliver(self, failures=None, rejected=(), **kwargs):
+        def mailer_factory(): return FakeMailer(self.sent, self.mailers, failures, rejected)
+        return deliver_reports(self.customers_df, "Novembro 2025", "pt", mailer_factory=mailer_factory,
+                               backoff_seconds=0, **kwargs)
+
+    def test_smtp_settings(self):
+        """Test that the TLS mode is read case-insensitively and an unknown one is refused."""
+        environ = {"ECO_REPORT_SMTP_HOST": "smtp.example.com", "ECO_REPORT_SMTP_USER": "reports@example.com"}
+        with mock.patch.dict(os.environ, environ, clear=True):
+            self.assertEqual(get_smtp_settings(), SmtpSettings("smtp.example.com", 587, "reports@example.com",
+                                                               "reports@example.com"))
+        with mock.patch.dict(os.environ, {**environ, "ECO_REPORT_SMTP_TLS": "SSL"}, clear=True):
+            self.assertEqual(get_smtp_settings().tls, "ssl")
+        with mock.patch.dict(os.environ, {**environ, "ECO_REPORT_SMTP_TLS": "tls"}, clear=True):
+            with self.assertRaises(ValueError):
+                get_smtp_settings()
+
+    def test_contact_column(self):
+        """Test that the contact column is kept stripped, with blanks for missing contacts."""
+        self.assertEqual(self.customers_df["customer_contact"].tolist(),
+                         ["a@example.com", "", "c@example.com", "d@example.com"])
+
+    def test_sends_report_per_customer(self):
+        """Test that every customer with a contact gets its SVG report attached and the others are skipped."""
+        results = self.deliver()
+        self.assertEqual([(result.customer_id, result.status) for result in results],
+                         [(1, DELIVERY_STATUS_SENT), (2, DELIVERY_STATUS_SKIPPED), (3, DELIVERY_STATUS_SENT),
+                          (4, DELIVERY_STATUS_SENT)])
+        message = next(message for message in self.sent if message["To"] == "c@example.com")
+        [attachment] = message.iter_attachments()
+        self.assertEqual(attachment.get_filename(), "3_Client_C_112025.svg")
+        self.assertEqual(attachment.get_content_type(), "image/svg+xml")
+        self.assertIn("Client C", attachment.get_content().decode("utf-8"))
+
+    def test_retries_with_backoff(self):
+        """Test that failed sends are retried, and given up after the last attempt."""
+        results = self.deliver(failures={"a@example.com": 2, "c@example.com": 5}, max_attempts=3)
+        self.assertEqual((results[0].status, results[0].attempts), (DELIVERY_STATUS_SENT, 3))
+        self.assertEqual((results[2].status, results[2].attempts), (DELIVERY_STATUS_FAILED, 3))
+        self.assertEqual(results[2].error, "connection lost")
+
+    def test_rejection_is_not_retried(self):
+        """Test that a permanent rejection fails the customer on the first attempt."""
+        results = self.deliver(rejected=("d@example.com",))
+        self.assertEqual((results[3].status, results[3].attempts), (DELIVERY_STATUS_FAILED, 1))
+
+    def test_unbuildable_message_fails_only_its_customer(self):
+        """Test that a contact that can't be a message header (an Excel cell with a line break) fails only that
+        customer."""
+        self.customers_df.loc[1, 'customer_contact'] = "b@example.com\nc@example.com"
+        results = self.deliver()
+        self.assertEqual([(result.status, result.attempts) for result in results],
+                         [(DELIVERY_STATUS_SENT, 1), (DELIVERY_STATUS_FAILED, 0), (DELIVERY_STATUS_SENT, 1),
+                          (DELIVERY_STATUS_SENT, 1)])
+        self.assertIn("linefeed", results[1].error)
+
+    def test_concurrency_limit(self):
+        """Test that each worker reuses one connection, sends one message at a time and closes it at the end."""
+        self.deliver(concurrency=2)
+        self.assertEqual(len(self.mailers), 2)
+        self.assertTrue(all(mailer.max_sending <= 1 and mailer.closed for mailer in self.mailers))
+
+    def test_progress_and_cancel(self):
+        """Test that progress counts every customer and that raising from it stops the delivery."""
+        calls = []
+        self.deliver(progress=lambda done, total: calls.append((done, total)))
+        self.assertEqual(calls, [(1, 4), (2, 4), (3, 4), (4, 4)])
+
+        def cancel(done, total):
+            raise ReportJobCancelled()
+        self.mailers.clear()
+        with self.assertRaises(ReportJobCancelled):
+            self.deliver(progress=cancel)
+        self.assertTrue(all(mailer.closed for mailer in self.mailers))
+
+    def test_cancelled_job_keeps_partial_results(self):
+        """Test that a cancelled delivery job keeps the result of every customer sent before it stopped."""
+        def mailer_factory(): return FakeMailer(self.sent, self.mailers)
+        job = ReportJob(("delivery",), 4, functools.partial(deliver_reports, mailer_factory=mailer_factory),
+                        self.customers_df, "Novembro 2025", "pt")
+        job.cancel()
+        self.assertTrue(job.start().wait(timeout=30))
+        self.assertTrue(job.cancelled)
+        self.assertTrue(job.partial_result)
+        sent_contacts = {result.contact for result in job.partial_result if result.status == DELIVERY_STATUS_SENT}
+        self.assertEqual(sent_contacts, {message["To"] for message in self.sent})
+
+
+@unittest.skipUnless(importlib.util.find_spec("aiosmtplib") and importlib.util.find_spec("aiosmtpd"),
+                     "aiosmtplib and aiosmtpd are not installed")
+class TestSmtpDelivery(unittest.TestCase):
+
+    def setUp(self):
+        from aiosmtpd.controller import Controller
+
+        class Handler:
+            def __init__(self):
+                self.envelopes = []
+                self.deferred = set()
+
+            async def handle_DATA(self, server, session, envelope):
+                self.envelopes.append(envelope)
+                return "250 OK"
+
+            async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+                if address.startswith("unknown@"):
+                    return "550 No such user"
+                if address.startswith("busy@") and address not in self.deferred:
+                    self.deferred.add(address)
+                    return "450 Mailbox busy, try again later"
+                envelope.rcpt_tos.append(address)
+                return "250 OK"
+
+        self.handler = Handler()
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=self.port)
+        self.controller.start()
+        self.addCleanup(self.controller.stop)
+
+    def test_delivers_through_smtp_server(self):
+        """Test that the reports reach a local SMTP server and that refused recipients are reported."""
+        customers_df = extract_customers(pd.DataFrame([
+            [1, "Client A", 150.5, "a@example.com"], [2, "Client B", 20.0, "unknown@example.com"],
+            [3, "Client C", 80.0, "c@example.com"],
+        ]), 0, 1, 2, 3)
+        settings = SmtpSettings("127.0.0.1", self.port, "reports@example.com", tls="none")
+        results = deliver_reports(customers_df, "Novembro 2025", "en", settings=settings, concurrency=2,
+                                  backoff_seconds=0)
+        self.assertEqual([result.status for result in results],
+                         [DELIVERY_STATUS_SENT, DELIVERY_STATUS_FAILED, DELIVERY_STATUS_SENT])
+        self.assertEqual(results[1].attempts, 1)
+        self.assertEqual(sorted(envelope.rcpt_tos[0] for envelope in self.handler.envelopes),
+                         ["a@example.com", "c@example.com"])
+        message = email.message_from_bytes(self.handler.envelopes[0].content)
+        self.assertEqual(message["From"], "reports@example.com")
+        self.assertTrue(message["Subject"].endswith("Novembro 2025"))
+
+    def test_temporary_refusal_is_retried(self):
+        """Test that a recipient refused with a 4xx code is retried instead of failed."""
+        customers_df = extract_customers(pd.DataFrame([[1, "Client A", 150.5, "busy@example.com"]]), 0, 1, 2, 3)
+        settings = SmtpSettings("127.0.0.1", self.port, "reports@example.com", tls="none")
+        results = deliver_reports(customers_df, "Novembro 2025", "en", settings=settings, backoff_seconds=0)
+        self.assertEqual((results[0].status, results[0].attempts), (DELIVERY_STATUS_SENT, 2))
+        self.assertEqual([envelope.rcpt_tos for envelope in self.handler.envelopes], [["busy@example.com"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import importlib.util
+import io
+import os
+import sys
+import zipfile
+from unittest import mock
+
+import pandas as pd
+
+# Add the src directory to the path so we can import reports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from reports import OUTPUT_FORMAT_COMBINED_PDF, OUTPUT_FORMAT_PDF, OUTPUT_FORMAT_PNG, compute_impact_metrics, \
+    export_reports, get_raster_ods_images, write_combined_pdf, write_documents_zip
+
+
+@unittest.skipUnless(importlib.util.find_spec("pymupdf"), "PyMuPDF is not installed")
+class TestDocumentRendering(unittest.TestCase):
+
+    def setUp(self):
+        self.customers_df = compute_impact_metrics(pd.DataFrame({
+            "customer_id": [1, 2, 3],
+            "customer_name": ["Client A", "João da Silva", "Client C"],
+            "customer_total": [150.5, 200.0, 80.0],
+        }))
+
+    def read_pdf_texts(self, pdf_bytes: bytes) -> list[str]:
+        import pymupdf
+        with pymupdf.open("pdf", pdf_bytes) as doc:
+            return [page.get_text() for page in doc]
+
+    def test_pdf_per_customer(self):
+        """Test that the PDF ZIP holds one single-page PDF per customer with its name and metrics."""
+        buf = io.BytesIO()
+        write_documents_zip(buf, self.customers_df, "Novembro 2025", "pt", OUTPUT_FORMAT_PDF)
+        with zipfile.ZipFile(buf) as zf:
+            self.assertEqual(zf.namelist(), ["1_Client_A_112025.pdf", "2_Joao_da_Silva_112025.pdf",
+                                             "3_Client_C_112025.pdf"])
+            page_texts = self.read_pdf_texts(zf.read("2_Joao_da_Silva_112025.pdf"))
+        self.assertEqual(len(page_texts), 1)
+        self.assertIn("João da Silva", page_texts[0])
+        self.assertIn("200.00 kg", page_texts[0])
+
+    def test_png_per_customer(self):
+        """Test that the PNG ZIP holds one PNG image per customer."""
+        buf = io.BytesIO()
+        write_documents_zip(buf, self.customers_df.head(1), "Novembro 2025", "pt", OUTPUT_FORMAT_PNG)
+        with zipfile.ZipFile(buf) as zf:
+            self.assertEqual(zf.namelist(), ["1_Client_A_112025.png"])
+            self.assertTrue(zf.read("1_Client_A_112025.png").startswith(b"\x89PNG"))
+
+    def test_combined_pdf(self):
+        """Test that the combined PDF has one page per customer in row order, serial or in a worker pool."""
+        for workers in (1, 2):
+            buf = io.BytesIO()
+            with mock.patch("reports.REPORT_CHUNK_SIZE", 2):
+                write_combined_pdf(buf, self.customers_df, "Novembro 2025", "pt", workers)
+            page_texts = self.read_pdf_texts(buf.getvalue())
+            self.assertEqual(len(page_texts), 3)
+            for page_text, customer_name in zip(page_texts, self.customers_df["customer_name"]):
+                self.assertIn(customer_name, page_text)
+
+    def test_export_progress(self):
+        """Test that document exports report progress and are returned rewound."""
+        calls = []
+        output_file, entry_counts = export_reports(self.customers_df, "Novembro 2025", "pt",
+                                                   OUTPUT_FORMAT_COMBINED_PDF,
+                                                   progress=lambda done, total: calls.append((done, total)))
+        self.assertEqual(calls, [(3, 3)])
+        self.assertEqual(entry_counts, {"reused": 0, "rebuilt": 3})
+        self.assertEqual(output_file.read(5), b"%PDF-")
+
+    def test_ods_images_rasterized_once(self):
+        """Test that the ODS images are rasterized to PNG data URIs once per process."""
+        images = get_raster_ods_images()
+        self.assertIs(get_raster_ods_images(), images)
+        self.assertTrue(all(image.startswith("data:image/png;base64,") for image in images.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import io
+import os
+import re
+import sys
+import zipfile
+
+import pandas as pd
+
+# Add the src directory to the path so we can import reports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from reports import extract_customers, load_excel_columns, load_excel_header
+
+
+class TestExcelLoading(unittest.TestCase):
+
+    def setUp(self):
+        self.full_df = pd.DataFrame([
+            [1, "Client A", 30.0, 40.5, 70.5],
+            [2, 12345, 50.0, 50.0, 100.0],
+            [None, None, None, None, None],
+            [3, None, 10.0, 10.0, 20.0],
+            ["x", "Client D", 10.0, 10.0, 20.0],
+        ], columns=["ID", "NOME", "07/11/2025", "14/11/2025", "TOTAL"])
+        buf = io.BytesIO()
+        self.full_df.to_excel(buf, index=False)
+        self.file_content = buf.getvalue()
+
+    def test_header(self):
+        """Test that the header-only scan returns the same columns as a full parse."""
+        self.assertEqual(load_excel_header(self.file_content, cache_dir=""),
+                         pd.read_excel(io.BytesIO(self.file_content), header=0, dtype=str).columns.tolist())
+
+    def test_columns_in_requested_order(self):
+        """Test that only the requested columns are loaded, in the requested order, repeats included."""
+        columns_df = load_excel_columns(self.file_content, [4, 0, 0], cache_dir="")
+        self.assertEqual(columns_df.columns.tolist(), [4, 0, 0])
+        self.assertEqual(columns_df.iloc[0].tolist(), [70.5, 1, 1])
+
+    def test_customers_match_full_parse(self):
+        """Test that the cleaned customers are the same as when cleaning the full string-typed frame."""
+        full_str_df = pd.read_excel(io.BytesIO(self.file_content), header=0, dtype=str)
+        expected = extract_customers(full_str_df, 0, 1, 4).reset_index(drop=True)
+        columns_df = load_excel_columns(self.file_content, [0, 1, 4], cache_dir="")
+        actual = extract_customers(columns_df, 0, 1, 2).reset_index(drop=True)
+        pd.testing.assert_frame_equal(actual, expected)
+        self.assertEqual(actual["customer_name"].tolist(), ["Client A", "12345"])
+
+    def test_stale_dimension_tag(self):
+        """Test that rows past a stale <dimension> tag in the sheet are still loaded, as pandas loads them."""
+        stale_buf = io.BytesIO()
+        with zipfile.ZipFile(io.BytesIO(self.file_content)) as source, zipfile.ZipFile(stale_buf, 'w') as target:
+            for name in source.namelist():
+                data = source.read(name)
+                if name == "xl/worksheets/sheet1.xml":
+                    data = re.sub(rb'<dimension ref="[^"]*"', b'<dimension ref="A1:D3"', data)
+                target.writestr(name, data)
+        self.assertEqual(len(pd.read_excel(io.BytesIO(stale_buf.getvalue()))), 5)
+        columns_df = load_excel_columns(stale_buf.getvalue(), [0, 1, 3], cache_dir="")
+        self.assertEqual(len(columns_df), 5)
+        self.assertEqual(columns_df.iloc[4].tolist(), ["x", "Client D", 10.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
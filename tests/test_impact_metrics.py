@@ -0,0 +1,46 @@
+import unittest
+import os
+import sys
+
+import pandas as pd
+
+# Add the src directory to the path so we can import reports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from reports import CO2_AVOIDED_FACTOR, FERTILIZER_FACTOR, compute_impact_metrics, get_metric_values
+
+
+class TestImpactMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.customers_df = pd.DataFrame({
+            "customer_id": [1, 2, 3],
+            "customer_name": ["Client A", "Client B", "Client C"],
+            "customer_total": [150.5, 200.0, 0.0],
+        })
+
+    def test_metric_columns(self):
+        """Test that every metric and its formatted string are computed for each row."""
+        metrics_df = compute_impact_metrics(self.customers_df)
+        self.assertAlmostEqual(metrics_df["fertilizer_kg"].iloc[0], 150.5 * FERTILIZER_FACTOR)
+        self.assertAlmostEqual(metrics_df["co2_avoided"].iloc[1], 200.0 * CO2_AVOIDED_FACTOR)
+        self.assertEqual(metrics_df["customer_total_fmt"].tolist(), ["150.50", "200.00", "0.00"])
+        self.assertEqual(metrics_df["trees_equivalent_fmt"].tolist(), ["331", "440", "0"])
+        self.assertEqual(metrics_df["water_liters_fmt"].tolist(), ["386.48", "513.60", "0.00"])
+        self.assertNotIn("fertilizer_kg", self.customers_df.columns)
+
+    def test_metric_values_match_for_single_row(self):
+        """Test that a row without precomputed metrics yields the same values as the batch stage."""
+        metrics_df = compute_impact_metrics(self.customers_df)
+        for i in range(len(self.customers_df)):
+            self.assertEqual(get_metric_values(self.customers_df.iloc[i]), get_metric_values(metrics_df.iloc[i]))
+
+    def test_metric_values_template_keys(self):
+        """Test the template variable names of the formatted metrics."""
+        values = get_metric_values(compute_impact_metrics(self.customers_df).iloc[0])
+        self.assertEqual(set(values), {"customer_waste_kg", "fertilizer_kg", "co2_avoided", "driving_distance",
+                                       "trees_equivalent", "water_liters"})
+
+
+if __name__ == '__main__':
+    unittest.main()
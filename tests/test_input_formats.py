@@ -0,0 +1,76 @@
+import unittest
+import io
+import os
+import sys
+
+import pandas as pd
+
+# Add the src directory to the path so we can import reports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from reports import INPUT_FORMAT_CSV, INPUT_FORMAT_EXCEL, INPUT_FORMAT_PARQUET, detect_input_format, \
+    extract_customers, load_excel_columns, load_excel_header
+
+
+class TestInputFormats(unittest.TestCase):
+
+    def setUp(self):
+        self.full_df = pd.DataFrame([
+            [1, "Client A", 30.0, 40.5, 70.5],
+            [2, "João da Silva", 50.0, 50.0, 100.0],
+            [None, None, None, None, None],
+            [3, None, 10.0, 10.0, 20.0],
+            [4, "Client D", 10.25, 10.0, 20.25],
+        ], columns=["ID", "NOME", "07/11/2025", "14/11/2025", "TOTAL"])
+        excel_buf, parquet_buf = io.BytesIO(), io.BytesIO()
+        self.full_df.to_excel(excel_buf, index=False)
+        self.full_df.to_parquet(parquet_buf, index=False)
+        self.files = {
+            "excel": excel_buf.getvalue(),
+            "csv": self.full_df.to_csv(index=False).encode("utf-8-sig"),
+            # Excel's pt-BR CSV export: semicolons, decimal commas and Latin-1
+            "csv_pt": self.full_df.to_csv(index=False, sep=";", decimal=",").encode("latin-1"),
+            "parquet": parquet_buf.getvalue(),
+        }
+
+    def test_detect_input_format(self):
+        """Test that the format is told from the file content."""
+        self.assertEqual({name: detect_input_format(file_content) for name, file_content in self.files.items()},
+                         {"excel": INPUT_FORMAT_EXCEL, "csv": INPUT_FORMAT_CSV, "csv_pt": INPUT_FORMAT_CSV,
+                          "parquet": INPUT_FORMAT_PARQUET})
+
+    def test_same_header_and_customers_as_excel(self):
+        """Test that CSV and Parquet files give the same header and customers as the Excel workbook."""
+        expected_customers = extract_customers(load_excel_columns(self.files["excel"], [0, 1, 4], cache_dir=""),
+                                               0, 1, 2)
+        for name, file_content in self.files.items():
+            with self.subTest(name):
+                self.assertEqual(load_excel_header(file_content, cache_dir=""), self.full_df.columns.tolist())
+                customers_df = extract_customers(load_excel_columns(file_content, [0, 1, 4], cache_dir=""), 0, 1, 2)
+                pd.testing.assert_frame_equal(customers_df, expected_customers, check_dtype=False)
+
+    def test_columns_in_requested_order(self):
+        """Test that only the requested columns are loaded, in the requested order, repeats included."""
+        for name in ("csv", "parquet"):
+            with self.subTest(name):
+                columns_df = load_excel_columns(self.files[name], [4, 0, 0], cache_dir="")
+                self.assertEqual(columns_df.columns.tolist(), [4, 0, 0])
+                self.assertEqual(columns_df.iloc[0].tolist(), [70.5, 1, 1])
+
+    def test_csv_repeated_headers(self):
+        """Test that CSV columns are picked by position when headers repeat, as the monthly TOTAL columns may."""
+        file_content = b"ID,NOME,TOTAL,TOTAL\n1,Client A,10.5,20.5\n"
+        self.assertEqual(load_excel_header(file_content, cache_dir=""), ["ID", "NOME", "TOTAL", "TOTAL"])
+        self.assertEqual(load_excel_columns(file_content, [3, 2], cache_dir="").iloc[0].tolist(), [20.5, 10.5])
+
+    def test_csv_short_rows(self):
+        """Test that rows with missing trailing fields are read with those fields empty instead of failing."""
+        file_content = "ID;NOME;07/11/2025;14/11/2025;TOTAL\n1;Client A;30;40,5;70,5\n2;Bo;4\n".encode("latin-1")
+        columns_df = load_excel_columns(file_content, [0, 1, 2, 4], cache_dir="")
+        self.assertEqual(columns_df.iloc[0].tolist(), [1, "Client A", 30, 70.5])
+        self.assertEqual(columns_df.iloc[1, :3].tolist(), [2, "Bo", 4])
+        self.assertTrue(pd.isna(columns_df.iloc[1, 3]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import tempfile
+
+import pandas as pd
+
+# Add the src directory to the path so we can import reports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from reports import annotate_stage, collect_stage_records, extract_customers, generate_reports_zip, \
+    load_excel_header, logger, profile_run, record_stage, summarize_stage_records
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_records_are_collected_and_logged(self):
+        """Test that a stage is timed, annotated, collected and logged as one JSON line."""
+        with self.assertLogs(logger, logging.INFO) as logs, collect_stage_records() as records:
+            with record_stage("load", rows=3):
+                annotate_stage(cache_hit=True)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["rows"], 3)
+        self.assertTrue(records[0]["cache_hit"])
+        self.assertGreaterEqual(records[0]["seconds"], 0)
+        self.assertEqual(json.loads(logs.records[0].getMessage()), records[0])
+
+    def test_no_collection_outside_context(self):
+        """Test that records are only kept inside collect_stage_records and annotations outside a stage are ignored."""
+        annotate_stage(rows=1)
+        with record_stage("load", level=logging.DEBUG):
+            pass
+        with collect_stage_records() as records:
+            pass
+        self.assertEqual(records, [])
+
+    def test_debug_records_follow_logger_level(self):
+        """Test that DEBUG stages are only collected when the logger is enabled for DEBUG, unlike INFO ones."""
+        with collect_stage_records() as records:
+            with record_stage("create_report_html", level=logging.DEBUG):
+                pass
+            with record_stage("write_reports_zip"):
+                pass
+            with self.assertLogs(logger, logging.DEBUG):
+                with record_stage("create_report_html", level=logging.DEBUG):
+                    pass
+        self.assertEqual([record["stage"] for record in records],
+                         ["write_reports_zip", "create_report_html"])
+
+    def test_pipeline_stages(self):
+        """Test that the pipeline stages report rows, bytes and workbook cache hits."""
+        buf = io.BytesIO()
+        pd.DataFrame([[1, "Client A", 30.0, 30.0], [2, "Client B", 50.0, 50.0]],
+                     columns=["ID", "NOME", "07/11/2025", "TOTAL"]).to_excel(buf, index=False)
+        with self.assertLogs(logger, logging.DEBUG), tempfile.TemporaryDirectory() as cache_dir, \
+                collect_stage_records() as records:
+            load_excel_header(buf.getvalue(), cache_dir)
+            load_excel_header(buf.getvalue(), cache_dir)
+            customers_df = extract_customers(pd.DataFrame([[1, "Client A", 30.0], [None, None, None]]), 0, 1, 2)
+            zip_bytes = generate_reports_zip(customers_df, "Novembro 2025", "pt")
+
+        summary = {stage["stage"]: stage for stage in summarize_stage_records(records)}
+        self.assertEqual((summary["load_excel_header"]["calls"], summary["load_excel_header"]["cache_hits"]), (2, 1))
+        self.assertEqual(summary["extract_customers"]["rows"], 1)
+        self.assertEqual(summary["create_report_html"]["calls"], 1)
+        self.assertEqual(summary["write_reports_zip"]["bytes"], len(zip_bytes))
+
+    def test_profile_run(self):
+        """Test that profile_run writes a loadable pstats dump."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profile_path = os.path.join(tmp_dir, "run.pstats")
+            with profile_run(profile_path):
+                sum(range(1000))
+            self.assertGreater(pstats.Stats(profile_path).total_calls, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import io
+import os
+import sys
+import zipfile
+
+import pandas as pd
+
+# Add the src directory to the path so we can import reports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from reports import IMAGE_MODE_SHARED, TRANSLATIONS, extract_month_customers, generate_reports_zip, \
+    get_batch_zip_filename, get_month_folder, write_month_batch_zip
+
+
+class TestMonthBatch(unittest.TestCase):
+
+    def setUp(self):
+        columns_df = pd.DataFrame([
+            [1, "Client A", 70.0, 10.0],
+            [2, "Client B", 100.0, None],
+            [None, None, None, None],
+        ])
+        self.month_customers = extract_month_customers(columns_df, ["Novembro 2025", "Dezembro 2025"])
+
+    def t(self, key):
+        return TRANSLATIONS["pt"].get(key, key)
+
+    def read_batch_zip(self, **kwargs) -> dict[str, bytes]:
+        buf = io.BytesIO()
+        write_month_batch_zip(buf, self.month_customers, "pt", **kwargs)
+        with zipfile.ZipFile(buf) as zf:
+            return {name: zf.read(name) for name in zf.namelist()}
+
+    def test_extract_month_customers(self):
+        """Test that every month gets its own total column and drops the customers without one."""
+        self.assertEqual(self.month_customers["Novembro 2025"]["customer_total"].tolist(), [70.0, 100.0])
+        self.assertEqual(self.month_customers["Dezembro 2025"]["customer_name"].tolist(), ["Client A"])
+
+    def test_folder_per_month(self):
+        """Test that each month's reports are in its folder, identical to that month's own ZIP."""
+        entries = self.read_batch_zip()
+        self.assertEqual(list(entries), ["2025-11_Novembro_2025/1_Client_A_112025.svg",
+                                         "2025-11_Novembro_2025/2_Client_B_112025.svg",
+                                         "2025-12_Dezembro_2025/1_Client_A_122025.svg"])
+        with zipfile.ZipFile(io.BytesIO(generate_reports_zip(self.month_customers["Dezembro 2025"],
+                                                             "Dezembro 2025", "pt"))) as zf:
+            self.assertEqual(entries["2025-12_Dezembro_2025/1_Client_A_122025.svg"],
+                             zf.read("1_Client_A_122025.svg"))
+
+    def test_shared_assets_stored_once(self):
+        """Test that shared mode stores the images once at the root and the month folders reference them."""
+        entries = self.read_batch_zip(image_mode=IMAGE_MODE_SHARED)
+        self.assertEqual(sum(name.startswith("assets/") for name in entries), 7)
+        self.assertIn(b'href="../assets/ods-2.svg"', entries["2025-11_Novembro_2025/1_Client_A_112025.svg"])
+
+    def test_progress_across_months(self):
+        """Test that progress counts the reports of all months, serial or with a shared worker pool."""
+        for workers in (1, 2):
+            calls = []
+            write_month_batch_zip(io.BytesIO(), self.month_customers, "pt", workers=workers,
+                                  progress=lambda done, total: calls.append((done, total)))
+            self.assertEqual(calls, [(1, 3), (2, 3), (3, 3)])
+
+    def test_names(self):
+        """Test the month folder and batch ZIP names."""
+        self.assertEqual(get_month_folder("Março 2025", "pt", self.t), "2025-03_Marco_2025")
+        self.assertEqual(get_batch_zip_filename(["Novembro 2025", "Março 2025"], "pt", self.t),
+                         "Relatorios_Marco_2025_Novembro_2025.zip")
+        self.assertEqual(get_batch_zip_filename(["Novembro 2025"], "pt", self.t), "Relatorios_Novembro_2025.zip")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import io
+import logging
+import os
+import sys
+import zipfile
+from unittest import mock
+
+import pandas as pd
+
+# Add the src directory to the path so we can import reports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from reports import ReportEntryCache, ReportJob, collect_stage_records, compute_impact_metrics, export_reports, \
+    logger, record_stage, write_reports_zip
+
+
+class TestReportJob(unittest.TestCase):
+
+    def setUp(self):
+        self.customers_df = compute_impact_metrics(pd.DataFrame({
+            "customer_id": [1, 2, 3],
+            "customer_name": ["Client A", "Client B", "Client C"],
+            "customer_total": [150.5, 200.0, 80.0],
+        }))
+
+    def test_progress_callback(self):
+        """Test that progress is reported after every entry, with and without an entry cache."""
+        for entry_cache in (None, ReportEntryCache(1024 * 1024)):
+            calls = []
+            write_reports_zip(io.BytesIO(), self.customers_df, "Novembro 2025", "pt", entry_cache=entry_cache,
+                              progress=lambda done, total: calls.append((done, total)))
+            self.assertEqual(calls, [(1, 3), (2, 3), (3, 3)])
+
+    def test_job_finishes_with_zip(self):
+        """Test that a background job reports its progress and leaves the ZIP and entry counts as its result."""
+        job = ReportJob(("Novembro 2025",), 3, export_reports, self.customers_df, "Novembro 2025", "pt").start()
+        self.assertTrue(job.wait(timeout=30))
+        zip_file, entry_counts = job.result
+        with zipfile.ZipFile(zip_file) as zf:
+            self.assertEqual(len(zf.namelist()), 3)
+        self.assertEqual(entry_counts, {"reused": 0, "rebuilt": 3})
+        output_bytes = job.output_bytes
+        self.assertIs(job.output_bytes, output_bytes)
+        self.assertTrue(zip_file.closed)
+        self.assertEqual(len(zipfile.ZipFile(io.BytesIO(output_bytes)).namelist()), 3)
+        self.assertEqual((job.done, job.total), (3, 3))
+        self.assertIsNone(job.error)
+        self.assertFalse(job.cancelled)
+
+    def test_job_stages_and_profile(self):
+        """Test that a job keeps its own stage records and the profile of its thread, apart from the caller's."""
+        with self.assertLogs(logger, logging.DEBUG), collect_stage_records() as records, record_stage("script_run"):
+            job = ReportJob(("Novembro 2025",), 3, export_reports, self.customers_df, "Novembro 2025", "pt",
+                            profile=True).start()
+            self.assertTrue(job.wait(timeout=30))
+        self.assertEqual([record["stage"] for record in records], ["script_run"])
+        job_stages = {record["stage"] for record in job.stage_records}
+        self.assertTrue({"get_ods_images", "create_report_html", "write_reports_zip"} <= job_stages)
+        self.assertIn("write_reports_zip", {function for _, _, function in job.profile_stats.stats})
+        self.assertIsNone(ReportJob((), 0, export_reports, self.customers_df, "Novembro 2025", "pt").profile_stats)
+
+    def test_job_without_profiler(self):
+        """Test that a job whose profiler can't start (another one is active, Python 3.12+) still exports."""
+        with mock.patch("cProfile.Profile.enable", side_effect=ValueError("Another profiling tool is already active")):
+            job = ReportJob(("Novembro 2025",), 3, export_reports, self.customers_df, "Novembro 2025", "pt",
+                            profile=True).start()
+            self.assertTrue(job.wait(timeout=30))
+        self.assertIsNone(job.error)
+        self.assertEqual(job.result[1], {"reused": 0, "rebuilt": 3})
+        self.assertIsNone(job.profile_stats)
+        self.assertEqual(job.profile_error, "Another profiling tool is already active")
+
+    def test_cancelled_job(self):
+        """Test that a cancelled job stops without a result or an error."""
+        job = ReportJob(("Novembro 2025",), 3, export_reports, self.customers_df, "Novembro 2025", "pt")
+        job.cancel()
+        job.start()
+        self.assertTrue(job.wait(timeout=30))
+        self.assertTrue(job.cancelled)
+        self.assertIsNone(job.result)
+        self.assertIsNone(job.error)
+
+    def test_failed_job(self):
+        """Test that an exception raised while building is kept as the job error."""
+        job = ReportJob(("Novembro 2025",), 3, export_reports, self.customers_df, "Novembro 2025", "xx").start()
+        self.assertTrue(job.wait(timeout=30))
+        self.assertIsInstance(job.error, KeyError)
+        self.assertIsNone(job.result)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+import io
+import os
+import sys
+import zipfile
+from unittest import mock
+
+import pandas as pd
+
+# Add the src directory to the path so we can import reports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from reports import IMAGE_MODE_EMBEDDED, IMAGE_MODE_SHARED, ODS_IMAGE_FILES, CompressedEntry, ReportEntryCache, \
+    compress_entry, compute_impact_metrics, export_reports_zip, generate_reports_zip, server_worker_pool, \
+    write_compressed_entry, write_reports_zip
+
+
+class TestReportsZip(unittest.TestCase):
+
+    def setUp(self):
+        self.customers_df = compute_impact_metrics(pd.DataFrame({
+            "customer_id": [1, 2],
+            "customer_name": ["Client A", "João da Silva"],
+            "customer_total": [150.5, 200.0],
+        }))
+
+    def read_zip(self, image_mode: str) -> dict[str, bytes]:
+        zip_data = generate_reports_zip(self.customers_df, "Novembro 2025", "pt", image_mode)
+        with zipfile.ZipFile(io.BytesIO(zip_data)) as zf:
+            return {name: zf.read(name) for name in zf.namelist()}
+
+    def test_embedded_mode(self):
+        """Test that embedded reports are self-contained and the ZIP has only the reports."""
+        entries = self.read_zip(IMAGE_MODE_EMBEDDED)
+        self.assertEqual(list(entries), ["1_Client_A_112025.svg", "2_Joao_da_Silva_112025.svg"])
+        self.assertIn(b'href="data:image/svg+xml;base64,', entries["1_Client_A_112025.svg"])
+
+    def test_shared_mode(self):
+        """Test that shared mode stores each image once and reports reference it by relative path."""
+        entries = self.read_zip(IMAGE_MODE_SHARED)
+        asset_names = [f"assets/{filename}" for filename in ODS_IMAGE_FILES.values()]
+        self.assertEqual(list(entries), asset_names + ["1_Client_A_112025.svg", "2_Joao_da_Silva_112025.svg"])
+        report = entries["2_Joao_da_Silva_112025.svg"]
+        self.assertNotIn(b'data:image/svg+xml;base64,', report)
+        for asset_name in asset_names:
+            self.assertIn(f'href="{asset_name}"'.encode(), report)
+
+    def test_modes_render_same_text(self):
+        """Test that both modes produce the same report apart from the image references."""
+        embedded = self.read_zip(IMAGE_MODE_EMBEDDED)["1_Client_A_112025.svg"].decode()
+        shared = self.read_zip(IMAGE_MODE_SHARED)["1_Client_A_112025.svg"].decode()
+        strip_hrefs = lambda svg: [line for line in svg.splitlines() if 'href="' not in line]
+        self.assertEqual(strip_hrefs(embedded), strip_hrefs(shared))
+
+    def test_parallel_matches_serial(self):
+        """Test that rendering in a worker pool produces the same archive as the serial path."""
+        customers_df = compute_impact_metrics(pd.DataFrame({
+            "customer_id": range(1, 11),
+            "customer_name": [f"Client {i}" for i in range(10)],
+            "customer_total": [i * 10.5 for i in range(10)],
+        }))
+        with mock.patch("time.time", return_value=1760000000.0):
+            for image_mode in (IMAGE_MODE_EMBEDDED, IMAGE_MODE_SHARED):
+                serial = generate_reports_zip(customers_df, "Novembro 2025", "pt", image_mode, 1)
+                parallel = generate_reports_zip(customers_df, "Novembro 2025", "pt", image_mode, 3)
+                self.assertEqual(serial, parallel)
+                with zipfile.ZipFile(io.BytesIO(parallel)) as zf:
+                    self.assertIsNone(zf.testzip())
+
+    def test_server_pool_is_shared(self):
+        """Test that every build inside server_worker_pool renders on the same pool, with the same archive."""
+        with mock.patch("time.time", return_value=1760000000.0):
+            serial = generate_reports_zip(self.customers_df, "Novembro 2025", "pt", IMAGE_MODE_EMBEDDED, 1)
+            with server_worker_pool() as first:
+                parallel = generate_reports_zip(self.customers_df, "Novembro 2025", "pt", IMAGE_MODE_EMBEDDED, 2)
+            with server_worker_pool() as second:
+                self.assertIs(first, second)
+        self.assertEqual(serial, parallel)
+
+    def test_compressed_entry_checks(self):
+        """Test that precompressed entries get writestr's duplicate name warning and closed archive error."""
+        buf = io.BytesIO()
+        entry = compress_entry("report.svg", "<svg/>")
+        with zipfile.ZipFile(buf, 'w') as zf:
+            write_compressed_entry(zf, entry, (2025, 11, 1, 0, 0, 0))
+            with self.assertWarnsRegex(UserWarning, "Duplicate name"):
+                write_compressed_entry(zf, entry, (2025, 11, 1, 0, 0, 0))
+        with self.assertRaises(ValueError):
+            write_compressed_entry(zf, entry, (2025, 11, 1, 0, 0, 0))
+
+    def test_streaming_export_matches_bytes(self):
+        """Test that the spooled export holds the same archive as the in-memory one."""
+        with mock.patch("time.time", return_value=1760000000.0):
+            buf = io.BytesIO()
+            write_reports_zip(buf, self.customers_df, "Novembro 2025", "pt", IMAGE_MODE_SHARED)
+            zip_file, entry_counts = export_reports_zip(self.customers_df, "Novembro 2025", "pt", IMAGE_MODE_SHARED)
+            with zip_file:
+                self.assertEqual(zip_file.read(), buf.getvalue())
+            self.assertEqual(entry_counts, {"reused": 0, "rebuilt": 2})
+
+    def test_reuses_unchanged_entries(self):
+        """Test that regenerating after one row changed re-renders only that row and yields the same archive."""
+        entry_cache = ReportEntryCache(max_size=10 * 1024 * 1024)
+        customers_df = self.customers_df
+        changed_df = compute_impact_metrics(customers_df[["customer_id", "customer_name", "customer_total"]]
+                                            .assign(customer_total=[150.5, 210.0]))
+        with mock.patch("time.time", return_value=1760000000.0):
+            for image_mode in (IMAGE_MODE_EMBEDDED, IMAGE_MODE_SHARED):
+                for workers in (1, 2):
+                    entry_cache.clear()
+                    first, second, fresh = io.BytesIO(), io.BytesIO(), io.BytesIO()
+                    self.assertEqual(write_reports_zip(first, customers_df, "Novembro 2025", "pt", image_mode,
+                                                       workers, entry_cache), {"reused": 0, "rebuilt": 2})
+                    self.assertEqual(write_reports_zip(second, changed_df, "Novembro 2025", "pt", image_mode,
+                                                       workers, entry_cache), {"reused": 1, "rebuilt": 1})
+                    write_reports_zip(fresh, changed_df, "Novembro 2025", "pt", image_mode, workers)
+                    self.assertEqual(second.getvalue(), fresh.getvalue())
+                    self.assertEqual(write_reports_zip(io.BytesIO(), changed_df, "November 2025", "en", image_mode,
+                                                       workers, entry_cache), {"reused": 0, "rebuilt": 2})
+
+    def test_entry_cache_size_limit(self):
+        """Test that the entry cache evicts the least recently used entries beyond its size limit."""
+        entry_cache = ReportEntryCache(max_size=10)
+        for key in ("a", "b", "c"):
+            entry_cache.put(key, CompressedEntry(f"{key}.svg", 0, 4, b"1234"))
+            entry_cache.get("a")
+        self.assertIsNotNone(entry_cache.get("a"))
+        self.assertIsNone(entry_cache.get("b"))
+        self.assertIsNotNone(entry_cache.get("c"))
+
+
+if __name__ == '__main__':
+    unittest.main()
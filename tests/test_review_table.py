@@ -0,0 +1,46 @@
+import unittest
+import os
+import sys
+
+import pandas as pd
+
+# Add the src directory to the path so we can import reports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from reports import compute_impact_metrics, filter_customers, get_customers_page, get_page_count
+
+
+class TestReviewTable(unittest.TestCase):
+
+    def setUp(self):
+        self.customers_df = compute_impact_metrics(pd.DataFrame({
+            "customer_id": [7, 12, 120, 31],
+            "customer_name": ["Client A", "João da Silva", "JOANA", "Maria"],
+            "customer_total": [150.5, 200.0, 80.0, 10.0],
+        }, index=[3, 5, 8, 9]))
+
+    def test_filter_by_name(self):
+        """Test that the name search ignores case and accents."""
+        self.assertEqual(filter_customers(self.customers_df, " joao ")["customer_id"].tolist(), [12])
+        self.assertEqual(filter_customers(self.customers_df, "JOÃ")["customer_id"].tolist(), [12, 120])
+
+    def test_filter_by_id(self):
+        """Test that the search matches IDs containing the query and keeps the original index."""
+        filtered_df = filter_customers(self.customers_df, "12")
+        self.assertEqual(filtered_df["customer_id"].tolist(), [12, 120])
+        self.assertEqual(filtered_df.index.tolist(), [5, 8])
+
+    def test_blank_query(self):
+        """Test that a blank search returns every customer and an unmatched one none."""
+        self.assertIs(filter_customers(self.customers_df, "  "), self.customers_df)
+        self.assertTrue(filter_customers(self.customers_df, "zzz").empty)
+
+    def test_pages(self):
+        """Test that pages are 1-based slices and that an empty list still has one page."""
+        self.assertEqual(get_page_count(4, page_size=3), 2)
+        self.assertEqual(get_page_count(0, page_size=3), 1)
+        self.assertEqual(get_customers_page(self.customers_df, 2, page_size=3).index.tolist(), [9])
+
+
+if __name__ == '__main__':
+    unittest.main()
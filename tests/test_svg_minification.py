@@ -0,0 +1,102 @@
+import unittest
+import io
+import logging
+import os
+import re
+import sys
+import zipfile
+from unittest import mock
+from xml.etree import ElementTree
+
+import pandas as pd
+
+# Add the src directory to the path so we can import reports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from reports import IMAGE_MODE_SHARED, METRIC_FORMATS, TEMPLATE_FILE_SVG, TRANSLATIONS, collect_stage_records, \
+    compute_impact_metrics, create_report_html, generate_reports_zip, get_ods_images, logger, minify_svg, \
+    read_ods_image_files
+
+
+def get_text_content(svg: str) -> list[str]:
+    """The whitespace-normalized text of every element with text, in document order."""
+    texts = (" ".join(element.itertext()).split() for element in ElementTree.fromstring(svg).iter())
+    return [" ".join(text) for text in texts if text]
+
+
+class TestSvgMinification(unittest.TestCase):
+
+    def setUp(self):
+        self.customers_df = compute_impact_metrics(pd.DataFrame({
+            "customer_id": [1, 2],
+            "customer_name": ["Client A", "João da Silva"],
+            "customer_total": [150.5, 1234.0],
+        }))
+
+    def render(self, customer_row: pd.Series, compact: bool) -> str:
+        def t(key): return TRANSLATIONS["pt"].get(key, key)
+        return create_report_html(TEMPLATE_FILE_SVG, customer_row, "Novembro 2025", "pt", t,
+                                  images=get_ods_images(compact), compact=compact)
+
+    def test_compact_report_matches_full_report(self):
+        """Test that the compact report has the same text and metric values as the full one, in fewer bytes."""
+        for _, customer_row in self.customers_df.iterrows():
+            full_svg = self.render(customer_row, False)
+            compact_svg = self.render(customer_row, True)
+            self.assertEqual(get_text_content(compact_svg), get_text_content(full_svg))
+            for column in METRIC_FORMATS:
+                self.assertIn(customer_row[f"{column}_fmt"], compact_svg)
+            self.assertLess(len(compact_svg), len(full_svg) * 0.85)
+            self.assertNotIn("inkscape", compact_svg)
+            self.assertNotIn("sodipodi", compact_svg)
+
+    def test_compact_ods_images(self):
+        """Test that the minified ODS images are still SVG and smaller than the originals."""
+        full_images, compact_images = read_ods_image_files(), read_ods_image_files(compact=True)
+        self.assertEqual(full_images.keys(), compact_images.keys())
+        for key, image_bytes in compact_images.items():
+            self.assertEqual(ElementTree.fromstring(image_bytes).tag, "{http://www.w3.org/2000/svg}svg")
+            self.assertLess(len(image_bytes), len(full_images[key]))
+
+    def test_ods_image_cache_hits(self):
+        """Test that the full and compact images are cached, and their cache hits logged, separately."""
+        with self.assertLogs(logger, logging.DEBUG), mock.patch.dict("reports._ODS_IMAGES", clear=True), \
+                collect_stage_records() as records:
+            for compact in (False, True, True, False):
+                get_ods_images(compact)
+        self.assertEqual([record["cache_hit"] for record in records], [False, False, True, True])
+
+    def test_minify_svg(self):
+        """Test that minify_svg rounds decimals, keeps referenced ids and text spacing, and drops the rest."""
+        svg = minify_svg(
+            '<?xml version="1.0"?>\n'
+            '<svg xmlns="http://www.w3.org/2000/svg" xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape" '
+            'inkscape:version="1.2">\n'
+            '  <!-- comment -->\n'
+            '  <defs><linearGradient id="used"/></defs>\n'
+            '  <rect id="unused" x="1.23456" width="10.0" fill="url(#used)"/>\n'
+            '  <path d="M 0.12345,1.5 L -2.25 ,3 Z"/>\n'
+            '  <text x="5">  {{ customer_name }}\n    kg  </text>\n'
+            '</svg>\n', precision=1)
+        self.assertEqual(svg, '<svg xmlns="http://www.w3.org/2000/svg"><defs><linearGradient id="used" /></defs>'
+                              '<rect x="1.2" width="10" fill="url(#used)" /><path d="M0.1,1.5L-2.2,3Z" />'
+                              '<text x="5"> {{ customer_name }} kg </text></svg>')
+
+    def test_compact_zip(self):
+        """Test that the compact ZIP holds the same entries as the full one, with minified shared assets."""
+        for image_mode_kwargs in ({}, {"image_mode": IMAGE_MODE_SHARED}):
+            full_zip = zipfile.ZipFile(io.BytesIO(generate_reports_zip(self.customers_df, "Novembro 2025", "pt",
+                                                                       **image_mode_kwargs)))
+            compact_zip = zipfile.ZipFile(io.BytesIO(generate_reports_zip(self.customers_df, "Novembro 2025", "pt",
+                                                                          compact=True, **image_mode_kwargs)))
+            self.assertEqual(compact_zip.namelist(), full_zip.namelist())
+            for name in compact_zip.namelist():
+                self.assertLess(compact_zip.getinfo(name).file_size, full_zip.getinfo(name).file_size)
+                if name.endswith(".svg") and "/" not in name:
+                    compact_svg = compact_zip.read(name).decode()
+                    self.assertEqual(get_text_content(compact_svg), get_text_content(full_zip.read(name).decode()))
+                    self.assertIsNone(re.search(r'\d\.\d{4,}', compact_svg))
+
+
+if __name__ == '__main__':
+    unittest.main()
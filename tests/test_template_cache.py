@@ -0,0 +1,64 @@
+import unittest
+import os
+import sys
+
+import pandas as pd
+
+# Add the src directory to the path so we can import reports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import reports
+from reports import TEMPLATE_CACHE_STATS, TEMPLATE_FILE_HTML, TEMPLATE_FILE_SVG, TEMPLATE_FILE_SVG_V1, \
+    clear_template_cache, collect_stage_records, compute_impact_metrics, create_report_html, generate_reports_zip, \
+    get_template
+
+
+def t(key): return reports.TRANSLATIONS["en"].get(key, key)
+
+
+class TestTemplateCache(unittest.TestCase):
+
+    def setUp(self):
+        clear_template_cache()
+
+    def test_compiles_once_per_template(self):
+        """Test that rendering many reports compiles the template only once."""
+        customer = pd.Series({"customer_id": 1, "customer_name": "Client A", "customer_total": 10.0})
+        for _ in range(50):
+            create_report_html(TEMPLATE_FILE_SVG, customer, "November 2025", "en", t)
+        self.assertEqual(TEMPLATE_CACHE_STATS, {"compiled": 1, "reused": 49})
+
+    def test_each_template_cached_separately(self):
+        """Test that the SVG, HTML and v1 SVG templates each get their own cache entry."""
+        for template_path in (TEMPLATE_FILE_SVG, TEMPLATE_FILE_HTML, TEMPLATE_FILE_SVG_V1):
+            self.assertIs(get_template(template_path), get_template(template_path))
+        self.assertEqual(TEMPLATE_CACHE_STATS, {"compiled": 3, "reused": 3})
+
+    def test_recompiles_when_mtime_changes(self):
+        """Test that a modified template file is recompiled."""
+        first = get_template(TEMPLATE_FILE_HTML)
+        template_path = os.path.join(os.path.dirname(reports.__file__), TEMPLATE_FILE_HTML)
+        stat = os.stat(template_path)
+        try:
+            os.utime(template_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+            self.assertIsNot(get_template(TEMPLATE_FILE_HTML), first)
+        finally:
+            os.utime(template_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(TEMPLATE_CACHE_STATS["compiled"], 2)
+
+    def test_stage_counts_include_workers(self):
+        """Test that the write_reports_zip stage counts the templates compiled and reused by its worker processes."""
+        customers_df = compute_impact_metrics(pd.DataFrame({
+            "customer_id": range(60), "customer_name": [f"Client {i}" for i in range(60)], "customer_total": 10.0,
+        }))
+        for workers in (1, 2):
+            clear_template_cache()
+            with collect_stage_records() as records:
+                generate_reports_zip(customers_df, "November 2025", "en", workers=workers)
+            [stage] = [record for record in records if record["stage"] == "write_reports_zip"]
+            self.assertEqual(stage["templates_compiled"] + stage["templates_reused"], 60)
+            self.assertTrue(1 <= stage["templates_compiled"] <= workers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import io
+import os
+import pickle
+import sys
+import tempfile
+import time
+from unittest import mock
+
+import pandas as pd
+
+# Add the src directory to the path so we can import reports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from reports import WORKBOOK_CACHE_STATS, WORKBOOK_CACHE_VERSION, evict_cache_entries, load_cached, load_excel_columns, \
+    load_excel_header
+
+
+class TestWorkbookCache(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache_dir = tmp_dir.name
+        WORKBOOK_CACHE_STATS.update(hits=0, misses=0, hit_seconds=0.0, miss_seconds=0.0)
+
+    def test_hit_skips_loader(self):
+        """Test that a second load with the same key is served from disk without calling the loader."""
+        calls = []
+        loader = lambda: calls.append(1) or {"value": 42}
+        self.assertEqual(load_cached("key", loader, self.cache_dir), {"value": 42})
+        self.assertEqual(load_cached("key", loader, self.cache_dir), {"value": 42})
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((WORKBOOK_CACHE_STATS["hits"], WORKBOOK_CACHE_STATS["misses"]), (1, 1))
+
+    def test_corrupt_entry_is_a_miss(self):
+        """Test that an unreadable entry is reloaded and rewritten."""
+        with open(os.path.join(self.cache_dir, "key.pkl"), "wb") as f:
+            f.write(b"not a pickle")
+        self.assertEqual(load_cached("key", lambda: [1, 2], self.cache_dir), [1, 2])
+        self.assertEqual(load_cached("key", lambda: [3], self.cache_dir), [1, 2])
+
+    def test_unsafe_cache_dir_is_not_used(self):
+        """Test that a cache directory others can write to, or owned by another user, is neither read nor written."""
+        os.chmod(self.cache_dir, 0o777)
+        with open(os.path.join(self.cache_dir, "key.pkl"), "wb") as f:
+            pickle.dump("planted", f)
+        with self.assertLogs("eco_service_report", "WARNING"):
+            self.assertEqual(load_cached("key", lambda: "loaded", self.cache_dir), "loaded")
+        if hasattr(os, "getuid") and os.getuid() == 0:
+            os.chmod(self.cache_dir, 0o700)
+            os.chown(self.cache_dir, 12345, -1)
+            with self.assertLogs("eco_service_report", "WARNING"):
+                self.assertEqual(load_cached("key", lambda: "loaded", self.cache_dir), "loaded")
+        self.assertEqual(os.listdir(self.cache_dir), ["key.pkl"])
+
+    def test_new_cache_dir_is_private(self):
+        """Test that a missing cache directory is created accessible to its owner only."""
+        cache_dir = os.path.join(self.cache_dir, "cache")
+        self.assertEqual(load_cached("key", lambda: [1], cache_dir), [1])
+        self.assertEqual(os.stat(cache_dir).st_mode & 0o777, 0o700)
+        self.assertEqual(load_cached("key", lambda: [2], cache_dir), [1])
+
+    def test_workbook_loaders(self):
+        """Test that the header and column loaders return the same values from the cache."""
+        buf = io.BytesIO()
+        pd.DataFrame({"ID": [1, 2], "NOME": ["A", "B"], "TOTAL": [1.5, 2.5]}).to_excel(buf, index=False)
+        for _ in range(2):
+            self.assertEqual(load_excel_header(buf.getvalue(), self.cache_dir), ["ID", "NOME", "TOTAL"])
+            self.assertEqual(load_excel_columns(buf.getvalue(), [2, 0], self.cache_dir).values.tolist(),
+                             [[1.5, 1], [2.5, 2]])
+        self.assertEqual((WORKBOOK_CACHE_STATS["hits"], WORKBOOK_CACHE_STATS["misses"]), (2, 2))
+
+    def test_precomputed_digest(self):
+        """Test that the loaders key the cache on a digest passed by the caller instead of hashing the file."""
+        buf = io.BytesIO()
+        pd.DataFrame({"ID": [1], "NOME": ["A"]}).to_excel(buf, index=False)
+        with mock.patch("reports.get_content_digest") as get_content_digest:
+            self.assertEqual(load_excel_header(buf.getvalue(), self.cache_dir, "upload-digest"), ["ID", "NOME"])
+            load_excel_columns(buf.getvalue(), [0], self.cache_dir, "upload-digest")
+        get_content_digest.assert_not_called()
+        self.assertEqual(sorted(os.listdir(self.cache_dir)),
+                         [f"v{WORKBOOK_CACHE_VERSION}-upload-digest-columns-0.pkl",
+                          f"v{WORKBOOK_CACHE_VERSION}-upload-digest-header.pkl"])
+
+    def test_version_in_key(self):
+        """Test that entries written under another cache version are not served."""
+        buf = io.BytesIO()
+        pd.DataFrame({"ID": [1], "NOME": ["A"]}).to_excel(buf, index=False)
+        load_excel_header(buf.getvalue(), self.cache_dir, "upload-digest")
+        with mock.patch("reports.WORKBOOK_CACHE_VERSION", WORKBOOK_CACHE_VERSION + 1):
+            load_excel_header(buf.getvalue(), self.cache_dir, "upload-digest")
+        self.assertEqual((WORKBOOK_CACHE_STATS["hits"], WORKBOOK_CACHE_STATS["misses"]), (0, 2))
+
+    def test_evicts_least_recently_used(self):
+        """Test that eviction removes the entries with the oldest access time first."""
+        now = time.time()
+        for i, name in enumerate(["old", "recent", "newest"]):
+            path = os.path.join(self.cache_dir, f"{name}.pkl")
+            with open(path, "wb") as f:
+                f.write(b"x" * 100)
+            os.utime(path, (now + i, now + i))
+        evict_cache_entries(self.cache_dir, max_size=250)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ["newest.pkl", "recent.pkl"])
+
+
+if __name__ == '__main__':
+    unittest.main()